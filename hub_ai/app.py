@@ -38,7 +38,10 @@ def handle_normalization(event: dict):
         S3_INPUT_BUCKET=s3_bucket,
         custom_name=event.get("custom_name"),
         secret_name=secret_name,
-        region_name=AWS_REGION
+        region_name=AWS_REGION,
+        use_llm_cache=event.get("llm_cache", True),
+        streaming=event.get("streaming"),
+        incremental=event.get("incremental", False)
     )
 
 def main(event):
@@ -1,6 +1,6 @@
 import asyncio
 from crawl4ai import AsyncWebCrawler
-from bs4 import BeautifulSoup
+from benchmarking.html_extraction import parse_html
 import json
 import time
 from urllib.parse import urljoin, quote_plus
@@ -82,7 +82,7 @@ class ComprehensiveScraper:
                     )
                     
                     if result.success and result.html:
-                        soup = BeautifulSoup(result.html, 'html.parser')
+                        soup = parse_html(result.html)
                         
                         if self._is_blocked(soup):
                             logger("❌ Detected blocking. Waiting...")
@@ -108,7 +108,7 @@ class ComprehensiveScraper:
 
     def _is_blocked(self, soup):
         """Check if we're being blocked by Amazon"""
-        if soup.find('form', {'action': '/errors/validateCaptcha'}):
+        if soup.select_one("form[action='/errors/validateCaptcha']"):
             return True
         
         text = soup.get_text().lower()
@@ -221,7 +221,7 @@ class ComprehensiveScraper:
                     )
 
                     if result.success and result.html:
-                        soup = BeautifulSoup(result.html, 'html.parser')
+                        soup = parse_html(result.html)
 
                         if self._is_blocked(soup):
                             logger.info("  ❌ Product page blocked, skipping...")
@@ -414,7 +414,7 @@ class ComprehensiveScraper:
             variant_url = f"https://www.amazon.{self.domain}/dp/{variant_asin}"
             try:
                 variant_html = self._fetch_html(variant_url)
-                variant_soup = BeautifulSoup(variant_html, "html.parser")
+                variant_soup = parse_html(variant_html)
                 variant_data = self._extract_complete_product_info(variant_soup, variant_url)
                 if variant_data:
                     all_variant_data.append(variant_data)
@@ -441,7 +441,7 @@ class ComprehensiveScraper:
         return any(indicator in text_lower for indicator in unit_indicators)
 
     def _extract_variant_counts(self, html):
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = parse_html(html)
         variants = []
         for button in soup.select(".twisterSwatchWrapper .a-button-text"):
             text = button.get_text(strip=True)
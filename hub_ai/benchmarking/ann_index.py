@@ -0,0 +1,205 @@
+import os
+import hashlib
+import logging
+import numpy as np
+from typing import Optional, Sequence, Tuple
+
+from benchmarking.similarity_engine import normalize_embeddings
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+# Query rows scored against one inverted list per matmul
+QUERY_CHUNK = 4096
+
+
+def index_fingerprint(model: str, texts: Sequence[str], labels: Sequence[int]) -> str:
+    """Identifies the catalogue an index was built from, so a persisted index is only reused for the same input."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{INDEX_VERSION}\x00{model}\x00".encode("utf-8"))
+    for text, label in zip(texts, labels):
+        digest.update(f"{label}\x01{text}\x00".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class IVFIndex:
+    """
+    Inverted-file index for cosine similarity, in pure NumPy.
+
+    Vectors are L2-normalized and assigned to the nearest of `nlist` centroids from a spherical
+    k-means. A query scores the centroids, probes the `nprobe` best lists and ranks the vectors in
+    them exactly. Each vector can carry an integer label (the scraped `cluster_id`) so queries
+    can be restricted to one label; a restricted query ranks all of its label's vectors exactly
+    rather than probing lists, so it never misses a same-label vector outside its probes.
+    """
+
+    def __init__(self, centroids: np.ndarray, vectors: np.ndarray, ids: np.ndarray, labels: np.ndarray,
+                 offsets: np.ndarray, fingerprint: str = ""):
+        self.centroids = centroids
+        self.vectors = vectors      # stored in list order
+        self.ids = ids              # caller ids, list order
+        self.labels = labels        # label per vector, list order
+        self.offsets = offsets      # list l holds rows offsets[l]:offsets[l + 1]
+        self.fingerprint = fingerprint
+        # Rows of each label: label_values[i]'s rows are label_rows[label_starts[i]:label_starts[i + 1]]
+        self.label_rows = np.argsort(labels, kind="stable")
+        self.label_values, first = np.unique(labels[self.label_rows], return_index=True)
+        self.label_starts = np.append(first, len(labels)).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, ids: Sequence[int], labels: Optional[Sequence[int]] = None,
+              nlist: Optional[int] = None, niter: int = 10, sample_per_list: int = 256, seed: int = 0,
+              fingerprint: str = "") -> "IVFIndex":
+        """Trains the coarse quantizer and builds the inverted lists."""
+        unit = normalize_embeddings(embeddings)
+        n = len(unit)
+        ids = np.asarray(ids, dtype=np.int64)
+        labels = np.full(n, -1, dtype=np.int64) if labels is None else np.asarray(labels, dtype=np.int64)
+        if n == 0:
+            dim = unit.shape[1] if unit.ndim == 2 else 0
+            return cls(np.zeros((0, dim), np.float32), unit, ids, labels, np.zeros(1, np.int64), fingerprint)
+
+        nlist = int(nlist or max(1, round(np.sqrt(n))))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+        sample = unit[rng.choice(n, size=min(n, nlist * sample_per_list), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+        for _ in range(niter):
+            assign = cls._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty lists from random sample points
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+            centroids = normalize_embeddings(sums)
+
+        assign = cls._nearest(unit, centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        logger.info(f"Built IVF index over {n} vectors with {nlist} lists")
+        return cls(centroids, unit[order], ids[order], labels[order], offsets, fingerprint)
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        assign = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            assign[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return assign
+
+    def search(self, queries: np.ndarray, k: int = 1, nprobe: int = 8,
+               query_labels: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (scores, ids) of shape (len(queries), k), best first. Empty slots have score -inf
+        and id -1. With `query_labels`, each query is ranked exactly against the vectors carrying
+        its label (nprobe does not apply).
+        """
+        unit = normalize_embeddings(queries)
+        m = len(unit)
+        if query_labels is not None:
+            return self._search_labels(unit, k, np.asarray(query_labels, dtype=np.int64))
+        nprobe = max(1, min(nprobe, self.nlist))
+        best_scores = np.full((m, nprobe, k), -np.inf, dtype=np.float32)
+        best_rows = np.full((m, nprobe, k), -1, dtype=np.int64)
+        if m == 0 or len(self) == 0:
+            return best_scores[:, 0, :], best_rows[:, 0, :]
+
+        coarse = unit @ self.centroids.T
+        if nprobe < self.nlist:
+            probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.nlist), (m, self.nlist))
+
+        # Visit each inverted list once and score every query that probes it
+        flat_lists = probes.ravel()
+        list_order = np.argsort(flat_lists, kind="stable")
+        list_starts = np.searchsorted(flat_lists[list_order], np.arange(self.nlist + 1))
+        for list_id in range(self.nlist):
+            lo, hi = self.offsets[list_id], self.offsets[list_id + 1]
+            hits = list_order[list_starts[list_id]:list_starts[list_id + 1]]
+            if hi == lo or len(hits) == 0:
+                continue
+            query_rows, probe_slots = np.divmod(hits, nprobe)
+            kk = min(k, hi - lo)
+            for start in range(0, len(query_rows), QUERY_CHUNK):
+                q = query_rows[start:start + QUERY_CHUNK]
+                p = probe_slots[start:start + QUERY_CHUNK]
+                scores = unit[q] @ self.vectors[lo:hi].T
+                if kk < hi - lo:
+                    top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+                else:
+                    top = np.broadcast_to(np.arange(hi - lo), (len(q), hi - lo))
+                best_scores[q, p, :kk] = np.take_along_axis(scores, top, axis=1)
+                best_rows[q, p, :kk] = top + lo
+
+        best_scores = best_scores.reshape(m, -1)
+        best_rows = best_rows.reshape(m, -1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(best_scores, order, axis=1)
+        rows = np.take_along_axis(best_rows, order, axis=1)
+        ids = np.where(np.isfinite(scores) & (rows >= 0), self.ids[np.maximum(rows, 0)], -1)
+        return scores, ids
+
+    def _search_labels(self, unit: np.ndarray, k: int, query_labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k of each query among the vectors sharing its label, one matmul per label."""
+        m = len(unit)
+        scores_out = np.full((m, k), -np.inf, dtype=np.float32)
+        ids_out = np.full((m, k), -1, dtype=np.int64)
+        positions = np.searchsorted(self.label_values, query_labels)
+        known = positions < len(self.label_values)
+        known[known] = self.label_values[positions[known]] == query_labels[known]
+        # Queries grouped by label, so each label's vectors are scored in one pass
+        query_order = np.flatnonzero(known)[np.argsort(positions[known], kind="stable")]
+        group_bounds = np.flatnonzero(np.diff(positions[query_order])) + 1
+        for q in np.split(query_order, group_bounds):
+            if len(q) == 0:
+                continue
+            position = positions[q[0]]
+            rows = self.label_rows[self.label_starts[position]:self.label_starts[position + 1]]
+            kk = min(k, len(rows))
+            for start in range(0, len(q), QUERY_CHUNK):
+                chunk = q[start:start + QUERY_CHUNK]
+                scores = unit[chunk] @ self.vectors[rows].T
+                top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk] if kk < len(rows) else \
+                    np.broadcast_to(np.arange(len(rows)), (len(chunk), len(rows)))
+                top_scores = np.take_along_axis(scores, top, axis=1)
+                order = np.argsort(-top_scores, axis=1, kind="stable")
+                scores_out[chunk, :kk] = np.take_along_axis(top_scores, order, axis=1)
+                ids_out[chunk, :kk] = self.ids[rows[np.take_along_axis(top, order, axis=1)]]
+        return scores_out, ids_out
+
+    def save(self, path: str):
+        """Persist the index atomically as a single .npz file."""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, vectors=self.vectors, ids=self.ids, labels=self.labels,
+                 offsets=self.offsets, fingerprint=np.array(self.fingerprint), version=np.array(INDEX_VERSION))
+        os.replace(tmp_path, path)
+        logger.info(f"Saved IVF index ({len(self)} vectors) to {path}")
+
+    @classmethod
+    def load(cls, path: str, fingerprint: Optional[str] = None) -> Optional["IVFIndex"]:
+        """Load a persisted index; returns None if it is missing, unreadable or built from other input."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != INDEX_VERSION:
+                    return None
+                stored = str(data["fingerprint"])
+                if fingerprint is not None and stored != fingerprint:
+                    logger.info(f"IVF index at {path} was built from different input. Rebuilding.")
+                    return None
+                return cls(data["centroids"], data["vectors"], data["ids"], data["labels"], data["offsets"], stored)
+        except Exception as e:
+            logger.warning(f"Could not load IVF index from {path}: {e}")
+            return None
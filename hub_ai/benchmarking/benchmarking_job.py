@@ -4,14 +4,16 @@ import logging
 import pandas as pd
 import time
 import numpy as np
-import hashlib
-import pickle
-from typing import Dict, List, Any, Optional, Tuple
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Dict, List, Optional, Tuple
 from benchmarking.common.s3_utils import check_and_download_file_from_uri
 from benchmarking.common.snowflake_utils import read_df_from_snowflake, upload_df_to_snowflake
 from benchmarking.common.data_io import load_dataframe
 from benchmarking.common.utils import clean_text_for_matching
+from benchmarking.common.embedding_store import EmbeddingStore
+from benchmarking.similarity_engine import match_clusters
+from benchmarking.cluster_index import ClusterPartition, valid_text_mask
+from benchmarking.result_builder import gather_matches, build_results
+from benchmarking.ann_index import IVFIndex, index_fingerprint
 
 from openai import OpenAI
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -21,61 +23,6 @@ from benchmarking.pg_db_utils import PostgresConnector
 import benchmarking.normalise.env as env
 
 
-# class EmbeddingCache:
-#     """In-memory cache for embeddings"""
-    
-#     def __init__(self, cache_dir: str = None):
-#         self.cache = {}
-#         self.cache_dir = cache_dir
-#         if cache_dir:
-#             os.makedirs(cache_dir, exist_ok=True)
-#             self.cache_file = os.path.join(cache_dir, "embeddings_cache.pkl")
-#             self._load_cache()
-    
-#     def _get_cache_key(self, text: str) -> str:
-#         """Generate a hash key for the text"""
-#         return hashlib.md5(text.encode('utf-8')).hexdigest()
-    
-#     def _load_cache(self):
-#         """Load cache from disk if it exists"""
-#         if os.path.exists(self.cache_file):
-#             try:
-#                 with open(self.cache_file, 'rb') as f:
-#                     self.cache = pickle.load(f)
-#             except Exception as e:
-#                 print(f"Warning: Could not load cache from disk: {e}")
-#                 self.cache = {}
-    
-#     def _save_cache(self):
-#         """Save cache to disk"""
-#         if self.cache_dir:
-#             try:
-#                 with open(self.cache_file, 'wb') as f:
-#                     pickle.dump(self.cache, f)
-#             except Exception as e:
-#                 print(f"Warning: Could not save cache to disk: {e}")
-    
-#     def get(self, text: str) -> Optional[np.ndarray]:
-#         """Get embedding from cache"""
-#         key = self._get_cache_key(text)
-#         return self.cache.get(key)
-    
-#     def set(self, text: str, embedding: np.ndarray):
-#         """Store embedding in cache"""
-#         key = self._get_cache_key(text)
-#         self.cache[key] = embedding
-#         # Save to disk periodically (every 1000 items)
-#         if len(self.cache) % 1000 == 0:
-#             self._save_cache()
-    
-#     def save(self):
-#         """Explicitly save cache to disk"""
-#         self._save_cache()
-    
-#     def size(self) -> int:
-#         """Get cache size"""
-#         return len(self.cache)
-
 class Benchmarker:
     def __init__(self, logger: logging.Logger, secret_name: str, region_name: str = "us-east-1"):
         self.logger = logger
@@ -88,17 +35,18 @@ class Benchmarker:
 
         openai_base_url = env.OPENAI_API_BASE
         self.client = OpenAI(api_key=openai_api_key, base_url=openai_base_url, timeout=180.0)
-        
-        # # Initialize embedding cache
-        # cache_dir = getattr(env, 'EMBEDDING_CACHE_DIR', os.path.join(env.BASE_TEMP_DIR, 'embedding_cache'))
-        # self.embedding_cache = EmbeddingCache(cache_dir)
-        
+
         # Embedding model configuration
         self.embedding_model = getattr(env, 'EMBEDDING_MODEL', 'text-embedding-3-large')
         self.embedding_batch_size = getattr(env, 'EMBEDDING_BATCH_SIZE', 1000)
-        
+
+        # Persistent embedding store shared by all cluster workers
+        cache_dir = getattr(env, 'EMBEDDING_CACHE_DIR', os.path.join(env.BASE_TEMP_DIR, 'embedding_cache'))
+        max_entries = getattr(env, 'EMBEDDING_CACHE_MAX_ENTRIES', 500000)
+        self.embedding_store = EmbeddingStore(cache_dir, self.embedding_model, max_entries=max_entries, logger=self.logger)
+
         self.logger.info(f"Initialized Benchmarker with embedding model: {self.embedding_model}")
-        # self.logger.info(f"Embedding cache size: {self.embedding_cache.size()}")
+        self.logger.info(f"Embedding store size: {self.embedding_store.size()}")
 
     @retry(
         retry=retry_if_exception_type((Exception,)),
@@ -118,150 +66,121 @@ class Benchmarker:
             self.logger.error(f"Error getting embeddings batch: {e}")
             raise
 
-    # def _get_embeddings(self, texts: List[str]) -> List[np.ndarray]:
-    #     """Get embeddings for texts, using cache when available"""
-    #     embeddings = []
-    #     texts_to_embed = []
-    #     cache_indices = []
-        
-    #     # Check cache first
-    #     for i, text in enumerate(texts):
-    #         if not text or not isinstance(text, str):
-    #             embedding_size = 3072 if self.embedding_model == "text-embedding-3-large" else 1536
-    #             embeddings.append(np.zeros(embedding_size)) 
-    #             continue
-                
-    #         cached_embedding = self.embedding_cache.get(text)
-    #         if cached_embedding is not None:
-    #             embeddings.append(cached_embedding)
-    #             self.logger.debug(f"Cache hit for text: {text[:50]}...")
-    #         else:
-    #             embeddings.append(None)  # Placeholder
-    #             texts_to_embed.append(text)
-    #             cache_indices.append(i)
-        
-    #     # Get embeddings for uncached texts in batches
-    #     if texts_to_embed:
-    #         self.logger.info(f"Getting embeddings for {len(texts_to_embed)} new texts")
-            
-    #         for i in range(0, len(texts_to_embed), self.embedding_batch_size):
-    #             batch_texts = texts_to_embed[i:i + self.embedding_batch_size]
-    #             batch_indices = cache_indices[i:i + self.embedding_batch_size]
-                
-    #             try:
-    #                 batch_embeddings = self._get_embeddings_batch(batch_texts)
-                    
-    #                 # Store in cache and update results
-    #                 for j, (text, embedding) in enumerate(zip(batch_texts, batch_embeddings)):
-    #                     self.embedding_cache.set(text, embedding)
-    #                     embeddings[batch_indices[j]] = embedding
-                        
-    #             except Exception as e:
-    #                 self.logger.error(f"Failed to get embeddings for batch: {e}")
-    #                 # Fill with zero embeddings as fallback
-    #                 for idx in batch_indices:
-    #                     embeddings[idx] = np.zeros(1536)
-                
-    #             # Small delay between batches to avoid rate limiting
-    #             time.sleep(0.1)
-        
-    #     # Save cache periodically
-    #     self.embedding_cache.save()
-        
-    #     return embeddings
-
-    def _calculate_embedding_similarity(self, text1: str, text2: str) -> float:
-        """Calculate cosine similarity between two texts using OpenAI embeddings"""
-        try:
-            if not text1 or not text2:
-                return 0.0
-            
-            # Clean and normalize texts
-            text1_clean = str(text1).lower().strip()
-            text2_clean = str(text2).lower().strip()
-            
-            if not text1_clean or not text2_clean:
-                return 0.0
-            
-            self.logger.debug(f"Calculating embedding similarity:")
-            self.logger.debug(f"  Text1: '{text1_clean[:50]}...'")
-            self.logger.debug(f"  Text2: '{text2_clean[:50]}...'")
-            
-            # Get embeddings
-            embeddings = self._get_embeddings_batch([text1_clean, text2_clean])
-            
-            if len(embeddings) != 2:
-                self.logger.warning("Failed to get embeddings for similarity calculation")
-                return 0.0
-            
-            embedding1, embedding2 = embeddings
-            
-            # Calculate cosine similarity
-            similarity = cosine_similarity(
-                embedding1.reshape(1, -1), 
-                embedding2.reshape(1, -1)
-            )[0][0]
-            
-            similarity_score = float(similarity)
-            self.logger.debug(f"Embedding similarity score: {similarity_score:.3f}")
-            
-            return similarity_score
-            
-        except Exception as e:
-            self.logger.warning(f"Error calculating embedding similarity: {e}")
-            return 0.0
-
-    def _find_best_matches_embeddings(self, client_queries: Dict[int, str], 
-                                    scraped_products: List[Dict[str, Any]], 
-                                    cluster_id: int, 
-                                    top_k: int = 1) -> Dict[int, Dict[str, Any]]:
-        """Find best matches using embedding similarity"""
-        
-        self.logger.info(f"Cluster {cluster_id}: Finding matches using embeddings for {len(client_queries)} queries vs {len(scraped_products)} products")
-        
-        # Get embeddings for all client queries
-        client_texts = list(client_queries.values())
-        client_embeddings = self._get_embeddings_batch(client_texts)
-        
-        # Get embeddings for all scraped products
-        product_texts = [product['description'] for product in scraped_products]
-        product_embeddings = self._get_embeddings_batch(product_texts)
-        
-        # Convert to numpy arrays for efficient computation
-        client_embeddings_matrix = np.array(client_embeddings)
-        product_embeddings_matrix = np.array(product_embeddings)
-        
-        # Calculate similarity matrix
-        similarity_matrix = cosine_similarity(client_embeddings_matrix, product_embeddings_matrix)
-        
-        # Find best matches
-        best_matches = {}
-        
-        for i, (client_idx, client_query) in enumerate(client_queries.items()):
-            similarities = similarity_matrix[i]
-            
-            # Get top-k matches
-            top_indices = np.argsort(similarities)[-top_k:][::-1]
-            
-            for rank, product_idx in enumerate(top_indices):
-                similarity_score = similarities[product_idx]
-                
-                # Only consider matches above a threshold
-                if similarity_score > 0.3:  # Adjust threshold as needed
-                    original_index = scraped_products[product_idx]['original_index']
-                    
-                    # Store the best match (rank 0)
-                    if rank == 0:
-                        best_matches[client_idx] = {
-                            'score': similarity_score,
-                            'matched_product_index': original_index,
-                            'similarity_type': 'embedding'
-                        }
-                    
-                    self.logger.debug(f"Cluster {cluster_id}, Query {client_idx}: "
-                                    f"Match rank {rank + 1}, Score: {similarity_score:.3f}")
-        
-        return best_matches
+    def _plan_embedding_batches(self, texts: List[str]) -> List[List[int]]:
+        """Split texts into request batches bounded by EMBEDDING_BATCH_SIZE items and a token budget"""
+        max_tokens = getattr(env, 'EMBEDDING_MAX_TOKENS_PER_REQUEST', 250000)
+        batches, current, current_tokens = [], [], 0
+        for i, text in enumerate(texts):
+            # ~4 characters per token is a safe upper bound for the short product strings we embed
+            tokens = len(text) // 4 + 1
+            if current and (len(current) >= self.embedding_batch_size or current_tokens + tokens > max_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_texts(self, texts: List[str]) -> Tuple[np.ndarray, Dict[str, int]]:
+        """
+        Embed a deduplicated set of texts, reading through the embedding store.
+        Returns a float32 matrix and a mapping from text to its row in that matrix. A failed
+        request is logged and its texts are left out of the mapping, so callers can skip them.
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        text_rows = {text: row for row, text in enumerate(unique_texts)}
+        if not unique_texts:
+            return np.zeros((0, 0), dtype=np.float32), text_rows
+
+        cached = self.embedding_store.get_many(unique_texts)
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        fetched: Dict[int, np.ndarray] = {}
+
+        if missing:
+            missing_texts = [unique_texts[i] for i in missing]
+            batches = self._plan_embedding_batches(missing_texts)
+            max_workers = getattr(env, 'EMBEDDING_MAX_CONCURRENCY', 4)
+            self.logger.info(f"Embedding {len(missing)} new texts in {len(batches)} requests "
+                             f"({len(unique_texts) - len(missing)} of {len(unique_texts)} cached)")
+
+            def embed_batch(batch: List[int]) -> List[int]:
+                batch_texts = [missing_texts[j] for j in batch]
+                batch_embeddings = self._get_embeddings_batch(batch_texts)
+                self.embedding_store.put_many(batch_texts, batch_embeddings)
+                for j, embedding in zip(batch, batch_embeddings):
+                    fetched[missing[j]] = embedding
+                return batch
+
+            failed = 0
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(embed_batch, batch): batch for batch in batches}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed += len(futures[future])
+                        self.logger.error(f"Embedding request for {len(futures[future])} texts failed, leaving them without embeddings: {e}")
+            if failed:
+                self.logger.warning(f"{failed} of {len(unique_texts)} distinct texts have no embedding")
+
+        embedded = [i for i, embedding in enumerate(cached) if embedding is not None or i in fetched]
+        text_rows = {unique_texts[i]: row for row, i in enumerate(embedded)}
+        if not embedded:
+            return np.zeros((0, 0), dtype=np.float32), text_rows
+        first = cached[embedded[0]] if cached[embedded[0]] is not None else fetched[embedded[0]]
+        matrix = np.empty((len(embedded), len(first)), dtype=np.float32)
+        for row, i in enumerate(embedded):
+            matrix[row] = cached[i] if cached[i] is not None else fetched[i]
+        return matrix, text_rows
+
+    def _match_with_ann_index(self, scraped_file_path: str, client_partition: ClusterPartition,
+                              scraped_partition: ClusterPartition, cluster_inputs: Dict[int, tuple],
+                              catalogue_positions: np.ndarray, embedding_matrix: np.ndarray,
+                              text_rows: Dict[str, int], threshold: float = 0.3) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Match every client query against an IVF index over the whole scraped catalogue"""
+        scraped_frame = scraped_partition.frame
+        # Products whose embedding failed stay out of the index
+        catalogue_positions = np.asarray([position for position, text in zip(
+            catalogue_positions, scraped_frame['processed_description'].to_numpy()[catalogue_positions]) if text in text_rows], dtype=np.int64)
+        catalogue_texts = scraped_frame['processed_description'].to_numpy()[catalogue_positions].tolist()
+        catalogue_labels = scraped_frame['cluster_id'].to_numpy()[catalogue_positions]
+
+        # Reuse the index persisted next to the scraped file when it was built from the same catalogue
+        index_path = f"{os.path.splitext(scraped_file_path)[0]}.ann.npz"
+        fingerprint = index_fingerprint(self.embedding_model, catalogue_texts, catalogue_labels.tolist())
+        index = IVFIndex.load(index_path, fingerprint)
+        if index is None:
+            index = IVFIndex.build(embedding_matrix[[text_rows[text] for text in catalogue_texts]],
+                                   catalogue_positions, catalogue_labels, fingerprint=fingerprint)
+            try:
+                index.save(index_path)
+            except OSError as e:
+                self.logger.warning(f"Could not persist ANN index to {index_path}: {e}")
+        else:
+            self.logger.info(f"Loaded ANN index from {index_path}: {len(index)} products")
+
+        query_cluster_ids, query_positions, query_rows = [], [], []
+        for cluster_id, (_, _, client_pos, client_texts, _, _) in cluster_inputs.items():
+            client_start, _ = client_partition.bounds(cluster_id)
+            query_cluster_ids.extend([cluster_id] * len(client_pos))
+            query_positions.extend((client_pos + client_start).tolist())
+            query_rows.extend(text_rows[text] for text in client_texts)
+
+        cluster_filter = getattr(env, 'BENCHMARK_ANN_CLUSTER_FILTER', False)
+        scores, ids = index.search(
+            embedding_matrix[query_rows],
+            k=1,
+            nprobe=getattr(env, 'BENCHMARK_ANN_NPROBE', 8),
+            query_labels=query_cluster_ids if cluster_filter else None,
+        )
+        keep = scores[:, 0] > threshold
+        return (
+            np.asarray(query_cluster_ids)[keep],
+            np.asarray(query_positions, dtype=np.int64)[keep],
+            ids[keep, 0],
+            scores[keep, 0].astype(np.float64),
+        )
 
     def run(self, workspace_id: str, s3_path: str, url: str) -> pd.DataFrame:
         """Main benchmarking function"""
@@ -315,73 +234,107 @@ class Benchmarker:
         self.logger.info(f"Client clusters: {sorted(client_df['CLUSTER_ID'].unique())}")
         self.logger.info(f"Scraped clusters: {sorted(scraped_df['cluster_id'].unique())}")
 
-        # 4. Process clusters
-        unique_cluster_ids = sorted(client_df['CLUSTER_ID'].dropna().unique())
-        self.logger.info(f"Processing {len(unique_cluster_ids)} clusters: {unique_cluster_ids}")
-        all_results = []
+        # 4. Partition both frames by cluster once and embed every distinct valid text
+        matching_mode = getattr(env, 'BENCHMARK_MATCHING_MODE', 'cluster')
+        if matching_mode == 'ann':
+            max_products = getattr(env, 'BENCHMARK_ANN_MAX_PRODUCTS_PER_CLUSTER', 5000)
+        else:
+            max_products = getattr(env, 'BENCHMARK_MAX_PRODUCTS_PER_CLUSTER', 100)
+        self.logger.info(f"Matching mode: {matching_mode}, max products per cluster: {max_products}")
+        client_partition = ClusterPartition(client_df, 'CLUSTER_ID')
+        scraped_partition = ClusterPartition(scraped_df, 'cluster_id')
+        client_valid = valid_text_mask(client_partition.frame['PROCESSED_QUERY'])
+        scraped_valid = valid_text_mask(scraped_partition.frame['processed_description'])
 
-        def process_cluster(cluster_id):
-            try:
-                cluster_start_time = time.perf_counter()
-                cluster_client = client_df[client_df['CLUSTER_ID'] == cluster_id].reset_index(drop=True)
-                cluster_scraped = scraped_df[scraped_df['cluster_id'] == cluster_id].reset_index(drop=True)
-                
+        unique_cluster_ids = sorted(client_df['CLUSTER_ID'].dropna().unique())
+        cluster_inputs = {}
+        workspace_texts = []
+        for cluster_id in unique_cluster_ids:
+            cluster_client = client_partition.get(cluster_id)
+            cluster_scraped = scraped_partition.get(cluster_id)
+            client_pos = client_partition.valid_positions(cluster_id, client_valid)
+            scraped_pos = scraped_partition.valid_positions(cluster_id, scraped_valid, limit=max_products)
+            client_texts = cluster_client['PROCESSED_QUERY'].to_numpy()[client_pos].tolist()
+            product_texts = cluster_scraped['processed_description'].to_numpy()[scraped_pos].tolist()
+            cluster_inputs[cluster_id] = (cluster_client, cluster_scraped, client_pos, client_texts, scraped_pos, product_texts)
+            workspace_texts.extend(client_texts)
+            workspace_texts.extend(product_texts)
+
+        catalogue_positions = np.zeros(0, dtype=np.int64)
+        if matching_mode == 'ann':
+            # The index covers every scraped cluster, not only those with client rows
+            catalogue_positions = np.concatenate([np.zeros(0, dtype=np.int64)] + [
+                scraped_partition.bounds(cluster_id)[0] + scraped_partition.valid_positions(cluster_id, scraped_valid, limit=max_products)
+                for cluster_id in scraped_partition.cluster_ids()
+            ])
+            workspace_texts.extend(scraped_partition.frame['processed_description'].to_numpy()[catalogue_positions].tolist())
+
+        embedding_start_time = time.perf_counter()
+        embedding_matrix, text_rows = self._embed_texts(workspace_texts)
+        self.logger.info(f"Embedded {len(text_rows)} distinct texts from {len(workspace_texts)} in "
+                         f"{time.perf_counter() - embedding_start_time:.2f}s")
+
+        # A cluster is only scored when every one of its texts has an embedding
+        for cluster_id, (_, _, _, client_texts, _, product_texts) in list(cluster_inputs.items()):
+            unembedded = sum(text not in text_rows for text in client_texts + product_texts)
+            if unembedded:
+                self.logger.warning(f"Cluster {cluster_id}: skipped, {unembedded} texts have no embedding")
+                del cluster_inputs[cluster_id]
+
+        # 5. Process clusters
+        self.logger.info(f"Processing {len(cluster_inputs)} clusters: {list(cluster_inputs)}")
+        if matching_mode == 'ann':
+            matching_start_time = time.perf_counter()
+            cluster_ids, client_positions, scraped_positions, scores = self._match_with_ann_index(
+                scraped_file_path, client_partition, scraped_partition, cluster_inputs,
+                catalogue_positions, embedding_matrix, text_rows)
+            self.logger.info(f"Matched {len(client_positions)} client queries through the ANN index in "
+                             f"{time.perf_counter() - matching_start_time:.2f}s")
+        else:
+            blocks = []
+            for cluster_id, (cluster_client, cluster_scraped, client_pos, client_texts, scraped_pos, product_texts) in cluster_inputs.items():
                 if cluster_scraped.empty or cluster_client.empty:
                     self.logger.warning(f"Cluster {cluster_id}: No data found. Client: {len(cluster_client)}, Scraped: {len(cluster_scraped)}")
-                    return []
-                
-                self.logger.info(f"Cluster {cluster_id}: Processing {len(cluster_client)} client queries vs {len(cluster_scraped)} scraped products")
-
-                client_queries = {
-                    idx: row['PROCESSED_QUERY'] 
-                    for idx, row in cluster_client.iterrows() 
-                    if pd.notna(row['PROCESSED_QUERY']) and isinstance(row['PROCESSED_QUERY'], str) and row['PROCESSED_QUERY'].strip()
-                }
-                
-                scraped_products_list = [
-                    {'original_index': idx, 'description': row['processed_description']}
-                    for idx, row in cluster_scraped.head(100).iterrows()
-                    if pd.notna(row['processed_description']) and isinstance(row['processed_description'], str) and row['processed_description'].strip()
-                ]
-                
-                if not scraped_products_list:
+                    continue
+
+                if not product_texts:
                     self.logger.warning(f"Cluster {cluster_id}: No valid scraped products")
-                    return []
-                
-                # Use embedding-based matching
-                best_matches = self._find_best_matches_embeddings(client_queries, scraped_products_list, cluster_id)
-
-                cluster_results = self._create_cluster_results(cluster_id, cluster_client, cluster_scraped, best_matches, url)
-                cluster_end_time = time.perf_counter()
-                self.logger.info(f"Cluster {cluster_id}: Found {len(cluster_results)} matches. Time: {cluster_end_time - cluster_start_time:.2f}s")
-                return cluster_results
-                
-            except Exception as e:
-                self.logger.error(f"Cluster {cluster_id}: Error in processing: {e}", exc_info=True)
-                return []
-
-        # Parallel cluster processing
-        max_workers = getattr(env, 'LLM_MAX_WORKERS_BENCHMARKING', env.LLM_MAX_WORKERS_NORMALIZATION)
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(process_cluster, cluster_id): cluster_id for cluster_id in unique_cluster_ids}
-            for future in as_completed(futures):
-                cluster_id = futures[future]
-                try:
-                    results = future.result()
-                    all_results.extend(results)
-                except Exception as e:
-                    self.logger.error(f"Cluster {cluster_id}: Exception in future: {e}", exc_info=True)
-
-        # 5. Save results
-        final_df = pd.DataFrame(all_results)
+                    continue
+
+                blocks.append((
+                    cluster_id,
+                    client_pos.tolist(),
+                    [text_rows[text] for text in client_texts],
+                    scraped_pos.tolist(),
+                    [text_rows[text] for text in product_texts],
+                ))
+
+            # Score every cluster's client x product block in one batched pass
+            matching_start_time = time.perf_counter()
+            cluster_matches = match_clusters(embedding_matrix, blocks)
+            self.logger.info(f"Scored {len(blocks)} clusters in {time.perf_counter() - matching_start_time:.2f}s")
+
+            cluster_ids, client_positions, scraped_positions, scores = gather_matches(cluster_matches, client_partition, scraped_partition)
+
+        # 6. Materialize result rows for every cluster in one columnar pass
+        results_start_time = time.perf_counter()
+        is_amazon = isinstance(url, str) and 'amazon' in url.lower()
+        final_df = build_results(client_partition.frame, scraped_partition.frame, cluster_ids,
+                                 client_positions, scraped_positions, scores, amazon=is_amazon)
+        self.logger.info(f"Built {len(final_df)} result rows across {len(set(cluster_ids.tolist()))} clusters in "
+                         f"{time.perf_counter() - results_start_time:.2f}s")
+
+        # 7. Save results
         final_df = final_df.drop_duplicates()  
 
         # final_df_path = os.path.join(temp_dir, f"benchmark_results_new_{workspace_id}.csv")
         # final_df.to_csv(final_df_path, index=False)
 
+        self.embedding_store.flush()
+        self.logger.info(f"Embedding store stats: {self.embedding_store.stats()}")
+
         if not final_df.empty:
             self.logger.info(f"Total results: {len(final_df)}")
-            # self.logger.info(f"Embedding cache final size: {self.embedding_cache.size()}")
             try:
                 upload_df_to_snowflake(final_df, "BENCHMARK_RESULTS", workspace_id, self.logger, self.secret_name, self.region_name)
                 self.logger.info(f"Benchmark results uploaded to Snowflake for Schema {workspace_id}")
@@ -389,211 +342,8 @@ class Benchmarker:
                 self.logger.error(f"Failed to upload benchmark results to Snowflake: {e}, workspace_id: {workspace_id}")
         else:
             self.logger.warning("No results found. Aborting upload to Snowflake.")
-        # Save cache before finishing
-        # self.embedding_cache.save()
         return final_df
 
-    def _create_cluster_results_amazon(self, cluster_id, cluster_client, cluster_scraped, best_matches):
-        """Create result records for Amazon scraped data"""
-        results = []
-        for client_idx, match_info in best_matches.items():
-            if match_info['score'] > 0.3:  # Confidence threshold
-                try:
-                    client_row = cluster_client.iloc[client_idx]
-                    scraped_idx = match_info['matched_product_index']
-                    if scraped_idx is None or not isinstance(scraped_idx, int) or scraped_idx >= len(cluster_scraped):
-                        self.logger.warning(f"Cluster {cluster_id}: Invalid scraped index {scraped_idx}, skipping")
-                        continue
-                    match_row = cluster_scraped.iloc[scraped_idx]
-
-                    def safe_get(row, key, default=''):
-                        val = row.get(key, default)
-                        if isinstance(val, str):
-                            return val.strip()
-                        return str(val).strip() if val is not None else default
-
-                    # Amazon-specific fields
-                    currency_info = match_row.get('currency_info', {})
-                    currency_code = currency_info.get('code', '') if isinstance(currency_info, dict) else ''
-                    net_quantity = safe_get(match_row, 'net_quantity', '')
-                    variant_total_price = safe_get(match_row, 'variant_total_price', '')
-                    per_unit_price_display = safe_get(match_row, 'per_unit_price_display', '')
-
-                    # If unit_variants exists and is non-empty, pick max quantity variant
-                    source_quantity = net_quantity
-                    source_spend = variant_total_price
-                    source_unit_price = per_unit_price_display
-                    unit_variants = match_row.get('unit_variants', None)
-                    if isinstance(unit_variants, list) and len(unit_variants) > 0:
-                        max_variant = max(unit_variants, key=lambda v: v.get('quantity', 0) if isinstance(v.get('quantity', 0), (int, float)) else 0)
-                        source_quantity = max_variant.get('quantity', source_quantity)
-                        source_spend = max_variant.get('total_price', source_spend)
-                        source_unit_price = max_variant.get('per_unit_price', source_unit_price)
-
-                    # If any of these are blank
-                    if not source_unit_price:
-                        source_unit_price = safe_get(match_row, 'unit_price', '')
-                    if not currency_code:
-                        currency_symbol = safe_get(match_row, 'currency_symbol', '')
-                        # Map currency symbols to codes
-                        currency_map = {'ريال': 'SAR'}
-                        currency_code = currency_map.get(currency_symbol, currency_symbol if currency_symbol else 'USD')
-
-                    # Convert empty strings to None 
-                    def clean_numeric_value(value):
-                        if value == '' or value is None:
-                            return None
-                        if isinstance(value, str) and value.strip() == '':
-                            return None
-                        return value
-
-                    # Convert string values to numbers for numeric Snowflake columns
-                    def safe_convert_to_number(value):
-                        if value is None or value == '':
-                            return None
-                        if isinstance(value, (int, float)):
-                            return value
-                        if isinstance(value, str):
-                            value = value.strip()
-                            if value == '':
-                                return None
-                            try:
-                                # Try to convert to float first, then int if it's a whole number
-                                float_val = float(value)
-                                if float_val.is_integer():
-                                    return int(float_val)
-                                return float_val
-                            except (ValueError, TypeError):
-                                return None
-                        return None
-
-                    source_quantity = clean_numeric_value(source_quantity)
-                    source_spend = clean_numeric_value(source_spend)
-                    source_unit_price = clean_numeric_value(source_unit_price)
-
-                    # CATEGORY and UOM as str and Unit Price Numeric
-                    quantity_value = safe_convert_to_number(client_row.get('QUANTITY'))
-                    spend_value = safe_convert_to_number(client_row.get('SPEND'))
-                    unit_price_value = safe_convert_to_number(client_row.get('UNIT PRICE'))
-
-                    self.logger.info(f"Cluster {cluster_id}: Client {client_idx} Order Quantity: {client_row.get('QUANTITY')}")
-  
-                    result = {
-                        'CLUSTER_ID': cluster_id,
-                        'CATEGORY': safe_get(client_row, 'CATEGORY'),
-                        'SKU_DESCRIPTION': safe_get(client_row, 'ITEM DESCRIPTION'),
-                        'UOM': safe_get(client_row, 'UOM'),
-                        'QUANTITY': quantity_value,
-                        'CURRENCY': client_row.get('CURRENCY', 'USD'),
-                        'SPEND': spend_value,              
-                        'UNIT_PRICE': unit_price_value,   
-                        'NORMALISED_DESCRIPTION': safe_get(client_row, 'NORMALIZED DESCRIPTION'),
-                        'SOURCE_DESCRIPTION': safe_get(match_row, 'title'),
-                        'SOURCE_CURRENCY': currency_code,
-                        'SOURCE_UNIT_PRICE': source_unit_price,
-                        'SOURCE_URL': safe_get(match_row, 'url'),
-                        'SIMILARITY_SCORE': round(match_info['score'], 4),
-                        'EXTRACTED_QUANTITY': client_row.get('Extracted_Quantity', 1),
-                        'SOURCE_QUANTITY': source_quantity,
-                        'SOURCE_TOTAL_PRICE': source_spend,
-                    }
-                    results.append(result)
-                except Exception as e:
-                    self.logger.error(f"Cluster {cluster_id}: Error creating Amazon result for client_idx {client_idx}: {e}")
-                    continue
-        return results
-    
-
-    def _create_cluster_results(self, cluster_id, cluster_client, cluster_scraped, best_matches, url):
-        """Create result records for a cluster"""
-        
-        if isinstance(url, str) and 'amazon' in url.lower():
-            return self._create_cluster_results_amazon(cluster_id, cluster_client, cluster_scraped, best_matches)
-
-        results = []
-        
-        for client_idx, match_info in best_matches.items():
-            if match_info['score'] > 0.3:  # Confidence threshold
-                try:
-                    client_row = cluster_client.iloc[client_idx]
-                    scraped_idx = match_info['matched_product_index']
-                    
-                    if scraped_idx is None or not isinstance(scraped_idx, int) or scraped_idx >= len(cluster_scraped):
-                        self.logger.warning(f"Cluster {cluster_id}: Invalid scraped index {scraped_idx}, skipping")
-                        continue
-                    
-                    match_row = cluster_scraped.iloc[scraped_idx]
-
-                    def safe_get_and_strip(row, key, default=''):
-                        val = row.get(key, default)
-                        if isinstance(val, str):
-                            return val.strip()
-                        return str(val).strip() if val is not None else default
-
-                    # Convert empty strings to None
-                    def clean_numeric_value(value):
-                        if value == '' or value is None:
-                            return None
-                        if isinstance(value, str) and value.strip() == '':
-                            return None
-                        return value
-
-                    # Convert string values to numbers for numeric
-                    def safe_convert_to_number(value):
-                        if value is None or value == '':
-                            return None
-                        if isinstance(value, (int, float)):
-                            return value
-                        if isinstance(value, str):
-                            value = value.strip()
-                            if value == '':
-                                return None
-                            try:
-                                float_val = float(value)
-                                if float_val.is_integer():
-                                    return int(float_val)
-                                return float_val 
-                            except (ValueError, TypeError):
-                                return None
-                        return None
-                    
-                    source_quantity = clean_numeric_value(safe_get_and_strip(match_row, 'quantity'))
-                    source_total_price = clean_numeric_value(safe_get_and_strip(match_row, 'total_price', ''))
-                    source_unit_price = clean_numeric_value(safe_get_and_strip(match_row, 'price'))
-                    
-                    quantity_value = safe_convert_to_number(client_row.get('QUANTITY'))
-                    spend_value = safe_convert_to_number(client_row.get('SPEND'))
-                    unit_price_value = safe_convert_to_number(client_row.get('UNIT PRICE'))
-                    
-                    result = {
-                        'CLUSTER_ID': cluster_id,
-                        'CATEGORY': safe_get_and_strip(client_row, 'CATEGORY'),
-                        'SKU_DESCRIPTION': safe_get_and_strip(client_row, 'ITEM DESCRIPTION'),
-                        'UOM': safe_get_and_strip(client_row, 'UOM'),
-                        'QUANTITY': quantity_value,
-                        'CURRENCY': client_row.get('CURRENCY', 'USD'),
-                        'SPEND': spend_value,
-                        'UNIT_PRICE': unit_price_value,
-                        'NORMALISED_DESCRIPTION': safe_get_and_strip(client_row, 'NORMALIZED DESCRIPTION'),
-                        'SOURCE_DESCRIPTION': safe_get_and_strip(match_row, 'title'),
-                        'SOURCE_CURRENCY': safe_get_and_strip(client_row, 'currency', 'USD'),
-                        'SOURCE_UNIT_PRICE': source_unit_price,
-                        'SOURCE_URL': safe_get_and_strip(match_row, 'url'),
-                        'SIMILARITY_SCORE': round(match_info['score'], 4),
-                        'EXTRACTED_QUANTITY': client_row.get('Extracted_Quantity', 1),
-                        'SOURCE_QUANTITY': source_quantity,
-                        'SOURCE_TOTAL_PRICE': source_total_price,
-
-                        # 'SOURCE_SPEND': client_row.get('QUANTITY', 1) * safe_get_and_strip(match_row, 'price') * client_row.get('EXTRACTED_QUANTITY', 1),
-                    }
-                    results.append(result)
-                    
-                except Exception as e:
-                    self.logger.error(f"Cluster {cluster_id}: Error creating result for client_idx {client_idx}: {e}")
-                    continue
-        
-        return results
-
 def setup_logging() -> logging.Logger:
     """
     Sets up logging for the application based on the provided configuration.
@@ -4,17 +4,18 @@ import logging
 import pandas as pd
 import time
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from benchmarking.common.s3_utils import check_and_download_file_from_uri
 from benchmarking.common.snowflake_utils import read_df_from_snowflake, upload_df_to_snowflake
 from benchmarking.common.data_io import load_dataframe
 from benchmarking.common.utils import clean_text_for_matching
-from benchmarking.prompts.normalization_prompts import benchmarking_match_prompt
-from openai import OpenAI, AsyncOpenAI, RateLimitError, APIError
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from benchmarking.tfidf_scorer import pairwise_tfidf_cosine
+from benchmarking.prompts.normalization_prompts import benchmarking_match_prompt_prefixed
+from benchmarking.prompt_packing import count_tokens, pack_batches, usage_tokens
+from benchmarking.cluster_index import ClusterPartition, valid_text_mask
+from benchmarking.llm_scheduler import LLMScheduler
+from benchmarking.common.llm_cache import LLMResponseCache, make_cache_key
+from concurrent.futures import as_completed
 import asyncio
-from tenacity import retry, retry_if_exception_type, wait_exponential, stop_after_attempt
 
 # import normalise.env as env
 #
@@ -25,7 +26,7 @@ import logging
 import benchmarking.normalise.env as env
 
 class Benchmarker:
-    def __init__(self, logger: logging.Logger,secret_name: str, region_name: str = "us-east-1"):
+    def __init__(self, logger: logging.Logger,secret_name: str, region_name: str = "us-east-1", use_llm_cache: bool = True):
         self.logger = logger
         self.secret_name = secret_name
         self.region_name = region_name
@@ -35,74 +36,18 @@ class Benchmarker:
         if not openai_api_key:
             raise ValueError("LLM_OPENAI_API_KEY environment variable not set")
 
-        openai_base_url = env.OPENAI_API_BASE
-        self.client = OpenAI(api_key=openai_api_key, base_url=openai_base_url, timeout=180.0)
-        
-        # Initialize TF-IDF vectorizer for cosine similarity
-        self.vectorizer = TfidfVectorizer(
-            lowercase=True,
-            stop_words='english',
-            ngram_range=(1, 2),
-            max_features=1000,
-            min_df=1,
-            max_df=0.95
-        )
+        # Job-wide async LLM scheduler, created per run()
+        self.scheduler = None
 
-    def _calculate_cosine_similarity(self, text1: str, text2: str) -> float:
-        """Calculate cosine similarity between two text strings"""
-        try:
-            if not text1 or not text2:
-                return 0.0
-            
-            # Clean and normalize texts
-            text1_clean = str(text1).lower().strip()
-            text2_clean = str(text2).lower().strip()
-            
-            if not text1_clean or not text2_clean:
-                return 0.0
-            
-            # Log the texts being compared for debugging
-            self.logger.debug(f"Comparing texts for cosine similarity:")
-            self.logger.debug(f"  Text1: '{text1_clean}'")
-            self.logger.debug(f"  Text2: '{text2_clean}'")
-            
-            # Create a temporary vectorizer for this comparison
-            # Use simpler parameters that work better with multilingual text
-            temp_vectorizer = TfidfVectorizer(
-                lowercase=True,
-                stop_words=None,  # Don't use English stop words for multilingual text
-                ngram_range=(1, 1),  # Use only unigrams
-                max_features=500,
-                min_df=1,
-                max_df=1.0,  # Allow all terms
-                token_pattern=r'(?u)\b\w+\b'  # Unicode-aware word boundaries
+        # Response cache for the temperature-0 match prompts; use_llm_cache=False bypasses it for a job
+        self.llm_cache = None
+        if use_llm_cache and getattr(env, 'LLM_CACHE_ENABLED', False):
+            self.llm_cache = LLMResponseCache(
+                getattr(env, 'LLM_CACHE_PATH', os.path.join(env.BASE_TEMP_DIR, "llm_cache", "responses.sqlite3")),
+                ttl_seconds=getattr(env, 'LLM_CACHE_TTL_SECONDS', 30 * 24 * 3600),
+                max_entries=getattr(env, 'LLM_CACHE_MAX_ENTRIES', 200000),
+                logger=logger,
             )
-            
-            # Vectorize the texts
-            texts = [text1_clean, text2_clean]
-            tfidf_matrix = temp_vectorizer.fit_transform(texts)
-            
-            # Check if we have any features
-            if tfidf_matrix.shape[1] == 0:
-                self.logger.debug("No features found in TF-IDF matrix")
-                return 0.0
-            
-            # Get feature names for debugging
-            feature_names = temp_vectorizer.get_feature_names_out()
-            self.logger.debug(f"TF-IDF features: {feature_names}")
-            
-            # Calculate cosine similarity
-            similarity_matrix = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
-            similarity_score = float(similarity_matrix[0][0])
-            
-            # Log for debugging
-            self.logger.debug(f"Cosine similarity score: {similarity_score:.3f}")
-            
-            return similarity_score
-            
-        except Exception as e:
-            self.logger.warning(f"Error calculating cosine similarity between '{text1[:50]}...' and '{text2[:50]}...': {e}")
-            return 0.0
 
     def _calculate_hybrid_score(self, llm_score: float, cosine_score: float, 
                               llm_weight: float = 0.7, cosine_weight: float = 0.3) -> float:
@@ -156,45 +101,68 @@ class Benchmarker:
         self.logger.info(f"Processing {len(unique_cluster_ids)} clusters: {unique_cluster_ids}")
         all_results = []
 
-        def process_cluster(cluster_id):
-            try:
-                cluster_start_time = time.perf_counter()
-                cluster_client = client_df[client_df['CLUSTER_ID'] == cluster_id].reset_index(drop=True)
-                cluster_scraped = scraped_df[scraped_df['cluster_id'] == cluster_id].reset_index(drop=True)
+        # Partition both frames by cluster once; workers take contiguous slices
+        client_partition = ClusterPartition(client_df, 'CLUSTER_ID')
+        scraped_partition = ClusterPartition(scraped_df, 'cluster_id')
+        client_valid = valid_text_mask(client_partition.frame['PROCESSED_QUERY'])
+        scraped_valid = valid_text_mask(scraped_partition.frame['processed_description'])
+
+        # Submit every cluster to one job-wide scheduler; results stream back as clusters complete
+        self.scheduler = LLMScheduler(
+            api_key=env.LLM_OPENAI_API_KEY,
+            base_url=env.OPENAI_API_BASE,
+            requests_per_minute=getattr(env, 'BENCHMARK_LLM_REQUESTS_PER_MINUTE', 500),
+            tokens_per_minute=getattr(env, 'BENCHMARK_LLM_TOKENS_PER_MINUTE', 800000),
+            max_concurrency=getattr(env, 'BENCHMARK_LLM_MAX_CONCURRENCY', 32),
+            max_retries=getattr(env, 'BENCHMARK_LLM_MAX_RETRIES', 6),
+            logger=self.logger,
+        )
+        futures = {}
+        cluster_inputs = {}
+        try:
+            for cluster_id in unique_cluster_ids:
+                cluster_client = client_partition.get(cluster_id)
+                cluster_scraped = scraped_partition.get(cluster_id)
                 if cluster_scraped.empty or cluster_client.empty:
                     self.logger.warning(f"Cluster {cluster_id}: No data found. Client: {len(cluster_client)}, Scraped: {len(cluster_scraped)}")
-                    return []
+                    continue
                 self.logger.info(f"Cluster {cluster_id}: Processing {len(cluster_client)} client queries vs {len(cluster_scraped)} scraped products")
 
-                client_queries = {idx: row['PROCESSED_QUERY'] for idx, row in cluster_client.iterrows() if pd.notna(row['PROCESSED_QUERY']) and isinstance(row['PROCESSED_QUERY'], str) and row['PROCESSED_QUERY'].strip()}
+                client_pos = client_partition.valid_positions(cluster_id, client_valid)
+                scraped_pos = scraped_partition.valid_positions(cluster_id, scraped_valid, limit=100)
+                client_queries = dict(zip(client_pos.tolist(), cluster_client['PROCESSED_QUERY'].to_numpy()[client_pos].tolist()))
                 scraped_products_list = [
-                    {'original_index': idx, 'description': row['processed_description']}
-                    for idx, row in cluster_scraped.head(100).iterrows()
-                    if pd.notna(row['processed_description']) and isinstance(row['processed_description'], str) and row['processed_description'].strip()
+                    {'original_index': idx, 'description': description}
+                    for idx, description in zip(scraped_pos.tolist(), cluster_scraped['processed_description'].to_numpy()[scraped_pos].tolist())
                 ]
                 if not scraped_products_list:
                     self.logger.warning(f"Cluster {cluster_id}: No valid scraped products")
-                    return []
-                overall_best_matches = self._get_cluster_matches(client_queries, scraped_products_list, cluster_id)
-                cluster_results = self._create_cluster_results(cluster_id, cluster_client, cluster_scraped, overall_best_matches)
-                cluster_end_time = time.perf_counter()
-                self.logger.info(f"Cluster {cluster_id}: Found {len(cluster_results)} matches. Time: {cluster_end_time - cluster_start_time:.2f}s")
-                return cluster_results
-            except Exception as e:
-                self.logger.error(f"Cluster {cluster_id}: Error in processing: {e}", exc_info=True)
-                return []
+                    continue
+
+                # Create chunk dictionary with sequential indices
+                chunk_dict = {idx: item['description'] for idx, item in enumerate(scraped_products_list)}
+                cluster_inputs[cluster_id] = (cluster_client, cluster_scraped, client_queries, scraped_products_list, time.perf_counter())
+                future = self.scheduler.submit(self._get_bulk_matches_from_llm_async(client_queries, chunk_dict, cluster_id))
+                futures[future] = cluster_id
 
-        # Parallel cluster processing
-        max_workers = getattr(env, 'LLM_MAX_WORKERS_BENCHMARKING', env.LLM_MAX_WORKERS_NORMALIZATION)
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(process_cluster, cluster_id): cluster_id for cluster_id in unique_cluster_ids}
             for future in as_completed(futures):
                 cluster_id = futures[future]
+                cluster_client, cluster_scraped, client_queries, scraped_products_list, cluster_start_time = cluster_inputs[cluster_id]
                 try:
-                    results = future.result()
-                    all_results.extend(results)
+                    matches = future.result()
+                    overall_best_matches = self._score_cluster_matches(matches, client_queries, scraped_products_list, cluster_id)
+                    cluster_results = self._create_cluster_results(cluster_id, cluster_client, cluster_scraped, overall_best_matches)
+                    cluster_end_time = time.perf_counter()
+                    self.logger.info(f"Cluster {cluster_id}: Found {len(cluster_results)} matches. Time: {cluster_end_time - cluster_start_time:.2f}s")
+                    all_results.extend(cluster_results)
                 except Exception as e:
-                    self.logger.error(f"Cluster {cluster_id}: Exception in future: {e}", exc_info=True)
+                    self.logger.error(f"Cluster {cluster_id}: Error in processing: {e}", exc_info=True)
+        finally:
+            self.scheduler.close()
+            self.scheduler = None
+
+        if self.llm_cache is not None:
+            self.logger.info(f"LLM cache stats: {self.llm_cache.stats()}")
 
         # 5. Save results
         final_df = pd.DataFrame(all_results)
@@ -211,37 +179,66 @@ class Benchmarker:
 
     async def _get_bulk_matches_from_llm_async(self, client_queries_dict, scraped_chunk_dict, cluster_id):
         """
-        Async, batched, structured LLM matching.
+        Async, token-packed, structured LLM matching through the job-wide scheduler.
+        The product list is a shared prompt prefix for every batch of the cluster, so only the
+        client queries vary and the provider can serve the prefix from its prompt cache.
         """
-        client = AsyncOpenAI(api_key=env.LLM_OPENAI_API_KEY, base_url=env.OPENAI_API_BASE)
-        model = self.model_name
         client_items = list(client_queries_dict.items())
-        batch_size = 20  
-        results = []
+        scraped_list_str = "\n".join([f'{p_idx}: "{desc}"' for p_idx, desc in scraped_chunk_dict.items()])
+        prefix_data = benchmarking_match_prompt_prefixed(client_list_str="", scraped_list_str=scraped_list_str)
+        prefix_tokens = count_tokens(prefix_data["system_message"] + prefix_data["shared_prefix"], self.model_name)
 
-        @retry(
-            retry=retry_if_exception_type((RateLimitError, APIError)),
-            wait=wait_exponential(min=2, max=30),
-            stop=stop_after_attempt(5)
+        # Size batches by a token budget (query text + expected JSON output per query)
+        output_tokens_per_query = getattr(env, 'BENCHMARK_LLM_OUTPUT_TOKENS_PER_QUERY', 60)
+        item_tokens = [count_tokens(f'{cq_id}: "{desc}"', self.model_name) + output_tokens_per_query for cq_id, desc in client_items]
+        batches = pack_batches(
+            client_items,
+            item_tokens,
+            token_budget=getattr(env, 'BENCHMARK_LLM_BATCH_TOKEN_BUDGET', 6000),
+            max_items=getattr(env, 'BENCHMARK_LLM_MAX_QUERIES_PER_BATCH', 80),
         )
+        usage = {"estimated": 0, "prompt": 0, "completion": 0, "cached": 0, "cache_hits": 0}
+        results = []
+
         async def call_llm(batch):
             client_list_str = "\n".join([f'{cq_id}: "{desc}"' for cq_id, desc in batch])
-            scraped_list_str = "\n".join([f'{p_idx}: "{desc}"' for p_idx, desc in scraped_chunk_dict.items()])
-            prompt_data = benchmarking_match_prompt(
+            prompt_data = benchmarking_match_prompt_prefixed(
                 client_list_str=client_list_str,
                 scraped_list_str=scraped_list_str
             )
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": prompt_data["system_message"]},
-                    {"role": "user", "content": prompt_data["user_template"]}
-                ],
-                temperature=0,
-                response_format={"type": "json_object"}
-            )
-            response_text = response.choices[0].message.content.strip()
+            messages = [
+                {"role": "system", "content": prompt_data["system_message"]},
+                {"role": "user", "content": prompt_data["shared_prefix"]},
+                {"role": "user", "content": prompt_data["query_message"]}
+            ]
+            response_format = {"type": "json_object"}
+            cache_key = None
+            response_text = None
+            if self.llm_cache is not None:
+                cache_key = make_cache_key(self.model_name, messages, response_format, temperature=0)
+                response_text = self.llm_cache.get(cache_key)
+            from_cache = response_text is not None
+            if from_cache:
+                usage["cache_hits"] += 1
+            else:
+                estimated_tokens = prefix_tokens + count_tokens(prompt_data["query_message"], self.model_name) + output_tokens_per_query * len(batch)
+                usage["estimated"] += estimated_tokens
+                response = await self.scheduler.chat_completion(
+                    messages,
+                    estimated_tokens,
+                    model=self.model_name,
+                    temperature=0,
+                    response_format=response_format
+                )
+                prompt_tokens, completion_tokens, cached_tokens = usage_tokens(response)
+                usage["prompt"] += prompt_tokens
+                usage["completion"] += completion_tokens
+                usage["cached"] += cached_tokens
+                response_text = response.choices[0].message.content.strip()
             data = json.loads(response_text)
+            # Write through only responses that parsed, so a malformed one is retried next run
+            if cache_key is not None and not from_cache:
+                self.llm_cache.put(cache_key, response_text)
             for key, value in data.items():
                 if isinstance(value, list):
                     self.logger.info(f"Cluster {cluster_id}: LLM returned {len(value)} matches")
@@ -249,27 +246,23 @@ class Benchmarker:
             self.logger.warning(f"Cluster {cluster_id}: No matches returned.")
             return []
 
-        tasks = []
-        for i in range(0, len(client_items), batch_size):
-            batch = client_items[i:i+batch_size]
-            tasks.append(call_llm(batch))
-        batch_results = await asyncio.gather(*tasks, return_exceptions=False)
+        tasks = [call_llm(batch) for batch in batches]
+        batch_results = await asyncio.gather(*tasks, return_exceptions=True)
         for r in batch_results:
-            if r:
+            if isinstance(r, Exception):
+                self.logger.error(f"Cluster {cluster_id}: LLM batch failed: {r}")
+            elif r:
                 results.extend(r)
+        self.logger.info(f"Cluster {cluster_id}: {len(client_items)} queries in {len(batches)} requests ({usage['cache_hits']} from cache). "
+                         f"Tokens estimated {usage['estimated']}, actual {usage['prompt'] + usage['completion']} "
+                         f"(prompt {usage['prompt']}, cached {usage['cached']}, completion {usage['completion']})")
         return results
 
-    def _get_cluster_matches(self, client_queries, scraped_products_list, cluster_id):
-        """Get matches for a cluster using LLM """
-        
-        # Create chunk dictionary with sequential indices
-        chunk_dict = {idx: item['description'] for idx, item in enumerate(scraped_products_list)}
-        
-        # Get matches from LLM
-        matches = asyncio.run(self._get_bulk_matches_from_llm_async(client_queries, chunk_dict, cluster_id))
+    def _score_cluster_matches(self, matches, client_queries, scraped_products_list, cluster_id):
+        """Combine a cluster's LLM matches with TF-IDF cosine into hybrid scores"""
         
-        # Process results and calculate hybrid scores
-        overall_best_matches = {}
+        # Resolve valid matches and the text pairs used for the cosine component
+        candidates = []
         for match in matches:
             if not all(k in match for k in ['client_query_id', 'score', 'matched_product_index']):
                 continue
@@ -289,20 +282,20 @@ class Benchmarker:
                 self.logger.warning(f"Cluster {cluster_id}: Invalid LLM index {llm_index}")
                 continue
             
-            # Calculate cosine similarity between client query and TRANSLATED product title
-            client_query_text = client_queries.get(cq_id, "")
-            
             # Use translated title for cosine similarity if available, otherwise fall back to original
             if translated_title and translated_title != 'N/A':
                 product_text_for_cosine = translated_title
-                self.logger.debug(f"Cluster {cluster_id}: Using translated title for cosine: '{translated_title}'")
             else:
                 product_text_for_cosine = scraped_products_list[llm_index]['description']
-                self.logger.debug(f"Cluster {cluster_id}: Using original description for cosine: '{product_text_for_cosine}'")
             
-            cosine_score = self._calculate_cosine_similarity(client_query_text, product_text_for_cosine)
-            
-            # Calculate hybrid score
+            candidates.append((cq_id, llm_score, original_index, translated_title, client_queries.get(cq_id, ""), product_text_for_cosine))
+
+        # Cosine similarity between client queries and (translated) product titles, scored in one pass
+        cosine_scores = pairwise_tfidf_cosine([c[4] for c in candidates], [c[5] for c in candidates])
+
+        # Calculate hybrid scores
+        overall_best_matches = {}
+        for (cq_id, llm_score, original_index, translated_title, client_query_text, product_text_for_cosine), cosine_score in zip(candidates, cosine_scores.tolist()):
             hybrid_score = self._calculate_hybrid_score(llm_score, cosine_score, llm_weight=0.7, cosine_weight=0.3)
             
             self.logger.debug(f"Cluster {cluster_id}, Query {cq_id}: LLM={llm_score:.3f}, Cosine={cosine_score:.3f}, Hybrid={hybrid_score:.3f}")
@@ -392,7 +385,8 @@ def setup_logging() -> logging.Logger:
     return logger
 
 
-def run_benchmarking_job(workspace_id: str, s3_path: str, url: str, secret_name: str, region_name: str = "us-east-1",benchmarking_row_id: str = None):
+def run_benchmarking_job(workspace_id: str, s3_path: str, url: str, secret_name: str, region_name: str = "us-east-1",benchmarking_row_id: str = None,
+                         use_llm_cache: bool = True):
     """
     Runs the benchmarking job for a given workspace.
     Args:
@@ -401,6 +395,8 @@ def run_benchmarking_job(workspace_id: str, s3_path: str, url: str, secret_name:
         url: The URL for benchmarking.
         secret_name: The name of the Snowflake secret in AWS Secrets Manager.
         region_name: The AWS region where the secret is stored (default: "us-east-1").
+        use_llm_cache: Serve and store match responses in the local LLM cache; pass
+            event.get("llm_cache", True) so a job can opt out (default: True).
     """
     logger = setup_logging()
     temp_run_dir = os.path.join(env.BASE_TEMP_DIR, f"benchmark_{workspace_id}")
@@ -416,7 +412,7 @@ def run_benchmarking_job(workspace_id: str, s3_path: str, url: str, secret_name:
             pass
 
         # Instantiate the Benchmarker class with the required arguments
-        benchmarker = Benchmarker(logger, secret_name, region_name)
+        benchmarker = Benchmarker(logger, secret_name, region_name, use_llm_cache=use_llm_cache)
 
         # Run the benchmarking process
         benchmark_df = benchmarker.run(workspace_id, s3_path, url)
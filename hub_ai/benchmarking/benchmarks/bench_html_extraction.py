@@ -0,0 +1,76 @@
+"""
+Micro-benchmark of the HTML extraction backends: BeautifulSoup (html.parser) against lxml.
+
+Run from hub_ai:
+    python -m benchmarking.benchmarks.bench_html_extraction --cards 60 --repeat 20 [--product-html page.html ...]
+
+Result pages are built from each website config's sample_html (RAKUTEN_SAMPLE_HTML,
+AMAZON_UAE_SAMPLE_HTML, ...) repeated --cards times; --product-html adds saved Amazon product pages.
+"""
+import time
+import argparse
+
+import benchmarking.config as config
+from benchmarking.html_extraction import SiteExtractor, parse_html
+from benchmarking.amazon_crawler import ComprehensiveScraper
+
+BACKENDS = ("bs4", "lxml")
+
+
+def results_page(sample_html: str, cards: int) -> str:
+    return f"<html><head><title>results</title></head><body>{sample_html * cards}</body></html>"
+
+
+def _best_of(fn, repeat: int):
+    result, best = None, float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def _compare(label: str, runs: dict):
+    (bs4_result, bs4_seconds), (lxml_result, lxml_seconds) = runs["bs4"], runs["lxml"]
+    print(f"{label:<42}{bs4_seconds * 1000:>11.2f}{lxml_seconds * 1000:>11.2f}"
+          f"{bs4_seconds / lxml_seconds:>9.1f}x  {bs4_result == lxml_result}")
+
+
+def run(cards: int, repeat: int, product_pages=()):
+    print(f"{'page (best of ' + str(repeat) + ')':<42}{'bs4 (ms)':>11}{'lxml (ms)':>11}{'speedup':>10}  same output")
+
+    # web_scrapper.scrape_query: one parse, base selector check, then every schema field per item
+    for site, site_config in config.website_configs.items():
+        html = results_page(site_config["sample_html"], cards)
+        schema = {"baseSelector": site_config["extraction_css_selector"], "fields": site_config["product_schema"]}
+        extractors = {backend: SiteExtractor(schema, backend=backend) for backend in BACKENDS}
+        _compare(f"{site} ({cards} cards)",
+                 {backend: _best_of(lambda: extractors[backend].extract("", html), repeat) for backend in BACKENDS})
+
+    # amazon_crawler search results, on the Amazon samples that carry data-asin containers
+    scraper = ComprehensiveScraper(domain="amazon.ae")
+    for name in ("AMAZON_SA_SAMPLE_HTML", "AMAZON_UAE_SAMPLE_HTML"):
+        html = results_page(getattr(config, name), cards)
+        _compare(f"search results: {name}",
+                 {backend: _best_of(lambda: scraper._extract_search_results(parse_html(html, backend), 1), repeat)
+                  for backend in BACKENDS})
+
+    for path in product_pages:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+
+        def product_info(backend):
+            info = scraper._extract_complete_product_info(parse_html(html, backend), "https://www.amazon.ae/dp/B000000000")
+            info.pop("timestamp", None)
+            return info
+        _compare(f"product page: {path[-30:]}", {backend: _best_of(lambda: product_info(backend), repeat)
+                                                 for backend in BACKENDS})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cards", type=int, default=60, help="sample product cards per results page")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--product-html", nargs="*", default=[], help="saved Amazon product pages (.html)")
+    args = parser.parse_args()
+    run(args.cards, args.repeat, args.product_html)
@@ -0,0 +1,69 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Hashable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def valid_text_mask(values: pd.Series) -> np.ndarray:
+    """Boolean mask of entries that are non-empty strings after stripping."""
+    if not (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+        return np.zeros(len(values), dtype=bool)
+    lengths = values.str.strip().str.len()  # non-strings become NaN
+    return lengths.fillna(0).to_numpy(dtype=np.int64) > 0
+
+
+class ClusterPartition:
+    """
+    Sort-by-cluster index over a DataFrame.
+
+    The frame is stably reordered once so every cluster is one contiguous block, and
+    per-cluster access is an `iloc` slice instead of a boolean scan of the full frame.
+    Row order within a cluster is preserved, so positional indices into a slice match
+    the old `df[df[col] == cluster_id].reset_index(drop=True)` frames.
+    """
+
+    def __init__(self, df: pd.DataFrame, column: str):
+        self.column = column
+        codes = df[column].to_numpy()
+        order = np.argsort(codes, kind="stable")
+        self.frame = df.iloc[order].reset_index(drop=True)
+        keys, starts, counts = np.unique(codes[order], return_index=True, return_counts=True)
+        self._bounds: Dict[Hashable, Tuple[int, int]] = {
+            key: (int(start), int(start + count))
+            for key, start, count in zip(keys.tolist(), starts.tolist(), counts.tolist())
+        }
+
+    def __contains__(self, cluster_id) -> bool:
+        return cluster_id in self._bounds
+
+    def __len__(self) -> int:
+        return len(self._bounds)
+
+    def cluster_ids(self) -> List[Hashable]:
+        return list(self._bounds.keys())
+
+    def bounds(self, cluster_id) -> Tuple[int, int]:
+        """[start, end) row offsets of a cluster in `self.frame`."""
+        return self._bounds.get(cluster_id, (0, 0))
+
+    def size(self, cluster_id) -> int:
+        start, end = self.bounds(cluster_id)
+        return end - start
+
+    def get(self, cluster_id) -> pd.DataFrame:
+        """Rows of one cluster as a contiguous slice (empty frame if the cluster is absent)."""
+        start, end = self.bounds(cluster_id)
+        return self.frame.iloc[start:end]
+
+    def valid_positions(self, cluster_id, mask: np.ndarray, limit: int = None) -> np.ndarray:
+        """
+        Cluster-local positions where `mask` (aligned with `self.frame`) is True.
+
+        `limit` applies to the cluster's leading rows before filtering, matching `head(limit)`.
+        """
+        start, end = self.bounds(cluster_id)
+        if limit is not None:
+            end = min(end, start + limit)
+        return np.flatnonzero(mask[start:end])
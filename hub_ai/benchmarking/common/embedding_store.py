@@ -0,0 +1,231 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 16
+INITIAL_ROWS = 4096
+FLUSH_EVERY = 1000
+
+
+def normalize_embedding_text(text: str) -> str:
+    """Lowercases and collapses whitespace so trivially different strings share one entry."""
+    return " ".join(str(text).lower().split())
+
+
+class EmbeddingStore:
+    """
+    Persistent, content-addressed embedding store.
+
+    Vectors live in a memory-mapped float32 matrix (`vectors.f32`); the index is a compact
+    array of 16-byte BLAKE2b keys (`keys.npy`) plus a last-used tick per slot (`last_used.npy`).
+    Keys are derived from the model name and the normalized text. When the store reaches
+    `max_entries`, the least recently used slots are reused. All public methods are
+    thread-safe so the cluster thread pool can read and write concurrently.
+    """
+
+    def __init__(self, cache_dir: str, model: str, max_entries: int = 500000, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.model = model
+        self.max_entries = int(max_entries)
+        safe_model = "".join(c if c.isalnum() or c in "-_." else "_" for c in model)
+        self.store_dir = os.path.join(cache_dir, safe_model)
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.store_dir, "vectors.f32")
+        self.keys_path = os.path.join(self.store_dir, "keys.npy")
+        self.last_used_path = os.path.join(self.store_dir, "last_used.npy")
+        self.meta_path = os.path.join(self.store_dir, "meta.json")
+
+        self._lock = threading.RLock()
+        self._dim: Optional[int] = None
+        self._rows = 0
+        self._size = 0
+        self._tick = 0
+        self._vectors: Optional[np.memmap] = None
+        self._keys = np.zeros((0, KEY_BYTES), dtype=np.uint8)
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._slots: Dict[bytes, int] = {}
+        self._free: List[int] = []
+        self._pending_writes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+        self._load()
+
+    def _key(self, text: str) -> bytes:
+        payload = f"{self.model}\x00{normalize_embedding_text(text)}".encode("utf-8")
+        return hashlib.blake2b(payload, digest_size=KEY_BYTES).digest()
+
+    def _load(self):
+        """Load the index and map the vector file if a previous store exists."""
+        if not os.path.exists(self.meta_path):
+            return
+        try:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            if meta.get("model") != self.model:
+                self.logger.warning(f"Embedding store at {self.store_dir} belongs to model {meta.get('model')}. Starting empty.")
+                return
+            dim, rows, size = int(meta["dim"]), int(meta["rows"]), int(meta["size"])
+            keys = np.load(self.keys_path)
+            last_used = np.load(self.last_used_path)
+            if len(keys) != rows or len(last_used) != rows or os.path.getsize(self.vectors_path) < rows * dim * 4:
+                raise ValueError("index and vector file sizes disagree")
+            self._dim, self._rows, self._size = dim, rows, size
+            self._tick = int(meta.get("tick", 0))
+            self._keys = keys.astype(np.uint8).reshape(rows, KEY_BYTES)
+            self._last_used = last_used.astype(np.int64)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(rows, dim))
+            for slot in range(size):
+                if self._keys[slot].any():
+                    self._slots[self._keys[slot].tobytes()] = slot
+                else:
+                    self._free.append(slot)
+            self.logger.info(f"Loaded embedding store from {self.store_dir}: {len(self._slots)} entries, dim={dim}")
+        except Exception as e:
+            self.logger.warning(f"Could not load embedding store from {self.store_dir}: {e}. Starting empty.")
+            self._dim, self._rows, self._size, self._tick = None, 0, 0, 0
+            self._vectors = None
+            self._keys = np.zeros((0, KEY_BYTES), dtype=np.uint8)
+            self._last_used = np.zeros(0, dtype=np.int64)
+            self._slots, self._free = {}, []
+
+    def _write_index(self):
+        """Atomically persist keys, ticks and metadata. Vectors are flushed first."""
+        if self._vectors is not None:
+            self._vectors.flush()
+        meta = {"model": self.model, "dim": self._dim, "rows": self._rows, "size": self._size, "tick": self._tick}
+        for path, array in ((self.keys_path, self._keys), (self.last_used_path, self._last_used)):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        tmp_meta = f"{self.meta_path}.tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, self.meta_path)
+        self._pending_writes = 0
+
+    def _ensure_rows(self, needed: int):
+        """Grow the memory-mapped matrix (doubling, capped at max_entries) to hold `needed` rows."""
+        if needed <= self._rows:
+            return
+        new_rows = min(max(needed, self._rows * 2, INITIAL_ROWS), self.max_entries)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(new_rows * self._dim * 4)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(new_rows, self._dim))
+        self._keys = np.concatenate([self._keys, np.zeros((new_rows - self._rows, KEY_BYTES), dtype=np.uint8)])
+        self._last_used = np.concatenate([self._last_used, np.zeros(new_rows - self._rows, dtype=np.int64)])
+        self._rows = new_rows
+
+    def _allocate(self, count: int, protected: set) -> List[int]:
+        """Return `count` writable slots, reusing free slots, growing, then evicting LRU entries."""
+        slots = []
+        while self._free and len(slots) < count:
+            slots.append(self._free.pop())
+        if len(slots) < count and self._size < self.max_entries:
+            take = min(count - len(slots), self.max_entries - self._size)
+            self._ensure_rows(self._size + take)
+            slots.extend(range(self._size, self._size + take))
+            self._size += take
+        remaining = count - len(slots)
+        if remaining > 0:
+            protected = set(protected) | set(slots)
+            ticks = self._last_used[:self._size].copy()
+            if protected:
+                ticks[list(protected)] = np.iinfo(np.int64).max
+            remaining = min(remaining, self._size - len(protected))
+            if remaining > 0:
+                victims = np.argpartition(ticks, remaining - 1)[:remaining]
+                for slot in victims.tolist():
+                    self._slots.pop(self._keys[slot].tobytes(), None)
+                    self._keys[slot] = 0
+                    slots.append(slot)
+                self.evictions += len(victims)
+                # Persist the eviction before the slots are overwritten so a crash never maps an old key to a new vector.
+                self._write_index()
+        return slots
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached vector for each text, or None on a miss."""
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            self._tick += 1
+            for text in texts:
+                slot = self._slots.get(self._key(text))
+                if slot is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    self._last_used[slot] = self._tick
+                    results.append(np.array(self._vectors[slot]))
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[np.ndarray]):
+        """Insert or overwrite vectors for the given texts."""
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(texts):
+            raise ValueError(f"Expected {len(texts)} vectors, got array of shape {matrix.shape}")
+        with self._lock:
+            if self._dim is None:
+                self._dim = int(matrix.shape[1])
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match store dimension {self._dim}")
+            self._tick += 1
+            keys = [self._key(t) for t in texts]
+            unique_rows: Dict[bytes, int] = {}
+            for i, key in enumerate(keys):
+                unique_rows[key] = i
+            existing = {self._slots[k] for k in unique_rows if k in self._slots}
+            new_keys = [k for k in unique_rows if k not in self._slots]
+            new_slots = self._allocate(len(new_keys), existing)
+            for key, slot in zip(new_keys, new_slots):
+                self._slots[key] = slot
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            for key, row in unique_rows.items():
+                slot = self._slots.get(key)
+                if slot is None:
+                    continue  # store is smaller than a single batch
+                self._vectors[slot] = matrix[row]
+                self._last_used[slot] = self._tick
+            self.writes += len(unique_rows)
+            self._pending_writes += len(unique_rows)
+            if self._pending_writes >= FLUSH_EVERY:
+                self._write_index()
+
+    def flush(self):
+        """Persist pending vectors and the index to disk."""
+        with self._lock:
+            if self._dim is not None:
+                self._write_index()
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._slots)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for the current process, suitable for the job log."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._slots),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
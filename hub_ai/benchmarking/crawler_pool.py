@@ -0,0 +1,165 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+import aiohttp
+from crawl4ai import AsyncWebCrawler
+from loguru import logger
+
+# Warm browsers kept per process, and pages a browser serves before it is replaced
+CRAWLER_POOL_SIZE = int(os.getenv("CRAWLER_POOL_SIZE", "2"))
+CRAWLER_MAX_PAGES_PER_CONTEXT = int(os.getenv("CRAWLER_MAX_PAGES_PER_CONTEXT", "50"))
+
+
+class _PooledCrawler:
+    """One pool slot: a started crawler (None while it is being replaced) and the pages it has served."""
+
+    def __init__(self, slot_id: int):
+        self.slot_id = slot_id
+        self.crawler = None
+        self.pages = 0
+
+
+class CrawlerPool:
+    """
+    Keeps `size` started AsyncWebCrawler browsers and one aiohttp session for the event loop it runs
+    in, and leases a browser to one page crawl at a time:
+
+        async with CrawlerPool(size=2) as pool:
+            async with pool.lease() as crawler:
+                results = await crawler.arun(url=..., config=...)
+
+    A browser is replaced after `max_pages_per_context` pages, or as soon as a crawl leased on it
+    raises. The replacement starts in the background and the next lease gets it once it is warm.
+    `metrics()` reports how saturated the pool is.
+    """
+
+    def __init__(self, size: int = CRAWLER_POOL_SIZE, max_pages_per_context: int = CRAWLER_MAX_PAGES_PER_CONTEXT,
+                 crawler_factory: Callable[[], Any] = AsyncWebCrawler):
+        self.size = max(1, size)
+        self.max_pages_per_context = max(1, max_pages_per_context)
+        self.crawler_factory = crawler_factory
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._slots: List[_PooledCrawler] = []
+        self._restarts: set = set()
+        self._closed = False
+        self._in_use = 0
+        self._waiting = 0
+        self._counters = {"leases": 0, "recycles": 0, "errors": 0, "start_failures": 0,
+                          "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    async def __aenter__(self) -> "CrawlerPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        self.session = aiohttp.ClientSession()
+        self._idle = asyncio.Queue()
+        self._slots = [_PooledCrawler(i) for i in range(self.size)]
+        await asyncio.gather(*(self._start_crawler(slot) for slot in self._slots))
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+        warm = sum(slot.crawler is not None for slot in self._slots)
+        logger.info(f"Crawler pool started: {warm}/{self.size} browsers warm")
+
+    async def close(self):
+        self._closed = True
+        for task in list(self._restarts):
+            task.cancel()
+        await asyncio.gather(*self._restarts, return_exceptions=True)
+        await asyncio.gather(*(self._close_crawler(slot) for slot in self._slots))
+        if self.session is not None:
+            await self.session.close()
+        logger.info(f"Crawler pool closed: {self.metrics()}")
+
+    async def _start_crawler(self, slot: _PooledCrawler):
+        crawler = None
+        try:
+            crawler = self.crawler_factory()
+            await crawler.start()
+        except asyncio.CancelledError:
+            # Pool closing while this browser was launching: do not leave it running
+            if crawler is not None:
+                await asyncio.shield(crawler.close())
+            raise
+        except Exception as e:
+            self._counters["start_failures"] += 1
+            logger.warning(f"Crawler pool: browser {slot.slot_id} failed to start: {e}")
+            return
+        slot.crawler, slot.pages = crawler, 0
+
+    async def _close_crawler(self, slot: _PooledCrawler):
+        crawler, slot.crawler = slot.crawler, None
+        if crawler is None:
+            return
+        try:
+            await crawler.close()
+        except Exception as e:
+            logger.warning(f"Crawler pool: closing browser {slot.slot_id} failed: {e}")
+
+    async def _recycle(self, slot: _PooledCrawler, reason: str):
+        """Replaces the slot's browser, then returns the slot to the idle queue."""
+        logger.debug(f"Crawler pool: recycling browser {slot.slot_id} ({reason}, {slot.pages} pages)")
+        self._counters["recycles"] += 1
+        await self._close_crawler(slot)
+        if not self._closed:
+            await self._start_crawler(slot)
+        # A slot whose browser failed to start is retried by the next lease
+        self._idle.put_nowait(slot)
+
+    @asynccontextmanager
+    async def lease(self):
+        """Leases a started crawler for one page crawl, waiting while every browser is busy."""
+        if self._idle is None or self._closed:
+            raise RuntimeError("CrawlerPool is not running; use it as 'async with CrawlerPool() as pool'")
+        self._waiting += 1
+        waited_from = time.monotonic()
+        try:
+            slot = await self._idle.get()
+        finally:
+            self._waiting -= 1
+        waited = time.monotonic() - waited_from
+        self._counters["leases"] += 1
+        self._counters["wait_seconds_total"] += waited
+        self._counters["wait_seconds_max"] = max(self._counters["wait_seconds_max"], waited)
+        self._in_use += 1
+
+        failed = True
+        try:
+            if slot.crawler is None:
+                await self._start_crawler(slot)
+                if slot.crawler is None:
+                    raise RuntimeError(f"Crawler pool: browser {slot.slot_id} could not be started")
+            yield slot.crawler
+            failed = False
+        finally:
+            self._in_use -= 1
+            slot.pages += 1
+            if failed:
+                self._counters["errors"] += 1
+            if failed or slot.pages >= self.max_pages_per_context:
+                # Replaced in the background so the caller is not held up by a browser launch
+                task = asyncio.ensure_future(self._recycle(slot, "error" if failed else "page limit"))
+                self._restarts.add(task)
+                task.add_done_callback(self._restarts.discard)
+            else:
+                self._idle.put_nowait(slot)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Pool saturation: browsers in use, idle and waited for, plus lease, recycle and wait counters."""
+        idle = self._idle.qsize() if self._idle is not None else 0
+        metrics = {
+            "size": self.size,
+            "in_use": self._in_use,
+            "idle": idle,
+            "waiting": self._waiting,
+            "saturation": self._in_use / self.size,
+            **self._counters,
+        }
+        metrics["wait_seconds_avg"] = metrics["wait_seconds_total"] / metrics["leases"] if metrics["leases"] else 0.0
+        return metrics
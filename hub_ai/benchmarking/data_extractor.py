@@ -81,7 +81,8 @@ def fetch_snowflake_data(
         snowflake_query_details = {
             "query": "B2B_QUERY",
             "cluster_id": "CLUSTER_ID",
-            "description": "ITEM_DESCRIPTION"
+            "description": "ITEM_DESCRIPTION",
+            "response": "RESPONSE"
         }
 
         # If material description is provided, filter by it
@@ -110,7 +111,11 @@ def fetch_snowflake_data(
                         "{snowflake_query_details['query']}",
                         ROW_NUMBER() OVER (
                             PARTITION BY "{snowflake_query_details['cluster_id']}"
-                            ORDER BY "{snowflake_query_details['query']}"
+                            -- Prefer the cluster's representative query when normalization recorded one
+                            ORDER BY IFF(
+                                "{snowflake_query_details['query']}" = TRY_PARSE_JSON("{snowflake_query_details['response']}"):"Cluster_Query"::STRING,
+                                0, 1
+                            ), "{snowflake_query_details['query']}"
                         ) AS rn
                     FROM "{conn.database}"."{schema_name}"."{table_name}"
                 )
@@ -0,0 +1,124 @@
+import os
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Mapping, Optional, TypeVar
+from urllib.parse import urlparse
+from loguru import logger
+
+# Pages fetched at once from one domain, and the minimum time between two requests to it
+DOMAIN_MAX_CONCURRENT_PAGES = int(os.getenv("DOMAIN_MAX_CONCURRENT_PAGES", "2"))
+DOMAIN_MIN_REQUEST_GAP_SECONDS = float(os.getenv("DOMAIN_MIN_REQUEST_GAP_SECONDS", "0.5"))
+# Pause after a block without Retry-After (doubling per consecutive block), and the longest pause
+DOMAIN_BACKOFF_SECONDS = float(os.getenv("DOMAIN_BACKOFF_SECONDS", "5"))
+DOMAIN_MAX_BACKOFF_SECONDS = float(os.getenv("DOMAIN_MAX_BACKOFF_SECONDS", "120"))
+# Attempts at a blocked page before giving up on it
+DOMAIN_MAX_ATTEMPTS = int(os.getenv("DOMAIN_MAX_ATTEMPTS", "3"))
+
+# Status codes sites answer with when they throttle or block a scraper
+BLOCK_STATUS_CODES = {429, 503}
+
+T = TypeVar("T")
+
+
+class PageBlocked(Exception):
+    """A fetch the site refused as too frequent; retry_after is the wait it asked for, if any."""
+
+    def __init__(self, url: str, status: Optional[int], retry_after: Optional[float] = None):
+        super().__init__(f"{url} blocked with status {status}")
+        self.url, self.status, self.retry_after = url, status, retry_after
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds from a Retry-After header, given either as delta-seconds or as an HTTP date."""
+    value = next((v for k, v in (headers or {}).items() if k.lower() == "retry-after"), None)
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def raise_if_blocked(url: str, status: Optional[int], headers: Optional[Mapping[str, str]] = None):
+    if status in BLOCK_STATUS_CODES:
+        raise PageBlocked(url, status, retry_after_seconds(headers))
+
+
+class _Domain:
+    def __init__(self, max_concurrent: int):
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+        self.blocks = 0
+
+
+class DomainScheduler:
+    """
+    Politeness per domain for page fetches on one event loop: at most `max_concurrent` requests
+    in flight to a domain, starts at least `min_gap` seconds apart, and a pause for the whole
+    domain when a fetch raises PageBlocked (the Retry-After it sent, else exponential backoff):
+
+        page = await scheduler.fetch(url, lambda: fetch_page(url, ...))
+    """
+
+    def __init__(self, max_concurrent: int = DOMAIN_MAX_CONCURRENT_PAGES,
+                 min_gap: float = DOMAIN_MIN_REQUEST_GAP_SECONDS, backoff: float = DOMAIN_BACKOFF_SECONDS,
+                 max_backoff: float = DOMAIN_MAX_BACKOFF_SECONDS, max_attempts: int = DOMAIN_MAX_ATTEMPTS):
+        self.max_concurrent = max(1, max_concurrent)
+        self.min_gap = max(0.0, min_gap)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max(1, max_attempts)
+        self._domains: Dict[str, _Domain] = {}
+
+    def _domain(self, url: str) -> _Domain:
+        host = urlparse(url).netloc.lower()
+        if host not in self._domains:
+            self._domains[host] = _Domain(self.max_concurrent)
+        return self._domains[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Holds one of the domain's request slots, entered once the domain's next start time is reached."""
+        domain = self._domain(url)
+        async with domain.slots:
+            async with domain.lock:
+                # Start times are handed out in turn, so concurrent fetches stay min_gap apart
+                delay = domain.next_start - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                domain.next_start = max(domain.next_start, time.monotonic() + self.min_gap)
+            yield
+
+    def _pause(self, url: str, retry_after: Optional[float]) -> float:
+        domain = self._domain(url)
+        domain.blocks += 1
+        if retry_after is None:
+            retry_after = self.backoff * 2 ** (domain.blocks - 1) * random.uniform(1.0, 1.25)
+        pause = min(retry_after, self.max_backoff)
+        domain.next_start = max(domain.next_start, time.monotonic() + pause)
+        return pause
+
+    async def fetch(self, url: str, fetch: Callable[[], Awaitable[T]]) -> T:
+        """Runs `fetch()` in a slot of the url's domain, retrying after a pause while it raises PageBlocked."""
+        for attempt in range(1, self.max_attempts + 1):
+            async with self.slot(url):
+                try:
+                    result = await fetch()
+                except PageBlocked as blocked:
+                    if attempt == self.max_attempts:
+                        raise
+                    pause = self._pause(url, blocked.retry_after)
+                    logger.warning(f"{blocked}; pausing {urlparse(url).netloc} for {pause:.1f}s "
+                                   f"(attempt {attempt}/{self.max_attempts})")
+                    continue
+            self._domain(url).blocks = 0
+            return result
@@ -0,0 +1,168 @@
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from bs4 import BeautifulSoup
+from loguru import logger
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    from cssselect import HTMLTranslator
+except ImportError:
+    etree = None
+
+# "lxml" (libxml2 parser, selectors compiled to XPath once) or "bs4" (BeautifulSoup with html.parser)
+HTML_PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND", "lxml")
+
+# BeautifulSoup's get_text() leaves out the contents of these tags
+_NON_TEXT_TAGS = ("script", "style", "template")
+
+
+def _backend(backend: Optional[str]) -> str:
+    backend = backend or HTML_PARSER_BACKEND
+    if backend == "lxml" and etree is None:
+        logger.warning("lxml/cssselect not installed; parsing HTML with BeautifulSoup")
+        return "bs4"
+    return backend
+
+
+if etree is not None:
+    _TRANSLATOR = HTMLTranslator()
+    _TEXT_NODES = etree.XPath("descendant::text()[not(ancestor::script or ancestor::style or ancestor::template)]",
+                              smart_strings=False)
+    _ALL_TEXT_NODES = etree.XPath("descendant::text()", smart_strings=False)
+
+
+@lru_cache(maxsize=2048)
+def compiled_selector(selector: str):
+    """CSS selector compiled to an XPath over the context element and its descendants, in document order."""
+    return etree.XPath(_TRANSLATOR.css_to_xpath(selector), smart_strings=False)
+
+
+@lru_cache(maxsize=2048)
+def compiled_first_selector(selector: str):
+    """Like `compiled_selector`, but stops at the first two matches (one may be the context element itself)."""
+    return etree.XPath(f"({_TRANSLATOR.css_to_xpath(selector)})[position() <= 2]", smart_strings=False)
+
+
+class LxmlNode:
+    """
+    An lxml element behind the subset of the BeautifulSoup Tag API the scrapers use: select,
+    select_one, get_text, get and str(). Like soupsieve, select only returns descendants.
+    """
+    __slots__ = ("element",)
+
+    def __init__(self, element):
+        self.element = element
+
+    def select(self, selector: str) -> List["LxmlNode"]:
+        return [LxmlNode(e) for e in compiled_selector(selector)(self.element) if e is not self.element]
+
+    def select_one(self, selector: str) -> Optional["LxmlNode"]:
+        for e in compiled_first_selector(selector)(self.element):
+            if e is not self.element:
+                return LxmlNode(e)
+        return None
+
+    def get_text(self, separator: str = "", strip: bool = False) -> str:
+        element = self.element
+        texts = (_ALL_TEXT_NODES if element.tag in _NON_TEXT_TAGS else _TEXT_NODES)(element)
+        if strip:
+            return separator.join(t for t in (t.strip() for t in texts) if t)
+        return separator.join(texts)
+
+    def get(self, attribute: str, default: Any = None) -> Any:
+        return self.element.get(attribute, default)
+
+    def __str__(self) -> str:
+        return etree.tostring(self.element, encoding="unicode", method="html", with_tail=False)
+
+
+def parse_html(html: str, backend: Optional[str] = None):
+    """
+    Parses a page with the configured backend. Both return a document with select/select_one/
+    get_text/get, so extraction code works unchanged on either.
+    """
+    if _backend(backend) == "bs4":
+        return BeautifulSoup(html, "html.parser")
+    if not html or not html.strip():
+        return LxmlNode(lxml_html.Element("html"))
+    # Decoded text is passed as UTF-8 bytes, so a <meta charset> or XML declaration cannot re-decode it
+    parser = lxml_html.HTMLParser(encoding="utf-8")
+    return LxmlNode(lxml_html.document_fromstring(html.encode("utf-8"), parser=parser))
+
+
+class SiteExtractor:
+    """
+    Extracts items the way crawl4ai's JsonCssExtractionStrategy does for a {"baseSelector",
+    "fields"} schema of text, attribute, html and regex fields, from one parse of the page. With
+    the lxml backend the base and field selectors are compiled once per site and every field is
+    resolved within its item's subtree, instead of the whole document being searched again.
+    """
+
+    FIELD_TYPES = ("text", "attribute", "html", "regex")
+
+    def __init__(self, schema: Dict[str, Any], backend: Optional[str] = None):
+        self.schema = schema
+        self.backend = _backend(backend)
+        self.base_selector = schema["baseSelector"]
+        self.fields = list(schema.get("baseFields", [])) + list(schema["fields"])
+        unsupported = {f.get("type") for f in self.fields} - set(self.FIELD_TYPES)
+        if unsupported:
+            raise ValueError(f"SiteExtractor does not support field types {sorted(unsupported)}")
+        self._patterns = {f["name"]: re.compile(f["pattern"]) for f in self.fields if f["type"] == "regex"}
+        if self.backend == "lxml":
+            # Compile up front: a bad selector fails here rather than on every page
+            for selector in [self.base_selector] + [f["selector"] for f in self.fields if "selector" in f]:
+                compiled_selector(selector)
+                compiled_first_selector(selector)
+
+    def base_elements(self, document) -> list:
+        return document.select(self.base_selector)
+
+    def extract(self, url: str, html: str) -> List[Dict[str, Any]]:
+        return self.extract_items(self.base_elements(parse_html(html, self.backend)))
+
+    def extract_items(self, base_elements: list) -> List[Dict[str, Any]]:
+        items = []
+        for element in base_elements:
+            item = {}
+            for field in self.fields:
+                value = self._field_value(element, field)
+                if value is not None:
+                    item[field["name"]] = value
+            if item:
+                items.append(item)
+        return items
+
+    def _field_value(self, element, field: Dict[str, Any]):
+        if "selector" in field:
+            element = element.select_one(field["selector"])
+            if element is None:
+                return field.get("default")
+        field_type = field["type"]
+        if field_type == "text":
+            value = element.get_text(strip=True)
+        elif field_type == "attribute":
+            value = element.get(field["attribute"])
+        elif field_type == "html":
+            value = str(element)
+        else:
+            match = self._patterns[field["name"]].search(element.get_text(strip=True))
+            value = match.group(1) if match else None
+        transform = field.get("transform")
+        if value is not None and transform in ("lowercase", "uppercase", "strip"):
+            value = {"lowercase": str.lower, "uppercase": str.upper, "strip": str.strip}[transform](value)
+        return value if value is not None else field.get("default")
+
+
+_site_extractors: Dict[str, SiteExtractor] = {}
+
+
+def site_extractor(site: str, schema: Dict[str, Any]) -> SiteExtractor:
+    """The site's extractor, built (and its selectors compiled) on first use."""
+    extractor = _site_extractors.get(site)
+    if extractor is None or extractor.schema != schema:
+        extractor = _site_extractors[site] = SiteExtractor(schema)
+    return extractor
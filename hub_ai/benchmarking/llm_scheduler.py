@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import random
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Dict, List, Optional
+
+from openai import AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+from benchmarking.common.rate_limiter import AsyncTokenBucket
+from benchmarking.prompt_packing import usage_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrency:
+    """AIMD in-flight limit: +1 per window of successes, halved on a rate-limit response."""
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_rate_limited(self):
+        self.limit = max(self.minimum, self.limit / 2.0)
+
+
+class LLMScheduler:
+    """
+    Job-wide LLM request scheduler.
+
+    Owns one long-lived event loop (on a background thread) and one pooled AsyncOpenAI client.
+    Every chat completion goes through a requests-per-minute and tokens-per-minute token bucket
+    and an adaptive concurrency limit that backs off on 429s. Work is submitted from any thread
+    as a coroutine and comes back as a `concurrent.futures.Future`, so callers can stream
+    per-cluster results with `as_completed`.
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, requests_per_minute: int = 500,
+                 tokens_per_minute: int = 800000, max_concurrency: int = 32, max_retries: int = 6,
+                 timeout: float = 180.0, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_retries = max_retries
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-scheduler", daemon=True)
+        self._thread.start()
+
+        async def _setup():
+            self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+            self.request_bucket = AsyncTokenBucket(requests_per_minute)
+            self.token_bucket = AsyncTokenBucket(tokens_per_minute)
+            self.concurrency = AdaptiveConcurrency(initial=max(1, max_concurrency // 4), maximum=max_concurrency)
+
+        asyncio.run_coroutine_threadsafe(_setup(), self._loop).result()
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "estimated_tokens": 0,
+                      "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the scheduler loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def chat_completion(self, messages: List[Dict[str, str]], estimated_tokens: int, **kwargs) -> Any:
+        """Rate-limited chat completion with retries on 429, connection errors, timeouts and 5xx responses."""
+        for attempt in range(self.max_retries + 1):
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(estimated_tokens)
+            self.stats["estimated_tokens"] += estimated_tokens
+            try:
+                async with self.concurrency:
+                    self.stats["requests"] += 1
+                    response = await self.client.chat.completions.create(messages=messages, **kwargs)
+                prompt_tokens, completion_tokens, cached_tokens = usage_tokens(response)
+                if prompt_tokens or completion_tokens:
+                    self.stats["prompt_tokens"] += prompt_tokens
+                    self.stats["completion_tokens"] += completion_tokens
+                    self.stats["cached_tokens"] += cached_tokens
+                    self.token_bucket.adjust(prompt_tokens + completion_tokens - estimated_tokens)
+                self.concurrency.on_success()
+                return response
+            except RateLimitError as e:
+                self.stats["rate_limited"] += 1
+                self.concurrency.on_rate_limited()
+                self.token_bucket.drain()
+                delay = self._retry_after(e) or min(60.0, 2.0 ** attempt)
+                self.logger.warning(f"LLM rate limited (attempt {attempt + 1}), concurrency now {int(self.concurrency.limit)}, retrying in {delay:.1f}s")
+                if attempt == self.max_retries:
+                    raise
+            except (APIConnectionError, APITimeoutError, InternalServerError) as e:
+                # Only transient failures are retried; other 4xx (bad request, auth, not found) raise at once
+                self.stats["errors"] += 1
+                if attempt == self.max_retries:
+                    raise
+                delay = min(30.0, 2.0 ** attempt)
+                self.logger.warning(f"LLM request failed (attempt {attempt + 1}): {e}. Retrying in {delay:.1f}s")
+            await asyncio.sleep(delay * (0.5 + random.random()))
+
+    @staticmethod
+    def _retry_after(error: RateLimitError) -> Optional[float]:
+        try:
+            value = error.response.headers.get("retry-after")
+            return float(value) if value is not None else None
+        except Exception:
+            return None
+
+    def close(self):
+        """Close the pooled client and stop the loop."""
+        if not self._loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result(timeout=30)
+        except Exception as e:
+            self.logger.warning(f"Error closing LLM client: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=30)
+        self._loop.close()
+        self.logger.info(f"LLM scheduler stats: {self.stats}")
@@ -42,6 +42,36 @@ LLM_TIMEOUT_SECONDS = 120
 LLM_MAX_RETRIES = 3
 LLM_MAX_WORKERS_NORMALIZATION = 4
 
+# --- LLM Response Cache ---
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = os.path.join(BASE_TEMP_DIR, "llm_cache", "responses.sqlite3")
+LLM_CACHE_TTL_SECONDS = 30 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 200000
+
+# --- Embedding Configuration ---
+EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_BATCH_SIZE = 1000
+EMBEDDING_MAX_TOKENS_PER_REQUEST = 250000
+EMBEDDING_MAX_CONCURRENCY = 4
+EMBEDDING_CACHE_DIR = os.path.join(BASE_TEMP_DIR, "embedding_cache")
+EMBEDDING_CACHE_MAX_ENTRIES = 500000
+
+# --- Benchmarking Configuration ---
+BENCHMARK_MAX_PRODUCTS_PER_CLUSTER = 100
+BENCHMARK_MATCHING_MODE = "cluster"  # "cluster" (within-cluster blocks) or "ann" (IVF index over the full catalogue)
+BENCHMARK_ANN_MAX_PRODUCTS_PER_CLUSTER = 5000
+BENCHMARK_ANN_NPROBE = 8  # inverted lists probed per query when BENCHMARK_ANN_CLUSTER_FILTER is off
+BENCHMARK_ANN_CLUSTER_FILTER = False  # opt-in: match only within the query's cluster, exactly over that cluster's products
+
+# --- Benchmarking LLM Scheduler ---
+BENCHMARK_LLM_BATCH_TOKEN_BUDGET = 6000  # query text + expected output tokens per request
+BENCHMARK_LLM_OUTPUT_TOKENS_PER_QUERY = 60
+BENCHMARK_LLM_MAX_QUERIES_PER_BATCH = 80
+BENCHMARK_LLM_REQUESTS_PER_MINUTE = 500
+BENCHMARK_LLM_TOKENS_PER_MINUTE = 800000
+BENCHMARK_LLM_MAX_CONCURRENCY = 32
+BENCHMARK_LLM_MAX_RETRIES = 6
+
 # --- Logging Configuration ---
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -0,0 +1,69 @@
+import logging
+import math
+from functools import lru_cache
+from typing import List, Sequence, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# tiktoken is optional; without it token counts fall back to ~4 characters per token
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Token count for `text` under `model`'s encoding (or a character estimate without tiktoken)."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def pack_batches(items: Sequence[T], item_tokens: Sequence[int], token_budget: int,
+                 max_items: int) -> List[List[T]]:
+    """
+    Splits `items` into the fewest batches whose summed `item_tokens` stay within `token_budget`
+    (and at most `max_items` each), then evens the batches out so the last one is not a
+    straggler. An item larger than the budget gets a batch of its own.
+    """
+    if not items:
+        return []
+    total = sum(item_tokens)
+    n_batches = max(math.ceil(total / max(token_budget, 1)), math.ceil(len(items) / max(max_items, 1)), 1)
+    target = min(token_budget, math.ceil(total / n_batches))
+    target_items = math.ceil(len(items) / n_batches)
+
+    batches, batch, batch_tokens = [], [], 0
+    for item, tokens in zip(items, item_tokens):
+        if batch and (batch_tokens + tokens > token_budget or len(batch) >= max_items
+                      or (batch_tokens + tokens > target and len(batch) >= target_items)):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def usage_tokens(response) -> Tuple[int, int, int]:
+    """(prompt, completion, cached prompt) tokens reported by a chat completion response."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+    return usage.prompt_tokens or 0, usage.completion_tokens or 0, cached or 0
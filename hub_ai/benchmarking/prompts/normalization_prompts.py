@@ -100,4 +100,60 @@ Example Response:
   ]
 }}
 """
-    return {"system_message": system_message, "user_template": user_template}
\ No newline at end of file
+    return {"system_message": system_message, "user_template": user_template}
+
+def benchmarking_match_prompt_prefixed(**kwargs) -> dict:
+    """
+    Cache-friendly variant of benchmarking_match_prompt for packed batches.
+    The instructions and the scraped product list form a shared prefix that is identical for
+    every batch of a cluster, so the provider can prompt-cache it; only the client queries
+    (sent as a separate, final message) change between batches.
+    kwargs: Expected to contain 'client_list_str' and 'scraped_list_str'.
+    """
+    client_list_str = kwargs.get("client_list_str", "NO_CLIENT_QUERIES")
+    scraped_list_str = kwargs.get("scraped_list_str", "NO_SCRAPED_PRODUCTS")
+
+    system_message = "You are an expert in matching multilingual product descriptions and translating Japanese product titles to clear, professional English."
+    shared_prefix = f"""You are an expert in multilingual product matching for procurement.
+Your task is to find the best match from the 'Scraped Products' list for EACH query in the 'Client Queries' list, which is given in the next message.
+
+**Instructions:**
+1. For each Client Query, find the single best matching Scraped Product.
+2. Assign a cosine-like similarity score from 0.0 (no match) to 1.0 (perfect match) with strict caution and precision.
+3. **CRITICAL**: Translate the matched Scraped Product's title into clear, professional English:
+   - If the title is in Japanese, provide a proper English translation
+   - If the title is already in English, keep it as is
+   - Focus on the core product name, brand, specifications, and key features
+   - Remove promotional text, shipping info, and marketing language
+   - Maintain important technical specifications (size, quantity, model numbers)
+   - Use proper English grammar and product terminology
+
+**Translation Examples:**
+- "【伊藤園】お～いお茶 緑茶 PET 280ml x 48本 （24本入 x 2ケース） 【送料無料】" → "Itoen Oi Ocha Green Tea PET 280ml x 48 bottles (24 bottles x 2 cases)"
+- "FLEXTAILGEAR MAX VACUUM PUMP エアポンプ 電動ポンプ 携帯ポンプ 10kpa 2500mah" → "Flextailgear Max Vacuum Pump 10kPa 2500mAh portable electric pump"
+- "【送料無料】伊藤園 お〜いお茶 緑茶 280ml×24本" → "Itoen Oi Ocha Green Tea 280ml x 24 bottles"
+
+4. If no good match exists for a client query, you can omit it from the result.
+
+**Output Format:**
+Return a single JSON object. This object must contain a key (e.g., "matches") whose value is a JSON array of objects. Each object in the array MUST contain:
+- "client_query_id": The original ID of the client query.
+- "matched_product_index": The original index of the best matching scraped product.
+- "score": The similarity score (0.0 to 1.0).
+- "translated_title": The professional English translation of the matched product title.
+
+Example Response:
+{{
+  "matches": [
+    {{"client_query_id": 0, "matched_product_index": 15, "score": 0.83, "translated_title": "Itoen Oi Ocha Green Tea PET 280ml x 48 bottles"}},
+    {{"client_query_id": 1, "matched_product_index": 2, "score": 0.65, "translated_title": "Flextailgear Max Vacuum Pump 10kPa 2500mAh"}}
+  ]
+}}
+
+**Scraped Products:**
+{scraped_list_str}
+"""
+    query_message = f"""**Client Queries:**
+{client_list_str}
+"""
+    return {"system_message": system_message, "shared_prefix": shared_prefix, "query_message": query_message}
@@ -0,0 +1,175 @@
+import ast
+import json
+import logging
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = [
+    'CLUSTER_ID', 'CATEGORY', 'SKU_DESCRIPTION', 'UOM', 'QUANTITY', 'CURRENCY', 'SPEND', 'UNIT_PRICE',
+    'NORMALISED_DESCRIPTION', 'SOURCE_DESCRIPTION', 'SOURCE_CURRENCY', 'SOURCE_UNIT_PRICE', 'SOURCE_URL',
+    'SIMILARITY_SCORE', 'EXTRACTED_QUANTITY', 'SOURCE_QUANTITY', 'SOURCE_TOTAL_PRICE',
+]
+
+# Map currency symbols to codes
+CURRENCY_SYMBOL_MAP = {'ريال': 'SAR'}
+
+
+def gather_matches(cluster_matches: Dict[Hashable, Dict[int, Dict[str, Any]]], client_partition, scraped_partition,
+                   threshold: float = 0.3) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flattens per-cluster best_matches into arrays of cluster ids, client/scraped positions
+    (into the partitions' frames) and scores. Matches at or below `threshold` and invalid
+    product indices are dropped.
+    """
+    cluster_ids, client_positions, scraped_positions, scores = [], [], [], []
+    for cluster_id, best_matches in cluster_matches.items():
+        client_start, _ = client_partition.bounds(cluster_id)
+        scraped_start, _ = scraped_partition.bounds(cluster_id)
+        scraped_count = scraped_partition.size(cluster_id)
+        for client_idx, match_info in best_matches.items():
+            if not match_info['score'] > threshold:
+                continue
+            scraped_idx = match_info['matched_product_index']
+            if scraped_idx is None or not isinstance(scraped_idx, (int, np.integer)) or scraped_idx >= scraped_count:
+                logger.warning(f"Cluster {cluster_id}: Invalid scraped index {scraped_idx}, skipping")
+                continue
+            cluster_ids.append(cluster_id)
+            client_positions.append(client_start + client_idx)
+            scraped_positions.append(scraped_start + scraped_idx)
+            scores.append(match_info['score'])
+    return (
+        np.asarray(cluster_ids),
+        np.asarray(client_positions, dtype=np.int64),
+        np.asarray(scraped_positions, dtype=np.int64),
+        np.asarray(scores, dtype=np.float64),
+    )
+
+
+def _text(frame: pd.DataFrame, key: str, positions: np.ndarray, default: str = '') -> pd.Series:
+    """Stripped string values of a column at `positions`; missing column or values give `default`."""
+    if key not in frame.columns:
+        return pd.Series([default] * len(positions), dtype=object)
+    values = frame[key].take(positions).reset_index(drop=True).astype(object)
+    missing = values.isna()
+    text = values.astype(str).str.strip()
+    text[missing] = default
+    return text
+
+
+def _raw(frame: pd.DataFrame, key: str, positions: np.ndarray, default: Any) -> pd.Series:
+    if key not in frame.columns:
+        return pd.Series([default] * len(positions), dtype=object)
+    return frame[key].take(positions).reset_index(drop=True)
+
+
+def _numeric(frame: pd.DataFrame, key: str, positions: np.ndarray) -> pd.Series:
+    """Numeric coercion for Snowflake number columns; unparseable or blank values become NaN."""
+    if key not in frame.columns:
+        return pd.Series(np.nan, index=range(len(positions)))
+    values = frame[key].take(positions).reset_index(drop=True)
+    if values.dtype == object:
+        values = values.map(lambda v: v.strip() if isinstance(v, str) else v)
+    return pd.to_numeric(values, errors='coerce')
+
+
+def _blank_to_none(values: pd.Series) -> pd.Series:
+    """Empty strings become None so numeric Snowflake columns receive NULL."""
+    values = values.astype(object)
+    blank = values.map(lambda v: v is None or (isinstance(v, str) and not v.strip()))
+    values[blank] = None
+    return values
+
+
+def _parse_structured(value):
+    """Accepts a list/dict or its JSON / Python-literal string form (as read back from CSV)."""
+    if isinstance(value, (list, dict)):
+        return value
+    if isinstance(value, str) and value[:1] in ('[', '{'):
+        try:
+            return json.loads(value)
+        except ValueError:
+            try:
+                return ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                return None
+    return None
+
+
+def _amazon_source_fields(scraped_frame: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+    """Resolves source quantity / prices / currency once per distinct matched Amazon product."""
+    unique_positions, inverse = np.unique(positions, return_inverse=True)
+    net_quantity = _text(scraped_frame, 'net_quantity', unique_positions)
+    total_price = _text(scraped_frame, 'variant_total_price', unique_positions)
+    unit_price_display = _text(scraped_frame, 'per_unit_price_display', unique_positions)
+    unit_price = _text(scraped_frame, 'unit_price', unique_positions)
+    currency_symbol = _text(scraped_frame, 'currency_symbol', unique_positions)
+    currency_info = _raw(scraped_frame, 'currency_info', unique_positions, None)
+    unit_variants = _raw(scraped_frame, 'unit_variants', unique_positions, None)
+
+    rows = []
+    for quantity, spend, price, fallback_price, symbol, info, variants in zip(
+            net_quantity, total_price, unit_price_display, unit_price, currency_symbol, currency_info, unit_variants):
+        info = _parse_structured(info)
+        currency_code = info.get('code', '') if isinstance(info, dict) else ''
+        variants = _parse_structured(variants)
+        # If unit_variants exists and is non-empty, pick max quantity variant
+        if isinstance(variants, list) and variants:
+            max_variant = max(variants, key=lambda v: v.get('quantity', 0) if isinstance(v.get('quantity', 0), (int, float)) else 0)
+            quantity = max_variant.get('quantity', quantity)
+            spend = max_variant.get('total_price', spend)
+            price = max_variant.get('per_unit_price', price)
+        if not price:
+            price = fallback_price
+        if not currency_code:
+            currency_code = CURRENCY_SYMBOL_MAP.get(symbol, symbol if symbol else 'USD')
+        rows.append((quantity, spend, price, currency_code))
+
+    fields = pd.DataFrame(rows, columns=['quantity', 'spend', 'unit_price', 'currency'], dtype=object)
+    return fields.take(inverse).reset_index(drop=True)
+
+
+def build_results(client_frame: pd.DataFrame, scraped_frame: pd.DataFrame, cluster_ids: np.ndarray,
+                  client_positions: np.ndarray, scraped_positions: np.ndarray, scores: np.ndarray,
+                  amazon: bool = False) -> pd.DataFrame:
+    """
+    Materializes BENCHMARK_RESULTS rows for matched (client, scraped) position pairs in one
+    columnar pass. `amazon` selects the Amazon source schema (net quantity, unit variants,
+    currency info) instead of the generic quantity / total_price / price columns.
+    """
+    if len(client_positions) == 0:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    if amazon:
+        source = _amazon_source_fields(scraped_frame, scraped_positions)
+        source_quantity, source_total_price = source['quantity'], source['spend']
+        source_unit_price, source_currency = source['unit_price'], source['currency']
+    else:
+        source_quantity = _text(scraped_frame, 'quantity', scraped_positions)
+        source_total_price = _text(scraped_frame, 'total_price', scraped_positions)
+        source_unit_price = _text(scraped_frame, 'price', scraped_positions)
+        source_currency = _text(client_frame, 'currency', client_positions, 'USD')
+
+    results = pd.DataFrame({
+        'CLUSTER_ID': cluster_ids,
+        'CATEGORY': _text(client_frame, 'CATEGORY', client_positions),
+        'SKU_DESCRIPTION': _text(client_frame, 'ITEM DESCRIPTION', client_positions),
+        'UOM': _text(client_frame, 'UOM', client_positions),
+        'QUANTITY': _numeric(client_frame, 'QUANTITY', client_positions),
+        'CURRENCY': _raw(client_frame, 'CURRENCY', client_positions, 'USD'),
+        'SPEND': _numeric(client_frame, 'SPEND', client_positions),
+        'UNIT_PRICE': _numeric(client_frame, 'UNIT PRICE', client_positions),
+        'NORMALISED_DESCRIPTION': _text(client_frame, 'NORMALIZED DESCRIPTION', client_positions),
+        'SOURCE_DESCRIPTION': _text(scraped_frame, 'title', scraped_positions),
+        'SOURCE_CURRENCY': source_currency,
+        'SOURCE_UNIT_PRICE': _blank_to_none(source_unit_price),
+        'SOURCE_URL': _text(scraped_frame, 'url', scraped_positions),
+        'SIMILARITY_SCORE': np.round(scores, 4),
+        'EXTRACTED_QUANTITY': _raw(client_frame, 'Extracted_Quantity', client_positions, 1),
+        'SOURCE_QUANTITY': _blank_to_none(source_quantity),
+        'SOURCE_TOTAL_PRICE': _blank_to_none(source_total_price),
+    })
+    logger.debug(f"Built {len(results)} result rows ({'amazon' if amazon else 'generic'} schema)")
+    return results
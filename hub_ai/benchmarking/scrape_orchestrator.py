@@ -0,0 +1,223 @@
+import os
+import queue
+import asyncio
+import multiprocessing
+from multiprocessing import current_process
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+import pyarrow as pa
+from loguru import logger
+
+import benchmarking.config as config
+from benchmarking.crawler_pool import CrawlerPool, CRAWLER_POOL_SIZE
+from benchmarking.domain_scheduler import DomainScheduler
+
+# Queries scraped at once per process, and per website unless its config sets "max_concurrency"
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+SCRAPE_SITE_CONCURRENCY = int(os.getenv("SCRAPE_SITE_CONCURRENCY", "4"))
+# Worker processes the queries are shared out to; 1 scrapes on an event loop in the calling process
+SCRAPE_PROCESSES = int(os.getenv("SCRAPE_PROCESSES", "1"))
+SCRAPE_START_METHOD = os.getenv("SCRAPE_START_METHOD", "spawn")
+# Scraped items per Arrow record batch
+SCRAPE_BATCH_ROWS = int(os.getenv("SCRAPE_BATCH_ROWS", "500"))
+
+# (keyword, cluster_id, website config key)
+Query = Tuple[str, Any, str]
+ScrapeFn = Callable[..., Awaitable[List[Dict[str, Any]]]]
+
+
+def _cell(value: Any) -> Optional[str]:
+    """Items are stored as text; None and NaN stay missing."""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value)
+
+
+class ResultBatches:
+    """
+    Scraped items as Arrow record batches of up to `batch_rows` items, every column a string,
+    rather than a growing list of dicts. Batches cross process boundaries as one IPC stream.
+    """
+
+    def __init__(self, batch_rows: int = SCRAPE_BATCH_ROWS):
+        self.batch_rows = max(1, batch_rows)
+        self.batches: List[pa.RecordBatch] = []
+        self.rows = 0
+        self._pending: List[Dict[str, Any]] = []
+
+    def extend(self, items: Sequence[Dict[str, Any]]):
+        self._pending.extend(items)
+        self.rows += len(items)
+        while len(self._pending) >= self.batch_rows:
+            self._flush(self._pending[:self.batch_rows])
+            del self._pending[:self.batch_rows]
+
+    def _flush(self, items: List[Dict[str, Any]]):
+        columns = list(dict.fromkeys(key for item in items for key in item))
+        self.batches.append(pa.RecordBatch.from_pydict(
+            {col: pa.array([_cell(item.get(col)) for item in items], type=pa.string()) for col in columns}))
+
+    def to_table(self) -> pa.Table:
+        if self._pending:
+            self._flush(self._pending)
+            self._pending = []
+        # Websites' product schemas differ, so batches may not share columns; missing ones are null
+        columns = list(dict.fromkeys(name for batch in self.batches for name in batch.schema.names))
+        schema = pa.schema([(name, pa.string()) for name in columns])
+        aligned = [pa.RecordBatch.from_arrays(
+            [batch.column(name) if name in batch.schema.names else pa.nulls(batch.num_rows, pa.string())
+             for name in columns], schema=schema) for batch in self.batches]
+        return pa.Table.from_batches(aligned, schema=schema)
+
+    def to_ipc(self) -> bytes:
+        table = self.to_table()
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def add_ipc(self, payload: bytes):
+        for batch in pa.ipc.open_stream(payload):
+            self.batches.append(batch)
+            self.rows += batch.num_rows
+
+    def to_pandas(self) -> pd.DataFrame:
+        return self.to_table().to_pandas()
+
+
+def site_concurrency(website: str) -> int:
+    website_config = config.website_configs.get(website) or {}
+    return max(1, int(website_config.get("max_concurrency", SCRAPE_SITE_CONCURRENCY)))
+
+
+async def orchestrate(next_query: Callable[[], Awaitable[Optional[Query]]], scrape: ScrapeFn,
+                      results: ResultBatches, concurrency: int = SCRAPE_CONCURRENCY,
+                      pool_size: int = CRAWLER_POOL_SIZE) -> Dict[str, int]:
+    """
+    Scrapes queries until `next_query()` returns None: a producer feeds a bounded queue and
+    `concurrency` workers take queries off it, at most `site_concurrency(website)` per website at
+    a time, all leasing browsers from one crawler pool and pacing page fetches with one domain
+    scheduler. Items go into `results`; a query that raises is logged and counted, and does not
+    stop the others.
+    """
+    node_name = current_process().name
+    concurrency = max(1, concurrency)
+    work: asyncio.Queue = asyncio.Queue(maxsize=2 * concurrency)
+    site_slots: Dict[str, asyncio.Semaphore] = {}
+    counts = {"queries": 0, "with_items": 0, "empty": 0, "failed": 0}
+    scheduler = DomainScheduler()
+
+    async def produce():
+        try:
+            while (query := await next_query()) is not None:
+                await work.put(query)
+        finally:
+            for _ in range(concurrency):
+                await work.put(None)
+
+    async def consume(pool: CrawlerPool):
+        while (query := await work.get()) is not None:
+            keyword, cluster_id, website = query
+            counts["queries"] += 1
+            slots = site_slots.setdefault(website, asyncio.Semaphore(site_concurrency(website)))
+            try:
+                async with slots:
+                    items = await scrape(keyword, cluster_id, website, pool=pool, scheduler=scheduler)
+            except Exception as e:
+                counts["failed"] += 1
+                logger.opt(exception=e).error(f"[{node_name}] Scrape error for {keyword}/{website}: {e}")
+                continue
+            if items:
+                counts["with_items"] += 1
+                results.extend(items)
+                logger.success(f"[{node_name}] {len(items)} items from '{keyword}' ({website})")
+            else:
+                counts["empty"] += 1
+                logger.warning(f"[{node_name}] ⚠️ No items from '{keyword}' ({website})")
+
+    async with CrawlerPool(size=pool_size) as pool:
+        await asyncio.gather(produce(), *(consume(pool) for _ in range(concurrency)))
+        logger.info(f"[{node_name}] Crawler pool metrics: {pool.metrics()}")
+    logger.info(f"[{node_name}] Scraped {counts['queries']} queries: {counts}")
+    return counts
+
+
+def _list_source(queries: Sequence[Query]) -> Callable[[], Awaitable[Optional[Query]]]:
+    remaining = iter(queries)
+
+    async def next_query() -> Optional[Query]:
+        return next(remaining, None)
+    return next_query
+
+
+def _process_worker(work_queue, result_queue, scrape: ScrapeFn, concurrency: int, batch_rows: int):
+    """Worker process: scrapes queries off the shared work queue, then sends its batches back as IPC bytes."""
+    node_name = current_process().name
+    results = ResultBatches(batch_rows)
+    payload, counts = None, None
+    try:
+        async def next_query() -> Optional[Query]:
+            return await asyncio.get_running_loop().run_in_executor(None, work_queue.get)
+        counts = asyncio.run(orchestrate(next_query, scrape, results, concurrency))
+        payload = results.to_ipc()
+    except Exception as e:
+        logger.opt(exception=e).error(f"[{node_name}] Scrape worker failed: {e}")
+    result_queue.put((node_name, payload, counts))
+
+
+def _scrape_in_processes(queries: Sequence[Query], scrape: ScrapeFn, processes: int, concurrency: int,
+                         batch_rows: int) -> ResultBatches:
+    ctx = multiprocessing.get_context(SCRAPE_START_METHOD)
+    work_queue, result_queue = ctx.Queue(), ctx.Queue()
+    for query in queries:
+        work_queue.put(query)
+    for _ in range(processes):
+        work_queue.put(None)
+
+    workers = [ctx.Process(target=_process_worker, name=f"ScrapeWorker-{i}",
+                           args=(work_queue, result_queue, scrape, concurrency, batch_rows))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    results = ResultBatches(batch_rows)
+    reported = set()
+    try:
+        while len(reported) < len(workers):
+            try:
+                node_name, payload, counts = result_queue.get(timeout=5)
+            except queue.Empty:
+                # A worker that died without reporting (killed, out of memory) loses its in-flight queries
+                for worker in workers:
+                    if worker.name not in reported and not worker.is_alive() and result_queue.empty():
+                        logger.error(f"[{worker.name}] Exited with code {worker.exitcode} before reporting results")
+                        reported.add(worker.name)
+                continue
+            reported.add(node_name)
+            if payload is not None:
+                results.add_ipc(payload)
+            logger.info(f"[{node_name}] Finished: {counts}")
+    finally:
+        for worker in workers:
+            worker.join(timeout=30)
+            if worker.is_alive():
+                worker.terminate()
+    return results
+
+
+def scrape_queries(queries: Sequence[Query], scrape: ScrapeFn, processes: int = SCRAPE_PROCESSES,
+                   concurrency: int = SCRAPE_CONCURRENCY, batch_rows: int = SCRAPE_BATCH_ROWS) -> pd.DataFrame:
+    """
+    Scrapes every query with `scrape(keyword, cluster_id, website, pool=..., scheduler=...)` and
+    returns all items as one DataFrame of strings. With processes > 1 the queries go on a
+    multiprocessing queue that worker processes, each with its own event loop, crawler pool and
+    domain scheduler, take them from.
+    """
+    processes = max(1, min(processes, len(queries)))
+    logger.info(f"Scraping {len(queries)} queries: {processes} process(es), {concurrency} at a time per process")
+    if processes == 1:
+        results = ResultBatches(batch_rows)
+        asyncio.run(orchestrate(_list_source(queries), scrape, results, concurrency))
+    else:
+        results = _scrape_in_processes(queries, scrape, processes, concurrency, batch_rows)
+    return results.to_pandas()
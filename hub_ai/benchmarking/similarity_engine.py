@@ -0,0 +1,142 @@
+import logging
+import numpy as np
+from collections import defaultdict
+from typing import Dict, Any, Hashable, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the float32 elements of each gathered operand, and of the scores, of one batched matmul
+DEFAULT_TILE_ELEMENTS = 16_000_000
+
+
+def normalize_embeddings(matrix: np.ndarray) -> np.ndarray:
+    """Returns an L2-normalized float32 copy of the matrix. Zero rows stay zero."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def _padded(n: int) -> int:
+    """Next power of two, so clusters of similar size share a tile shape."""
+    return 1 << max(int(n) - 1, 0).bit_length()
+
+
+def _max_block_rows(dim: int, tile_elements: int) -> int:
+    """Largest power of two of rows per axis whose operand (rows x dim) and scores (rows x rows) fit a tile."""
+    rows = 1
+    while 2 * rows * max(dim, 1) <= tile_elements and (2 * rows) ** 2 <= tile_elements:
+        rows *= 2
+    return rows
+
+
+def _split_block(block: Tuple, max_rows: int):
+    """Cuts a cluster into client x product sub-blocks of at most `max_rows` rows per axis."""
+    cluster_id, client_ids, client_rows, product_ids, product_rows = block
+    for c in range(0, len(client_rows), max_rows):
+        for p in range(0, len(product_rows), max_rows):
+            yield (cluster_id, client_ids[c:c + max_rows], client_rows[c:c + max_rows],
+                   product_ids[p:p + max_rows], product_rows[p:p + max_rows])
+
+
+def _merge_match(previous: Dict[str, Any], match: Dict[str, Any], top_k: int) -> Dict[str, Any]:
+    """Combines a client's matches from two product sub-blocks of the same cluster."""
+    if previous is None:
+        return match
+    best = match if match['score'] > previous['score'] else previous
+    if top_k > 1:
+        candidates = sorted(previous['top_matches'] + match['top_matches'], key=lambda m: -m[1])
+        best = dict(best, top_matches=candidates[:top_k])
+    return best
+
+
+def match_clusters(
+    embeddings: np.ndarray,
+    blocks: Sequence[Tuple[Hashable, Sequence[Any], Sequence[int], Sequence[Any], Sequence[int]]],
+    top_k: int = 1,
+    threshold: float = 0.3,
+    normalized: bool = False,
+    tile_elements: int = DEFAULT_TILE_ELEMENTS,
+) -> Dict[Hashable, Dict[Any, Dict[str, Any]]]:
+    """
+    Scores every cluster's client x product block in batched matmuls.
+
+    Args:
+        embeddings: Workspace embedding matrix (one row per distinct text).
+        blocks: One tuple per cluster: (cluster_id, client_ids, client_rows, product_ids, product_rows).
+            `*_rows` index into `embeddings`; `client_ids` / `product_ids` are the identifiers
+            reported back (cluster-local client index and matched product index).
+        top_k: Number of ranked candidates kept per client query.
+        threshold: Minimum cosine similarity for a match to be reported.
+        normalized: Set when `embeddings` is already L2-normalized float32.
+        tile_elements: Memory bound for each stacked operand and for the scores of one matmul.
+            Clusters too large for it on their own are scored in sub-blocks over both axes.
+
+    Returns:
+        {cluster_id: best_matches} where best_matches has the same shape as the per-cluster
+        matcher: {client_id: {'score', 'matched_product_index', 'similarity_type'}}. When
+        top_k > 1 each entry also carries 'top_matches' as [(product_id, score), ...].
+    """
+    unit = embeddings if normalized else normalize_embeddings(embeddings)
+    dim = unit.shape[1] if unit.ndim == 2 else 0
+    results: Dict[Hashable, Dict[Any, Dict[str, Any]]] = {}
+
+    # Group clusters into tiles of identical padded shape
+    max_rows = _max_block_rows(dim, tile_elements)
+    tiles = defaultdict(list)
+    for block in blocks:
+        cluster_id, client_ids, client_rows, product_ids, product_rows = block
+        results[cluster_id] = {}
+        if len(client_rows) == 0 or len(product_rows) == 0:
+            continue
+        for sub_block in _split_block(block, max_rows):
+            tiles[(_padded(len(sub_block[2])), _padded(len(sub_block[4])))].append(sub_block)
+
+    for (pad_c, pad_p), tile_blocks in tiles.items():
+        k = min(top_k, pad_p)
+        per_block = max(pad_c * max(dim, 1), pad_p * max(dim, 1), pad_c * pad_p)
+        step = max(1, tile_elements // per_block)
+        for start in range(0, len(tile_blocks), step):
+            chunk = tile_blocks[start:start + step]
+            n = len(chunk)
+            client_idx = np.zeros((n, pad_c), dtype=np.int64)
+            product_idx = np.zeros((n, pad_p), dtype=np.int64)
+            client_mask = np.zeros((n, pad_c), dtype=bool)
+            product_mask = np.zeros((n, pad_p), dtype=bool)
+            for b, (_, _, client_rows, _, product_rows) in enumerate(chunk):
+                client_idx[b, :len(client_rows)] = client_rows
+                client_mask[b, :len(client_rows)] = True
+                product_idx[b, :len(product_rows)] = product_rows
+                product_mask[b, :len(product_rows)] = True
+
+            # (n, pad_c, dim) @ (n, dim, pad_p) -> (n, pad_c, pad_p)
+            scores = np.matmul(unit[client_idx], unit[product_idx].transpose(0, 2, 1))
+            scores[~np.broadcast_to(product_mask[:, None, :], scores.shape)] = -np.inf
+
+            if k < pad_p:
+                top = np.argpartition(-scores, k - 1, axis=2)[:, :, :k]
+            else:
+                top = np.broadcast_to(np.arange(pad_p), scores.shape[:2] + (pad_p,))
+            top_scores = np.take_along_axis(scores, top, axis=2)
+            order = np.argsort(-top_scores, axis=2, kind="stable")
+            top = np.take_along_axis(top, order, axis=2)
+            top_scores = np.take_along_axis(top_scores, order, axis=2)
+
+            # Only rank-0 hits above the threshold are reported, mirroring the per-cluster matcher
+            hit_b, hit_c = np.nonzero(client_mask & (top_scores[:, :, 0] > threshold))
+            for b, c in zip(hit_b.tolist(), hit_c.tolist()):
+                cluster_id, client_ids, _, product_ids, _ = chunk[b]
+                match = {
+                    'score': float(top_scores[b, c, 0]),
+                    'matched_product_index': product_ids[int(top[b, c, 0])],
+                    'similarity_type': 'embedding'
+                }
+                if top_k > 1:
+                    match['top_matches'] = [
+                        (product_ids[int(p)], float(s))
+                        for p, s in zip(top[b, c], top_scores[b, c]) if np.isfinite(s) and s > threshold
+                    ]
+                cluster_results = results[cluster_id]
+                cluster_results[client_ids[c]] = _merge_match(cluster_results.get(client_ids[c]), match, top_k)
+
+    logger.debug(f"Scored {len(results)} clusters in {sum(len(v) for v in tiles.values())} non-empty blocks across {len(tiles)} tile shapes")
+    return results
@@ -1,11 +1,9 @@
 import os
-import json
 import asyncio
 from urllib.parse import quote_plus, urljoin,urlparse
-from multiprocessing import current_process, Process, Manager
+from multiprocessing import current_process
 from pathlib import Path
 from typing import List, Dict, Tuple, Any, Optional
-from concurrent.futures import ThreadPoolExecutor
 from benchmarking.data_extractor import fetch_snowflake_data, secrets_manager_client
 import pandas as pd
 from loguru import logger
@@ -13,27 +11,27 @@ from datetime import datetime
 from normalization.app import run_normalization_job
 import benchmarking.config as config
 from crawl4ai import (
-    AsyncWebCrawler, CrawlerRunConfig, JsonCssExtractionStrategy, CrawlResult
+    CrawlerRunConfig, JsonCssExtractionStrategy, CrawlResult
 )
 import boto3
 import io
 from io import StringIO
-import aiohttp
-from bs4 import BeautifulSoup
 import re
 import requests
 from benchmarking.quick_scrape import main_quick_scrape
 from benchmarking.benchmarking_job import run_benchmarking_job
 from benchmarking.pg_db_utils import PostgresConnector
 from benchmarking.amazon_crawler import ComprehensiveScraper,comprehensive_product_analysis
+from benchmarking.crawler_pool import CrawlerPool
+from benchmarking.domain_scheduler import DomainScheduler, PageBlocked, raise_if_blocked
+from benchmarking.html_extraction import SiteExtractor, parse_html, site_extractor
+from benchmarking.scrape_orchestrator import scrape_queries
 
 
-# Constants for multiprocessing and threading
-MAX_CONCURRENT_TASKS = 2        
-MAX_THREADS_PER_NODE = 2
-QUERIES_PER_NODE = 5           
-
 EXPORT_S3_BUCKET = os.getenv('EXPORT_S3_BUCKET', 'sai-genai-data-export')
+# How result pages are fetched unless a website config sets "fetch_transport": "browser" (headless
+# Chromium, renders JavaScript) or "http" (plain GET, for server-rendered result lists)
+DEFAULT_FETCH_TRANSPORT = "browser"
 
 def convert_schema_for_crawl4ai(fields_raw: List[dict], base_selector: str) -> dict:
     """
@@ -73,31 +71,74 @@ def normalize_url(url: Optional[str], base_url: str) -> Optional[str]:
     return urljoin(base_url, url)
 
 
-async def get_available_pages(session: aiohttp.ClientSession, url: str, pagination_selector: str) -> int:
+def decode_html(raw_bytes: bytes) -> str:
+    """Decodes a fetched page as UTF-8, falling back to Shift JIS (Japanese sites)."""
+    try:
+        return raw_bytes.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw_bytes.decode("shift_jis")
+
+
+def count_available_pages(html: str, pagination_selector: str) -> int:
     """
-    Detects how many pages are available from the first page.
-    Caps the value at 25.
+    Detects how many pages are available from the first page's HTML.
+    Caps the value at 10.
     """
-    try:
-        async with session.get(url) as resp:
-            html = await resp.text()
-            soup = BeautifulSoup(html, "html.parser")
-            pagination_elements = soup.select(pagination_selector)
-            if pagination_elements:
-                page_numbers = []
-                for elem in pagination_elements:
-                    text = elem.get_text(strip=True)
-                    page_numbers += [int(n) for n in re.findall(r"\d+", text)]
-                max_page = max(page_numbers) if page_numbers else 1
-                return min(max_page, 10)
-            return 1
-    except Exception as e:
-        logger.warning(f"Pagination detection failed at {url}: {e}")
-        return 1
+    pagination_elements = parse_html(html).select(pagination_selector)
+    if pagination_elements:
+        page_numbers = []
+        for elem in pagination_elements:
+            text = elem.get_text(strip=True)
+            page_numbers += [int(n) for n in re.findall(r"\d+", text)]
+        max_page = max(page_numbers) if page_numbers else 1
+        return min(max_page, 10)
+    return 1
+
+
+async def fetch_page(url: str, transport: str, pool: CrawlerPool,
+                     browser_config: Optional[CrawlerRunConfig] = None) -> Tuple[Optional[str], str]:
+    """
+    Fetches a results page once, with plain HTTP (the pool's aiohttp session) or a headless browser
+    leased from the pool, and returns (html, final url); html is None when the browser crawl failed.
+    Raises PageBlocked when the site answers with a throttling status.
+    """
+    if transport == "http":
+        async with pool.session.get(url) as resp:
+            raise_if_blocked(url, resp.status, resp.headers)
+            return decode_html(await resp.read()), str(resp.url)
+    async with pool.lease() as crawler:
+        result_list: List[CrawlResult] = await crawler.arun(url=url, config=browser_config or CrawlerRunConfig())
+    for cr in result_list:
+        raise_if_blocked(url, getattr(cr, "status_code", None), getattr(cr, "response_headers", None))
+        if cr.success and getattr(cr, "html", None):
+            return cr.html, cr.url
+    return None, url
+
+
+def field_match_counts(base_elements: list, schema_fields: List[dict]) -> str:
+    """Per-field selector hits within the base elements, for debugging site configs."""
+    return "; ".join(
+        f"'{field.get('name')}' ({field.get('selector')}): "
+        f"{sum(len(elem.select(field.get('selector'))) for elem in base_elements)}"
+        for field in schema_fields
+    )
 
 
 async def scrape_query(keyword: str, cluster_id: str, website_name: str,
-                       shared_html_debug: Dict[str, str], max_pages: int = 50) -> List[Dict[str, Any]]:
+                       max_pages: int = 50, pool: Optional[CrawlerPool] = None,
+                       scheduler: Optional[DomainScheduler] = None) -> List[Dict[str, Any]]:
+    """
+    Scrapes the result pages of one keyword on one website. Pages are crawled on browsers leased
+    from `pool` and fetched with its aiohttp session; without a pool a one-browser pool is started
+    for this query alone. Page fetches go through `scheduler`, which keeps them polite per domain;
+    pass the same scheduler to every query on an event loop so the limits hold across queries.
+    """
+    if pool is None:
+        async with CrawlerPool(size=1) as own_pool:
+            return await scrape_query(keyword, cluster_id, website_name, max_pages,
+                                      pool=own_pool, scheduler=scheduler)
+    scheduler = scheduler or DomainScheduler()
+
     node_name = current_process().name
     website_config = config.website_configs.get(website_name)
     if not website_config:
@@ -108,7 +149,6 @@ async def scrape_query(keyword: str, cluster_id: str, website_name: str,
     base_url_template = website_config["base_url_template"]
     base_selector = website_config["extraction_css_selector"]
     schema_fields = website_config["product_schema"]
-    selectors_strategy = website_config.get("selectors_strategy", "first")
     pagination_selector = website_config.get("pagination_selector", "")
 
     # Safety check to ensure page_num is in the template
@@ -117,148 +157,138 @@ async def scrape_query(keyword: str, cluster_id: str, website_name: str,
         return []
 
     schema_for_crawl = convert_schema_for_crawl4ai(schema_fields, base_selector)
-    extraction_strategy = JsonCssExtractionStrategy(schema_for_crawl)
-    crawl_config = CrawlerRunConfig(extraction_strategy=extraction_strategy)
+    try:
+        extraction_strategy = site_extractor(website_name, schema_for_crawl)
+    except ValueError:
+        # Nested, list and computed fields are left to crawl4ai's extraction strategy
+        extraction_strategy = JsonCssExtractionStrategy(schema_for_crawl)
+    transport = website_config.get("fetch_transport", DEFAULT_FETCH_TRANSPORT)
+    browser_config = CrawlerRunConfig()
 
     all_items: List[Dict[str, Any]] = []
     visited_urls = set()
 
-    try:
-        async with AsyncWebCrawler() as crawler:
-            async with aiohttp.ClientSession() as session:
-                # Detect how many pages are available
-                first_page_url = base_url_template.format(encoded_keyword=encoded, page_num=1)
-                actual_pages = await get_available_pages(session, first_page_url, pagination_selector) if pagination_selector else min(max_pages, 25)
-                actual_pages = min(actual_pages, 10)
-
-                logger.info(f"[{node_name} | {cluster_id}] Scraping {actual_pages} pages for '{keyword}'")
-
-                for page_num in range(1, actual_pages + 1):
-                    try:
-                        start_url = base_url_template.format(encoded_keyword=encoded, page_num=page_num)
-
-                        if start_url in visited_urls:
-                            logger.warning(f"[{node_name}] Duplicate URL detected for {keyword}: {start_url}. Skipping.")
-                            continue
-                        visited_urls.add(start_url)
-
-                        logger.debug(f"[Page {page_num}] URL: {start_url}")
-
-                        # Fetch raw HTML for debug
-                        async with session.get(start_url) as resp:
-                            raw_bytes = await resp.read()
-                            try:
-                                raw_html = raw_bytes.decode("utf-8")
-                            except UnicodeDecodeError:
-                                try:
-                                    raw_html = raw_bytes.decode("shift_jis")
-                                except UnicodeDecodeError as e:
-                                    logger.error(f"[{node_name}] Failed to decode response from {start_url}: {e}")
-                                    continue
-                            shared_html_debug[f"{cluster_id}_{keyword}_{page_num}"] = raw_html[:1000]
-                            logger.debug(f"[{node_name}] Raw HTML snippet (first 1000 chars):\n{raw_html[:1000]}")
-
-                            # Check for "no products found" signal
-                            soup = BeautifulSoup(raw_html, "html.parser")
-                            base_elements = soup.select(base_selector)
-                            logger.debug(f"[{node_name}] Page {page_num}: Found {len(base_elements)} elements with base selector.")
-
-                            if len(base_elements) == 0:
-                                logger.warning(f"[{node_name}] No products found on page {page_num}, skipping remaining pages.")
-                                break  # Stop processing this query if no products are found
-
-                            # Field debug info
-                            for field in schema_fields:
-                                name = field.get("name")
-                                selector = field.get("selector")
-                                total_matches = sum(len(elem.select(selector)) for elem in base_elements)
-                                logger.debug(f"[{node_name}] Field '{name}' selector '{selector}' matched {total_matches} elements")
-
-                        # Run actual crawler
-                        result_list: List[CrawlResult] = await crawler.arun(
-                            url=start_url,
-                            config=crawl_config,
-                            extraction_css_selector=base_selector,
-                            selectors_strategy=selectors_strategy,
-                        )
-
-                        for cr in result_list:
-                            if cr.success and getattr(cr, "extracted_content", None):
-                                try:
-                                    items = json.loads(cr.extracted_content)
-                                    logger.debug(f"[{node_name}] Page {page_num}: Extracted {len(items)} items.")
-                                except json.JSONDecodeError:
-                                    logger.warning(f"[{node_name}] Page {page_num}: JSON decode failed.")
-                                    continue
-
-                                for it in items:
-                                    raw_price = it.get("price", "")
-                                    currency = detect_currency(str(raw_price))
-
-                                    img = it.get("image_url") or it.get("image")
-                                    it["image_url"] = normalize_url(img, start_url) if img else None
-
-                                    url = it.get("url")
-                                    it["url"] = normalize_url(url, start_url) if url else None
-
-                                    it.update({
-                                        "Source_URL": cr.url,
-                                        "cluster_id": cluster_id,
-                                        "query": keyword,
-                                        "website": website_name,
-                                        "scraped_at": datetime.utcnow().isoformat(),
-                                        "currency": currency,
-                                    })
-
-                                    all_items.append(it)
-                            else:
-                                logger.warning(f"[{node_name}] Page {page_num}: No valid content at {cr.url}")
-
-                    except Exception as page_err:
-                        logger.exception(f"[{node_name}] Failed page {page_num}: {page_err}")
+    async def fetch_or_error(url: str):
+        """The page as (html, final url), or the exception that fetching it raised."""
+        try:
+            return await scheduler.fetch(url, lambda: fetch_page(url, transport, pool, browser_config))
+        except Exception as e:
+            return e
 
-        logger.success(f"[{node_name}] Scraped {len(all_items)} total items.")
-        return all_items
+    def process_page(page_num: int, start_url: str, page) -> str:
+        """Adds the page's items to all_items; returns "items", "empty" (no products) or "failed"."""
+        try:
+            logger.debug(f"[Page {page_num}] URL: {start_url}")
+
+            if isinstance(page, UnicodeDecodeError):
+                logger.error(f"[{node_name}] Failed to decode response from {start_url}: {page}")
+                return "failed"
+            if isinstance(page, PageBlocked):
+                logger.error(f"[{node_name}] Page {page_num}: still blocked after retries: {page}")
+                return "failed"
+            if isinstance(page, Exception):
+                raise page
+            raw_html, page_url = page
+            if raw_html is None:
+                logger.warning(f"[{node_name}] Page {page_num}: No valid content at {start_url}")
+                return "failed"
+            logger.debug(f"[{node_name}] Raw HTML snippet (first 1000 chars):\n{raw_html[:1000]}")
+
+            # Check for "no products found" signal
+            document = parse_html(raw_html)
+            base_elements = document.select(base_selector)
+            logger.debug(f"[{node_name}] Page {page_num}: Found {len(base_elements)} elements with base selector.")
+
+            if len(base_elements) == 0:
+                logger.warning(f"[{node_name}] No products found on page {page_num}, skipping remaining pages.")
+                return "empty"
+
+            # Field debug info, only computed when a sink takes debug messages
+            logger.opt(lazy=True).debug("[{node}] Page {page}: field selector matches {matches}",
+                                        node=lambda: node_name, page=lambda: page_num,
+                                        matches=lambda: field_match_counts(base_elements, schema_fields))
+
+            # Extract from the page already parsed for the check above
+            if isinstance(extraction_strategy, SiteExtractor):
+                items = extraction_strategy.extract_items(base_elements)
+            else:
+                items = extraction_strategy.extract(page_url, raw_html)
+            logger.debug(f"[{node_name}] Page {page_num}: Extracted {len(items)} items.")
 
-    except Exception as e:
-        logger.exception(f"[{node_name}] Scraping failed: {e}")
-        return []
+            for it in items:
+                raw_price = it.get("price", "")
+                currency = detect_currency(str(raw_price))
 
+                img = it.get("image_url") or it.get("image")
+                it["image_url"] = normalize_url(img, start_url) if img else None
 
+                url = it.get("url")
+                it["url"] = normalize_url(url, start_url) if url else None
 
+                it.update({
+                    "Source_URL": page_url,
+                    "cluster_id": cluster_id,
+                    "query": keyword,
+                    "website": website_name,
+                    "scraped_at": datetime.utcnow().isoformat(),
+                    "currency": currency,
+                })
 
-def node_worker(query_chunk: List[Tuple[str, str, str]],
-                shared_data_list: List[Dict],
-                shared_html_debug: Dict):
-    node_name = current_process().name
-    logger.info(f"{node_name} started with {len(query_chunk)} queries.")
+                all_items.append(it)
+            return "items"
 
-    def run_scrape(keyword: str, cluster_id: str, website: str) -> List[Dict]:
-        return asyncio.run(scrape_query(keyword, cluster_id, website, shared_html_debug))
+        except Exception as page_err:
+            logger.exception(f"[{node_name}] Failed page {page_num}: {page_err}")
+            return "failed"
 
-    with ThreadPoolExecutor(max_workers=MAX_THREADS_PER_NODE) as executor:
-        futures = []
-        for keyword, cluster_id, website in query_chunk:
-            future = executor.submit(run_scrape, keyword, cluster_id, website)
-            futures.append((future, keyword, cluster_id, website))
+    try:
+        # Page 1 is fetched and checked on its own: an empty or failed first page ends the query
+        first_page_url = base_url_template.format(encoded_keyword=encoded, page_num=1)
+        visited_urls.add(first_page_url)
+        first_page = await fetch_or_error(first_page_url)
+        if process_page(1, first_page_url, first_page) != "items":
+            logger.info(f"[{node_name} | {cluster_id}] No results for '{keyword}' on page 1; not fetching further pages")
+            return all_items
+
+        first_html = first_page[0]
+        if pagination_selector:
+            actual_pages = count_available_pages(first_html, pagination_selector)
+        else:
+            actual_pages = min(max_pages, 25)
+        actual_pages = min(actual_pages, 10)
+
+        page_urls: Dict[int, str] = {}
+        for page_num in range(2, actual_pages + 1):
+            start_url = base_url_template.format(encoded_keyword=encoded, page_num=page_num)
+            if start_url in visited_urls:
+                logger.warning(f"[{node_name}] Duplicate URL detected for {keyword}: {start_url}. Skipping.")
+                continue
+            visited_urls.add(start_url)
+            page_urls[page_num] = start_url
+
+        # With a page count from the site every page is known to exist and is fetched at once.
+        # Otherwise pages go out in waves of the domain's concurrency, stopping at the first empty one.
+        wave_size = len(page_urls) if pagination_selector else scheduler.max_concurrent
+        logger.info(f"[{node_name} | {cluster_id}] Scraping up to {actual_pages} pages for '{keyword}' over "
+                    f"{transport}, {max(wave_size, 1)} at a time")
+        remaining = list(page_urls.items())
+        while remaining:
+            wave, remaining = remaining[:wave_size], remaining[wave_size:]
+            # Concurrent within the scheduler's per-domain limits, processed in page order
+            fetched = await asyncio.gather(*(fetch_or_error(start_url) for _, start_url in wave))
+            if any(process_page(page_num, start_url, page) == "empty"
+                   for (page_num, start_url), page in zip(wave, fetched)):
+                break
 
-        for future, keyword, cluster_id, website in futures:
-            try:
-                products = future.result()
-                if products:
-                    shared_data_list.extend(products)
-                    logger.success(f"[{node_name}] {len(products)} items from '{keyword}' ({website})")
-                else:
-                    logger.warning(f"[{node_name}] ⚠️ No items from '{keyword}' ({website})")
-            except Exception as e:
-                logger.error(f"[{node_name}] Thread error for {keyword}/{website}: {e}", exc_info=True)
+        logger.success(f"[{node_name}] Scraped {len(all_items)} total items.")
+        return all_items
+
+    except Exception as e:
+        logger.exception(f"[{node_name}] Scraping failed: {e}")
+        return []
 
-    logger.info(f"{node_name} finished.")
 
 
-def split_into_chunks(lst: List[Any], n: int):
-    for i in range(0, len(lst), n):
-        yield lst[i:i + n]
 
 async def run_amazon_scraper(
     query_cluster_pairs: List[Tuple[str, str]],
@@ -465,36 +495,22 @@ def main(event: dict, secret_name, region_name):
                     benchmarking_row_id=benchmarking_row_id
                 )
             )
+            result_df = pd.DataFrame(result_list)
 
         else:
             logger.info(f"[{website}] Non-Amazon domain — running scrape_query + benchmarking.")
 
-            query_chunks = list(split_into_chunks(query_triplets, QUERIES_PER_NODE))
-            manager = Manager()
-            shared_data_list = manager.list()
-            shared_html_debug = manager.dict()
-
-            processes = []
-            for chunk in query_chunks[:MAX_CONCURRENT_TASKS]:
-                p = Process(target=node_worker, args=(chunk, shared_data_list, shared_html_debug))
-                p.start()
-                processes.append(p)
+            # Every query is scraped; concurrency and worker processes come from scrape_orchestrator
+            result_df = scrape_queries(query_triplets, scrape_query)
 
-            for p in processes:
-                p.join()
-
-            result_list = list(shared_data_list)
-
-        if not result_list:
+        if result_df.empty:
             logger.error(f"[{website}] No data scraped.")
             pg.mark_status(table_name, where_clause, status=f"Failed for {website}")
             continue
         else:
-            logger.info(f"[{website}] Scraped {len(result_list)} items.")
+            logger.info(f"[{website}] Scraped {len(result_df)} items.")
             pg.mark_status(table_name, where_clause, status="Scrapping-Completed")
 
-            result_df = pd.DataFrame(result_list)
-
             if {"title", "url", "price"}.issubset(result_df.columns):
                 result_df = result_df.dropna(subset=["title", "url", "price"])
                 result_df = result_df[result_df["title"].str.strip() != ""]
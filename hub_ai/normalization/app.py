@@ -20,6 +20,10 @@ sys.path.insert(0, str(normalization_dir))
 import normalise.env as env
 from normalise.src.common.logging_config import setup_logging
 from normalise.src.normalization.normalizer import Normalizer
+from normalise.src.normalization.checkpoint import NormalizationCheckpoint, checkpoint_dir_for, file_fingerprint
+from normalise.src.normalization.incremental import (
+    ExistingNormalizations, NORMALISED_TABLE, UPLOAD_COLUMN_RENAMES, drop_mirror, update_mirror
+)
 from normalise.src.common.data_io import save_dataframe
 from normalise.src.common.s3_utils import check_and_download_file, check_and_download_file_from_uri
 from normalise.src.common.snowflake_utils import upload_df_to_snowflake
@@ -57,6 +61,25 @@ def startup_event():
         logging.basicConfig(level=logging.ERROR)
         LOGGER.error(f"FATAL: Could not initialize application. Error: {e}", exc_info=True)
 
+def _prepare_upload_frame(normalized_df, custom_name: str):
+    """Shapes normalized rows into the NORMALISED_DATA upload schema."""
+    normalized_df['custom_name'] = custom_name
+
+    #columnn rename from B2B Query to B2B_QUERY AND Cluster_ID to CLUSTER_ID
+    index_cols = [col for col in normalized_df.columns if col.lower().startswith('_original_index')]
+    normalized_df.drop(columns=index_cols, inplace=True, errors='ignore')
+    normalized_df.rename(columns=UPLOAD_COLUMN_RENAMES, inplace=True)
+
+    columns_to_keep = ['RESPONSE'] + ['B2B_QUERY'] + ['custom_name'] + ['CLUSTER_ID'] + ['Item Description']
+    exclude_cols = set( ['custom_name', 'CLUSTER_ID', 'RESPONSE'])
+    original_input_columns = [col for col in normalized_df.columns if col not in exclude_cols]
+
+    normalized_df['RESPONSE'] = normalized_df[original_input_columns].apply(
+                                lambda row: json.dumps(row.to_dict(), ensure_ascii=False), axis=1
+                                )
+    return normalized_df.loc[:, [col for col in columns_to_keep if col in normalized_df.columns]]
+
+
 def run_normalization_job(
     workspace_id: str, 
     folder_id: str,
@@ -65,6 +88,9 @@ def run_normalization_job(
     secret_name, 
     region_name,
     material_description: str = None,
+    use_llm_cache: bool = True,
+    streaming: Optional[bool] = None,
+    incremental: bool = False,
 ):
     logger = setup_logging()
     logger.info("Received payload for normalization job:")
@@ -75,6 +101,9 @@ def run_normalization_job(
     logger.info(f"  secret_name: {secret_name}")
     logger.info(f"  region_name: {region_name}")
     logger.info(f"  material_description: {material_description}")
+    logger.info(f"  use_llm_cache: {use_llm_cache}")
+    logger.info(f"  streaming: {streaming}")
+    logger.info(f"  incremental: {incremental}")
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     temp_run_dir = os.path.join(env.BASE_TEMP_DIR, f"{workspace_id}_{timestamp}")
@@ -103,18 +132,43 @@ def run_normalization_job(
                 logger.warning(f"Failed to update or verify status to 'Normalization-In Progress': {status_err}")
                 raise
 
+        checkpoint = None
+        existing = None
+        snowflake_table_name = NORMALISED_TABLE
         # Run normalization logic for both cases
         if material_description:
             logger.info(f"Running normalization based on material_description: {material_description}")
-            normalizer = Normalizer(logger)
+            normalizer = Normalizer(logger, use_llm_cache=use_llm_cache)
             normalized_df = normalizer.run(material_description=material_description)
         else:
             env.S3_INPUT_BUCKET = S3_INPUT_BUCKET
             if not env.S3_INPUT_BUCKET:
                 raise RuntimeError("S3_INPUT_BUCKET is not set in environment/config.")
             input_file_path, row_count = check_and_download_file(env.S3_INPUT_BUCKET, folder_id, temp_run_dir, logger)
-            total_time_taken_mins = (row_count / 3) / 60
             logger.info(f"Input file successfully downloaded to: {input_file_path}")
+            normalizer = Normalizer(logger, use_llm_cache=use_llm_cache)
+            if incremental:
+                # Only the new rows are normalized, in memory, so large monthly extracts do not stream
+                streaming = False
+                existing = ExistingNormalizations.load(workspace_id, logger, region_name)
+            elif streaming is None:
+                streaming = row_count >= getattr(env, 'NORM_STREAMING_MIN_ROWS', 200000)
+            if streaming:
+                # Large input: checkpointed chunk-by-chunk run; the ETA uses the raw row count
+                chunk_rows = getattr(env, 'NORM_STREAMING_CHUNK_ROWS', 50000)
+                checkpoint = NormalizationCheckpoint(
+                    checkpoint_dir_for(env.NORM_CHECKPOINT_DIR, workspace_id, folder_id, custom_name),
+                    file_fingerprint(input_file_path, chunk_rows, env.NORM_LLM_PROMPT_KEY, env.LLM_MODEL),
+                    logger=logger
+                )
+                total_time_taken_mins = (row_count / 3) / 60
+            else:
+                input_df = normalizer.load_input(input_df_path=input_file_path)
+                if existing is not None:
+                    input_df = normalizer.select_new_rows(input_df, existing)
+                unique_count = normalizer.count_llm_inputs(input_df, existing=existing)
+                logger.info(f"{unique_count} unique descriptions out of {row_count} rows will be sent to the LLM")
+                total_time_taken_mins = (unique_count / 3) / 60
             
             try:
 
@@ -131,39 +185,46 @@ def run_normalization_job(
                 logger.warning(f"Failed to update or verify status to 'Normalization-In Progress': {status_err}")
                 raise
             
-            normalizer = Normalizer(logger)
-            normalized_df = normalizer.run(input_df_path=input_file_path)
-
-        normalized_df['custom_name'] = custom_name
-        if normalized_df.empty:
-            logger.warning("Normalization resulted in an empty DataFrame. Aborting upload to Snowflake.")
-            return
-
-        #columnn rename from B2B Query to B2B_QUERY AND Cluster_ID to CLUSTER_ID
-        index_cols = [col for col in normalized_df.columns if col.lower().startswith('_original_index')]
-        normalized_df.drop(columns=index_cols, inplace=True, errors='ignore')
-        normalized_df.rename(columns={'B2B Query': 'B2B_QUERY', 'Cluster_ID': 'CLUSTER_ID', 'description': 'Item Description'}, inplace=True)
-
-        columns_to_keep = ['RESPONSE'] + ['B2B_QUERY'] + ['custom_name'] + ['CLUSTER_ID'] + ['Item Description']
-        exclude_cols = set( ['custom_name', 'CLUSTER_ID', 'RESPONSE'])
-        original_input_columns = [col for col in normalized_df.columns if col not in exclude_cols]
-
-        normalized_df['RESPONSE'] = normalized_df[original_input_columns].apply(
-                                    lambda row: json.dumps(row.to_dict(), ensure_ascii=False), axis=1
-                                    )
-        normalized_df = normalized_df.loc[:, [col for col in columns_to_keep if col in normalized_df.columns]]
-
-        logger.info(f"Normalization complete. {len(normalized_df)} records processed.")
-        snowflake_table_name = "NORMALISED_DATA"
-        logger.info(f"Attempting to upload results to Snowflake table: {snowflake_table_name}")
-        upload_df_to_snowflake(
-            normalized_df,
-            snowflake_table_name,
-            workspace_id,
-            logger,
-            region_name
-        )
-        logger.info("Successfully uploaded data to Snowflake.")
+            if existing is not None:
+                normalized_df = normalizer.run_incremental(input_df, existing)
+            elif not streaming:
+                normalized_df = normalizer.run(input_df=input_df)
+
+        if checkpoint is not None:
+            uploaded_rows = 0
+            for chunk_no, chunk_df in normalizer.run_streaming(input_file_path, checkpoint, chunk_rows=chunk_rows):
+                if checkpoint.is_uploaded(chunk_no) or chunk_df.empty:
+                    continue
+                chunk_df = _prepare_upload_frame(chunk_df, custom_name)
+                upload_df_to_snowflake(chunk_df, snowflake_table_name, workspace_id, logger, region_name)
+                checkpoint.mark_uploaded(chunk_no)
+                uploaded_rows += len(chunk_df)
+                logger.info(f"Uploaded chunk {chunk_no + 1} ({len(chunk_df)} records) to Snowflake.")
+            checkpoint.clear()
+            drop_mirror(workspace_id, logger)
+            logger.info(f"Normalization complete. {uploaded_rows} records uploaded in streaming mode.")
+        elif existing is not None and normalized_df.empty:
+            logger.info("Incremental run found no new or changed rows. Nothing to upload.")
+        else:
+            if normalized_df.empty:
+                logger.warning("Normalization resulted in an empty DataFrame. Aborting upload to Snowflake.")
+                return
+            normalized_df = _prepare_upload_frame(normalized_df, custom_name)
+
+            logger.info(f"Normalization complete. {len(normalized_df)} records processed.")
+            logger.info(f"Attempting to upload results to Snowflake table: {snowflake_table_name}")
+            upload_df_to_snowflake(
+                normalized_df,
+                snowflake_table_name,
+                workspace_id,
+                logger,
+                region_name
+            )
+            if existing is not None:
+                update_mirror(workspace_id, normalized_df, logger)
+            else:
+                drop_mirror(workspace_id, logger)
+            logger.info("Successfully uploaded data to Snowflake.")
 
         # Only update status if material_description is NOT provided
         if not material_description:
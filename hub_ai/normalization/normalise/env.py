@@ -35,13 +35,30 @@ POSTGRES_SSL_MODE = "require"
 # --- LLM Configuration ---
 LLM_MODEL = "gpt-4o"
 LLM_TEMPERATURE = 0.0
-LLM_BATCH_SIZE = 10
+LLM_BATCH_SIZE = 10                # Initial batch size; adapted between the bounds below
+LLM_BATCH_SIZE_MIN = 1
+LLM_BATCH_SIZE_MAX = 60
+LLM_BATCH_GROW_AFTER = 3           # Consecutive fully returned batches before the size grows
 LLM_OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_API_BASE = os.getenv("OPENAI_BASE_URL")
 LLM_TIMEOUT_SECONDS = 120
 LLM_MAX_RETRIES = 2
 LLM_MAX_WORKERS_NORMALIZATION = 10
 
+# --- Async LLM engine ---
+NORM_LLM_ENGINE = "async"              # "async" (one event loop, global rate limiter) or "threads"
+NORM_ASYNC_MAX_CONCURRENCY = 200       # Batches in flight at once on the async engine
+NORM_LLM_OUTPUT_TOKENS_PER_ITEM = 80   # Output estimate used to reserve tokens-per-minute budget
+LLM_REQUESTS_PER_MINUTE = 500
+LLM_TOKENS_PER_MINUTE = 800000
+LLM_ASYNC_MAX_ATTEMPTS = 6
+
+# --- LLM Response Cache ---
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = os.path.join(BASE_TEMP_DIR, "llm_cache", "responses.sqlite3")
+LLM_CACHE_TTL_SECONDS = 30 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 200000
+
 # --- Logging Configuration ---
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -74,4 +91,47 @@ NORM_PRE_LLM_OPERATIONS = [
     {"type": "clean_text_basic", "column": "description"}
 ]
 
+# --- Near-duplicate grouping (MinHash/LSH) before the LLM ---
+# When enabled, only one representative per group of near-identical descriptions is sent to the
+# LLM; the other members copy the propagated columns from it and are marked in the audit column.
+NORM_NEAR_DUP_ENABLED = False
+NORM_NEAR_DUP_THRESHOLD = 0.9           # Jaccard similarity of character shingles to the representative
+NORM_NEAR_DUP_NUM_PERM = 64
+NORM_NEAR_DUP_BANDS = 8
+NORM_NEAR_DUP_SHINGLE_SIZE = 4
+NORM_NEAR_DUP_PROPAGATE_COLUMNS = ["Normalized Description", "B2B Query"]
+NORM_NEAR_DUP_AUDIT_COLUMN = "Normalization_Source"
+
+# --- Parallel preprocessing ---
+# With more than one worker, inputs of at least NORM_PREPROCESS_PARALLEL_MIN_ROWS rows run their
+# row-local pre-LLM operations on shards of NORM_PREPROCESS_SHARD_ROWS rows in worker processes.
+NORM_PREPROCESS_WORKERS = 1
+NORM_PREPROCESS_PARALLEL_MIN_ROWS = 500000
+NORM_PREPROCESS_SHARD_ROWS = 250000
+NORM_PREPROCESS_START_METHOD = "spawn"  # "fork" starts faster but is unsafe once the app runs threads
+
+# --- Streaming, checkpointed normalization for large inputs ---
+# Inputs with at least NORM_STREAMING_MIN_ROWS rows are read NORM_STREAMING_CHUNK_ROWS at a time;
+# LLM results are checkpointed to Parquet under NORM_CHECKPOINT_DIR so a restarted job resumes.
+NORM_STREAMING_MIN_ROWS = 200000
+NORM_STREAMING_CHUNK_ROWS = 50000
+NORM_CHECKPOINT_DIR = os.path.join(BASE_TEMP_DIR, "checkpoints")
+
+# --- Incremental normalization (only rows new to the workspace's NORMALISED_DATA) ---
+# Set a directory to keep a local Parquet mirror of each workspace's NORMALISED_DATA; it is used
+# instead of Snowflake while younger than NORM_INCREMENTAL_MIRROR_MAX_AGE_HOURS.
+NORM_INCREMENTAL_MIRROR_DIR = None      # e.g. os.path.join(BASE_TEMP_DIR, "normalised_mirror")
+NORM_INCREMENTAL_MIRROR_MAX_AGE_HOURS = 24
+
+# --- Clustering of normalized rows by B2B Query ---
+# "exact" gives every distinct query its own Cluster_ID. "semantic" links queries whose TF-IDF
+# cosine distance is within NORM_CLUSTER_DISTANCE_THRESHOLD ("SS304 pump 0.5kW" and
+# "0.5 kW SS304 pump") and writes each cluster's representative query to Cluster_Query.
+NORM_CLUSTER_MODE = "exact"
+NORM_CLUSTER_DISTANCE_THRESHOLD = 0.2
+NORM_CLUSTER_LINKAGE = "complete"       # "single" (connected components) or "complete" (every pair within threshold)
+NORM_CLUSTER_ANALYZER = "word"          # "word" tokens or "char_wb" 3-4 grams (tolerates typos)
+NORM_CLUSTER_REPRESENTATIVE = "most_frequent"   # "most_frequent", "shortest" or "medoid"
+NORM_CLUSTER_MAX_LINKAGE_SIZE = 2000    # Larger connected components keep single linkage
+
 # Add more as needed for other config keys referenced in the code 
\ No newline at end of file
@@ -1,6 +1,7 @@
 import pandas as pd
 import logging
 import os
+from typing import Iterator
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +31,46 @@ def load_dataframe(file_path: str, file_type: str = None, **kwargs) -> pd.DataFr
         logger.error(f"Error loading dataframe from {file_path}: {e}")
         raise
 
+def iter_dataframe_chunks(file_path: str, chunk_rows: int, file_type: str = None, **kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Yields a file as DataFrames of at most `chunk_rows` rows, without loading it whole.
+    Each chunk's index continues from the previous one, i.e. it is the row position in the file.
+    """
+    if not os.path.exists(file_path):
+        logger.error(f"File not found: {file_path}")
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    if not file_type:
+        file_type = file_path.split('.')[-1].lower()
+
+    logger.info(f"Streaming dataframe from: {file_path} (type: {file_type}, chunk rows: {chunk_rows})")
+    if file_type == 'csv':
+        yield from pd.read_csv(file_path, chunksize=chunk_rows, **kwargs)
+    elif file_type == 'xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+            offset, block = 0, []
+            for row in rows:
+                block.append(row)
+                if len(block) == chunk_rows:
+                    yield pd.DataFrame(block, columns=columns, index=pd.RangeIndex(offset, offset + len(block)))
+                    offset, block = offset + len(block), []
+            if block:
+                yield pd.DataFrame(block, columns=columns, index=pd.RangeIndex(offset, offset + len(block)))
+        finally:
+            workbook.close()
+    else:
+        # No streaming reader for this type; load it once and slice
+        df = load_dataframe(file_path, file_type=file_type, **kwargs)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
 def save_dataframe(df: pd.DataFrame, file_path: str, file_type: str = None, index: bool = False, **kwargs):
     """
     Saves a dataframe to a file.
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Evict down to this fraction of max_entries so eviction does not run on every insert
+EVICT_TO_FRACTION = 0.9
+# Inserts between checks of the size bound
+EVICT_CHECK_EVERY = 100
+
+
+def make_cache_key(model: str, messages: List[Dict[str, str]], response_format: Optional[Dict[str, Any]] = None,
+                   **params) -> str:
+    """SHA-256 over the canonical JSON of everything that determines a temperature-0 completion."""
+    payload = {"model": model, "messages": messages, "response_format": response_format, "params": params}
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Local read-through / write-through cache of LLM completion texts in SQLite.
+
+    Entries expire after `ttl_seconds` and the table is bounded to `max_entries`, evicting the
+    least recently used rows. Safe to share between threads. Intended for deterministic
+    (temperature 0) calls, so a rerun after a crash only pays for calls that never completed.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 30 * 24 * 3600, max_entries: int = 200000,
+                 logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_check = EVICT_CHECK_EVERY
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self.purge_expired()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._puts_since_check += 1
+            if self._puts_since_check < EVICT_CHECK_EVERY:
+                return
+            self._puts_since_check = 0
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                evict = count - int(self.max_entries * EVICT_TO_FRACTION)
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                    (evict,),
+                )
+                self.logger.info(f"LLM cache evicted {evict} least recently used entries")
+
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        """Return the cached value, or compute, store and return it. Failures are not cached."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        value = compute()
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+        if deleted:
+            self.logger.info(f"LLM cache purged {deleted} expired entries")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,14 +1,20 @@
 import os
 import json
 import time
+import asyncio
 import logging
-from openai import OpenAI, APIError, APITimeoutError, APIConnectionError, RateLimitError
+from openai import OpenAI, AsyncOpenAI, APIError, APITimeoutError, APIConnectionError, RateLimitError, InternalServerError
 from typing import List, Dict, Union, Tuple, Callable, Any 
 from io import StringIO
 import csv
 import pandas as pd
 import importlib
 import normalise.env as env
+from normalise.src.common.llm_cache import LLMResponseCache, make_cache_key
+from normalise.src.common.rate_limiter import AsyncRateLimiter, backoff_delay
+
+# Leading column of CSV rows returned for ID-tagged batches
+ROW_ID_COLUMN = "ID"
 
 
 class LLMClient:
@@ -17,13 +23,25 @@ class LLMClient:
     Handles API calls, prompt formatting, response parsing, retries, and error handling.
     Prompts are now loaded from Python functions.
     """
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, logger: logging.Logger, use_cache: bool = True):
         self.logger = logger
         self.model = env.LLM_MODEL
         self.temperature = env.LLM_TEMPERATURE
         self.api_key = env.LLM_OPENAI_API_KEY
         self.base_url = env.OPENAI_API_BASE
         self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # Response cache for deterministic (temperature 0) calls; use_cache=False bypasses it for a job
+        self.cache = None
+        if use_cache and getattr(env, 'LLM_CACHE_ENABLED', False):
+            self.cache = LLMResponseCache(
+                getattr(env, 'LLM_CACHE_PATH', os.path.join(env.BASE_TEMP_DIR, "llm_cache", "responses.sqlite3")),
+                ttl_seconds=getattr(env, 'LLM_CACHE_TTL_SECONDS', 30 * 24 * 3600),
+                max_entries=getattr(env, 'LLM_CACHE_MAX_ENTRIES', 200000),
+                logger=logger,
+            )
+        # Async client and global rate limiter are created on first use inside the running event loop
+        self._async_client = None
+        self.rate_limiter = None
         import normalise.src.prompts.normalization_prompts as normalization_prompts
         self.prompt_module = normalization_prompts
         self.logger.info("LLMClient initialized.")
@@ -63,13 +81,8 @@ class LLMClient:
         ]
         return messages
 
-    def generate_text_completion(self, prompt_key: str, prompt_args: Dict, 
-                                 model: str = None, temperature: float = None) -> str:
-        if model is None: model = self.model
-        if temperature is None: temperature = self.temperature
-        
+    def _build_messages(self, prompt_key: str, prompt_args: Dict) -> List[Dict[str, str]]:
         self.logger.debug(f"Prompt arguments for LLM call (prompt_key: {prompt_key}): {prompt_args}")
-        
         try:
             prompt_components = self._get_prompt_function_output(prompt_key, prompt_args)
             messages = self._format_prompt_from_components(prompt_components)
@@ -77,6 +90,61 @@ class LLMClient:
         except Exception as e_format: 
             self.logger.error(f"Failed to get or format prompt for key '{prompt_key}': {e_format}", exc_info=True)
             raise 
+        return messages
+
+    def _cache_lookup(self, model: str, messages: List[Dict[str, str]], temperature: float,
+                      prompt_key: str) -> Tuple[Union[str, None], Union[str, None]]:
+        """(cache_key, cached_text); the key is None when the call is not cacheable."""
+        if self.cache is None or temperature:
+            return None, None
+        cache_key = make_cache_key(model, messages, temperature=temperature)
+        cached_text = self.cache.get(cache_key)
+        if cached_text is not None:
+            self.logger.info(f"LLM cache hit for prompt key '{prompt_key}'.")
+        return cache_key, cached_text
+
+    def item_cache_keys(self, prompt_key: str, empty_prompt_args: Dict, items: List[str],
+                        **params) -> Union[List[str], None]:
+        """
+        Cache keys for the per-item outputs of a batch prompt, independent of how items are batched:
+        each item's text under the prompt rendered with `empty_prompt_args` (no items), so a changed
+        prompt, model or temperature misses. None when the cache is off or calls are not deterministic.
+        """
+        if self.cache is None or self.temperature:
+            return None
+        template = self._format_prompt_from_components(self._get_prompt_function_output(prompt_key, empty_prompt_args))
+        return [make_cache_key(self.model, template, item=item, temperature=self.temperature, **params) for item in items]
+
+    def _cache_reply(self, cache_key: Union[str, None], completion_text: str,
+                     validate: Union[Callable[[str], bool], None], prompt_key: str):
+        """Stores a reply once `validate` accepts it, so a malformed reply is not served again on a rerun."""
+        if cache_key is None:
+            return
+        if validate is not None:
+            try:
+                valid = validate(completion_text)
+            except Exception as e:
+                self.logger.warning(f"Validating the reply for prompt key '{prompt_key}' failed: {e}")
+                valid = False
+            if not valid:
+                self.logger.info(f"Not caching a reply for prompt key '{prompt_key}' that failed validation.")
+                return
+        self.cache.put(cache_key, completion_text)
+
+    def generate_text_completion(self, prompt_key: str, prompt_args: Dict, 
+                                 model: str = None, temperature: float = None, use_cache: bool = True,
+                                 validate: Callable[[str], bool] = None) -> str:
+        """
+        Returns the completion text for a prompt. With the cache on, pass `validate` when the reply
+        is parsed: it is stored only if validate(reply) is true, and returned either way.
+        """
+        if model is None: model = self.model
+        if temperature is None: temperature = self.temperature
+        
+        messages = self._build_messages(prompt_key, prompt_args)
+        cache_key, cached_text = self._cache_lookup(model, messages, temperature, prompt_key) if use_cache else (None, None)
+        if cached_text is not None:
+            return cached_text
 
         retries = env.LLM_MAX_RETRIES
         timeout = env.LLM_TIMEOUT_SECONDS
@@ -93,6 +161,7 @@ class LLMClient:
                 )
                 completion_text = response.choices[0].message.content.strip()
                 self.logger.info(f"LLM API Call successful. Response received for prompt key '{prompt_key}'.")
+                self._cache_reply(cache_key, completion_text, validate, prompt_key)
                 return completion_text
             except APITimeoutError as e:
                 self.logger.warning(f"LLM API call timed out (Attempt {attempt + 1}/{retries}): {e}")
@@ -125,9 +194,88 @@ class LLMClient:
                     raise APIError(message=f"LLM call failed after {retries} attempts for {prompt_key} with no specific API error captured.", request=None) # request=None might be an issue if APIError expects it
 
 
+    def _get_async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+            self.rate_limiter = AsyncRateLimiter(
+                requests_per_minute=getattr(env, 'LLM_REQUESTS_PER_MINUTE', 500),
+                tokens_per_minute=getattr(env, 'LLM_TOKENS_PER_MINUTE', 800000)
+            )
+        return self._async_client
+
+    async def agenerate_text_completion(self, prompt_key: str, prompt_args: Dict, model: str = None,
+                                        temperature: float = None, estimated_output_tokens: int = 0,
+                                        use_cache: bool = True, validate: Callable[[str], bool] = None) -> str:
+        """
+        Async counterpart of `generate_text_completion`. Every attempt waits on the client's global
+        rate limiter, and retries back off with jittered exponential delays on the event loop, so a
+        rate-limited call never holds a worker. Only 429s, connection errors, timeouts and 5xx
+        responses are retried; any other API error is raised on the first attempt.
+        """
+        if model is None: model = self.model
+        if temperature is None: temperature = self.temperature
+
+        messages = self._build_messages(prompt_key, prompt_args)
+        cache_key, cached_text = self._cache_lookup(model, messages, temperature, prompt_key) if use_cache else (None, None)
+        if cached_text is not None:
+            return cached_text
+
+        client = self._get_async_client()
+        attempts = getattr(env, 'LLM_ASYNC_MAX_ATTEMPTS', 6)
+        timeout = env.LLM_TIMEOUT_SECONDS
+        estimated_tokens = sum(len(m["content"]) for m in messages) // 4 + estimated_output_tokens
+        last_error = None
+
+        for attempt in range(attempts):
+            await self.rate_limiter.acquire(estimated_tokens)
+            delay = None
+            try:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout
+                )
+                usage = getattr(response, "usage", None)
+                self.rate_limiter.settle(estimated_tokens, getattr(usage, "total_tokens", None))
+                completion_text = response.choices[0].message.content.strip()
+                self._cache_reply(cache_key, completion_text, validate, prompt_key)
+                return completion_text
+            except RateLimitError as e:
+                self.rate_limiter.on_rate_limited()
+                retry_after = e.response.headers.get("retry-after") if getattr(e, "response", None) is not None else None
+                try:
+                    delay = float(retry_after) if retry_after is not None else None
+                except ValueError:
+                    delay = None
+                self.logger.warning(f"LLM API rate limit exceeded (Attempt {attempt + 1}/{attempts}) for prompt key '{prompt_key}'.")
+                last_error = e
+            except (APITimeoutError, APIConnectionError, InternalServerError) as e:
+                # Only transient failures are retried; other 4xx (bad request, auth, not found) raise at once
+                self.logger.warning(f"LLM API call failed (Attempt {attempt + 1}/{attempts}) for prompt key '{prompt_key}': {e}")
+                last_error = e
+
+            if attempt == attempts - 1:
+                self.logger.error(f"LLM API call failed after {attempts} attempts for prompt key '{prompt_key}'.")
+                raise last_error
+            await asyncio.sleep(delay if delay is not None else backoff_delay(attempt))
+
+    async def aclose(self):
+        """Closes the async client; the next async call creates a fresh one (and rate limiter)."""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+            self.rate_limiter = None
+
     def parse_csv_from_llm_output(self, csv_text: str, expected_columns: List[str], 
-                                  expected_rows: int = None) -> pd.DataFrame:
+                                  expected_rows: int = None, expected_ids: List[int] = None) -> pd.DataFrame:
+        """
+        Parses CSV rows from an LLM response. With `expected_ids`, each row must start with an
+        ordinal ID column; rows are realigned by that ID and the result has exactly one row per
+        expected ID, in order (all-NaN where the LLM did not return it).
+        """
         self.logger.debug(f"Attempting to parse CSV from LLM output. Expected columns: {expected_columns}")
+        parse_columns = expected_columns if expected_ids is None else [ROW_ID_COLUMN] + list(expected_columns)
         self.logger.debug(f"Raw CSV text from LLM: \n{csv_text}")
 
         try:
@@ -151,8 +299,8 @@ class LLMClient:
             except Exception as e_first_line:
                 self.logger.warning(f"Could not parse first line for header check: {e_first_line}")
 
-            if first_line_cols and len(first_line_cols) == len(expected_columns) and \
-               all(col_name.strip('"').strip().lower() == exp_col.strip().lower() for col_name, exp_col in zip(first_line_cols, expected_columns)): # Added strip('"')
+            if first_line_cols and len(first_line_cols) == len(parse_columns) and \
+               all(col_name.strip('"').strip().lower() == exp_col.strip().lower() for col_name, exp_col in zip(first_line_cols, parse_columns)): # Added strip('"')
                  self.logger.info("Detected a header row in LLM output that matches expected columns. Skipping it.")
                  csv_text_lines = csv_text.splitlines()
                  csv_text = "\n".join(csv_text_lines[1:]) if len(csv_text_lines) > 1 else ""
@@ -165,21 +313,23 @@ class LLMClient:
             for i, row in enumerate(reader):
                 if not row: # Skip empty rows that csv.reader might produce from blank lines
                     continue
-                if len(row) == len(expected_columns):
+                if len(row) == len(parse_columns):
                     parsed_rows.append(row)
                 # Robustness: Handle trailing comma if it results in one extra empty field
-                elif len(row) == len(expected_columns) + 1 and row[-1] == '':
+                elif len(row) == len(parse_columns) + 1 and row[-1] == '':
                     self.logger.warning(
                         f"Row {i+1} has an extra empty column, likely due to a trailing comma. "
-                        f"Taking first {len(expected_columns)} column(s). Row: {row}"
+                        f"Taking first {len(parse_columns)} column(s). Row: {row}"
                     )
-                    parsed_rows.append(row[:len(expected_columns)])
+                    parsed_rows.append(row[:len(parse_columns)])
                 else:
                     self.logger.warning(
-                        f"Row {i+1} has incorrect column count. Expected {len(expected_columns)}, got {len(row)}. Row: {row}. Skipping."
+                        f"Row {i+1} has incorrect column count. Expected {len(parse_columns)}, got {len(row)}. Row: {row}. Skipping."
                     )
             
-            df = pd.DataFrame(parsed_rows, columns=expected_columns)
+            df = pd.DataFrame(parsed_rows, columns=parse_columns)
+            if expected_ids is not None:
+                df = self._align_rows_by_id(df, expected_columns, expected_ids)
 
             if expected_rows is not None and len(df) != expected_rows:
                 self.logger.warning(
@@ -193,8 +343,28 @@ class LLMClient:
         except Exception as e:
             self.logger.error(f"Failed to parse CSV from LLM output: {e}", exc_info=True)
             self.logger.error(f"Problematic CSV text was: \n{csv_text[:500]}...") 
+            if expected_ids is not None:
+                return pd.DataFrame(index=expected_ids, columns=expected_columns)
             return pd.DataFrame(columns=expected_columns)
 
+    def _align_rows_by_id(self, df: pd.DataFrame, expected_columns: List[str], expected_ids: List[int]) -> pd.DataFrame:
+        """Keys parsed rows by their ordinal ID, dropping unknown and repeated IDs."""
+        ids = pd.to_numeric(df[ROW_ID_COLUMN].astype(str).str.strip().str.strip('[]#.: '), errors='coerce')
+        df = df.loc[ids.notna(), expected_columns]
+        df.index = ids[ids.notna()].astype(int)
+        repeated = df.index.duplicated(keep='first')
+        if repeated.any():
+            self.logger.warning(f"LLM output repeated row IDs {sorted(set(df.index[repeated]))}. Keeping the first of each.")
+            df = df[~repeated]
+        unknown = df.index.difference(expected_ids)
+        if len(unknown):
+            self.logger.warning(f"LLM output contained unexpected row IDs {list(unknown)}. Dropping them.")
+        aligned = df.reindex(expected_ids)
+        missing = aligned.isna().all(axis=1)
+        if missing.any():
+            self.logger.warning(f"LLM output is missing row IDs {list(aligned.index[missing])}.")
+        return aligned
+
 
     def parse_json_from_llm_output(self, json_text: str, expected_structure_type: type = list) -> Union[List, Dict, None]:
         self.logger.debug("Attempting to parse JSON from LLM output.")
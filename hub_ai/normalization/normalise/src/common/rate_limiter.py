@@ -0,0 +1,69 @@
+import time
+import random
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTokenBucket:
+    """Per-minute budget refilled continuously. Coroutines await `acquire` before spending."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float):
+        # A single request larger than the bucket is allowed through once the bucket is full
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+    def adjust(self, delta: float):
+        """Charge (positive) or refund (negative) the difference between estimated and actual usage."""
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+    def drain(self):
+        """Empty the bucket, e.g. after a 429, so the next requests wait for a refill."""
+        self._refill()
+        self.level = min(self.level, 0.0)
+
+
+class AsyncRateLimiter:
+    """Global requests-per-minute and tokens-per-minute limit shared by every coroutine of a job."""
+
+    def __init__(self, requests_per_minute: int = 500, tokens_per_minute: int = 800000):
+        self.requests = AsyncTokenBucket(requests_per_minute)
+        self.tokens = AsyncTokenBucket(tokens_per_minute)
+
+    async def acquire(self, estimated_tokens: int):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        if actual_tokens:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def on_rate_limited(self):
+        self.requests.drain()
+        self.tokens.drain()
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2 ** attempt)]."""
+    return random.uniform(0.0, min(cap, base * (2 ** attempt)))
@@ -98,6 +98,21 @@ def upload_df_to_snowflake(df: pd.DataFrame, table_name: str, workspace_id: str,
         logger.error(f"Error uploading DataFrame to Snowflake: {e}", exc_info=True)
         raise
 
+def snowflake_table_exists(table_name: str, workspace_id: str, logger: logging.Logger, region_name: str) -> bool:
+    """
+    Whether the table exists in the workspace schema (False when the schema does not exist either).
+    """
+    schema = workspace_id
+    table_name_upper = table_name.upper()
+    try:
+        session = get_snowflake_session(logger, region_name)
+        if not session.sql(f"SHOW SCHEMAS LIKE '{schema}'").collect():
+            return False
+        return bool(session.sql(f'SHOW TABLES LIKE \'{table_name_upper}\' IN SCHEMA "{schema}"').collect())
+    except Exception as e:
+        logger.error(f"Error checking for table {schema}.{table_name_upper} in Snowflake: {e}", exc_info=True)
+        raise
+
 def read_df_from_snowflake(table_name: str, workspace_id: str, logger: logging.Logger, region_name: str) -> pd.DataFrame:
     """
     Reads a table from Snowflake into a Pandas DataFrame using Snowpark.
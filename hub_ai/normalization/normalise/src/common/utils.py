@@ -1,9 +1,34 @@
+import numpy as np
 import pandas as pd
 import re
 import logging
+from functools import lru_cache
+from typing import Callable, Dict, Tuple
 
 logger = logging.getLogger(__name__)
 
+# One pass for the character substitutions of clean_text_for_llm
+LLM_TEXT_TRANSLATION = str.maketrans({'"': "'", '\n': ' ', '\r': None, ',': ';'})
+
+
+@lru_cache(maxsize=256)
+def compiled_pattern(pattern: str, flags: int = 0) -> re.Pattern:
+    """Compiled regex shared by every caller, so hot paths never recompile a pattern."""
+    return re.compile(pattern, flags)
+
+
+def map_unique_strings(texts: pd.Series, transform: Callable[[pd.Series], pd.Series], missing=None) -> pd.Series:
+    """
+    Runs a vectorized string transform once per distinct value of `texts` (as str) and maps the
+    results back, so repeated descriptions cost nothing extra. Missing values become `missing`,
+    or stay as they are when it is None. Returns an object Series with the index of `texts`.
+    """
+    codes, uniques = pd.factorize(texts.to_numpy(dtype=object))
+    done = transform(pd.Series(uniques, dtype=object).astype(str)).to_numpy(dtype=object)
+    result = pd.Series(np.append(done, missing)[codes], index=texts.index, name=texts.name, dtype=object)
+    return result if missing is not None else result.where(texts.notna(), texts)
+
+
 def clean_text_for_llm(text: str) -> str:
     """
     Basic cleaning for text before sending to LLM.
@@ -16,6 +41,15 @@ def clean_text_for_llm(text: str) -> str:
     text = re.sub(r'\s+', ' ', text).strip() # Replace multiple spaces with single
     return text
 
+def clean_llm_strings(texts: pd.Series) -> pd.Series:
+    """`clean_text_for_llm` over a Series of non-missing strings."""
+    # A compiled pattern keeps Python `re` semantics for \s on every string backend
+    return texts.str.translate(LLM_TEXT_TRANSLATION).str.replace(compiled_pattern(r'\s+'), ' ', regex=True).str.strip()
+
+def clean_text_for_llm_series(texts: pd.Series) -> pd.Series:
+    """Vectorized `clean_text_for_llm`: same output for every element, missing values become "N/A"."""
+    return map_unique_strings(texts, clean_llm_strings, missing="N/A")
+
 def clean_text_for_matching(text: str) -> str:
     """
     More aggressive cleaning for text comparison/matching.
@@ -40,6 +74,10 @@ def normalize_inch_quotes(text: str) -> str:
         return text
     return str(text).replace('"', ' inch')
 
+def normalize_inch_quotes_series(texts: pd.Series) -> pd.Series:
+    """Vectorized `normalize_inch_quotes`; missing values are kept."""
+    return map_unique_strings(texts, lambda s: s.str.replace('"', ' inch', regex=False))
+
 def expand_abbreviations(text: str, abbr_map: dict) -> str:
     """
     Expands abbreviations in a text string using a provided map.
@@ -60,6 +98,35 @@ def expand_abbreviations(text: str, abbr_map: dict) -> str:
     return text_str.strip()
 
 
+def abbreviation_matcher(abbr_map: dict) -> Tuple[re.Pattern, Dict[str, str]]:
+    """
+    One case-insensitive, whole-word alternation regex over every abbreviation (longest first)
+    and the lookup from a lowercased match to its full form. The first entry wins among
+    abbreviations that differ only in case, as in `expand_abbreviations`.
+    """
+    lookup = {}
+    for abbr, full_form in abbr_map.items():
+        lookup.setdefault(str(abbr).lower(), str(full_form))
+    alternation = '|'.join(re.escape(a) for a in sorted(lookup, key=len, reverse=True))
+    return compiled_pattern(r'\b(?:' + alternation + r')\b', re.IGNORECASE), lookup
+
+
+def expand_abbreviation_strings(texts: pd.Series, abbr_map: dict) -> pd.Series:
+    """
+    `expand_abbreviations` over a Series of non-missing strings: a single regex pass with a dict lookup.
+    Inserted full forms are not scanned again, where the per-abbreviation loop could re-expand them.
+    """
+    if not abbr_map:
+        return texts.str.strip()
+    pattern, lookup = abbreviation_matcher(abbr_map)
+    return texts.str.replace(pattern, lambda m: lookup[m.group(0).lower()], regex=True).str.strip()
+
+
+def expand_abbreviations_series(texts: pd.Series, abbr_map: dict) -> pd.Series:
+    """Vectorized `expand_abbreviations`; missing values are kept."""
+    return map_unique_strings(texts, lambda s: expand_abbreviation_strings(s, abbr_map))
+
+
 def parse_price_range(price_str: str, strategy: str = "max_from_range_usd") -> float:
     """
     Parses a price string (e.g., "US$ 10.50 - 12.00", "US$ 5.00") and extracts a single price.
@@ -0,0 +1,52 @@
+import logging
+import threading
+import numpy as np
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveBatchSizer:
+    """
+    Batch size controller for LLM normalization.
+
+    The size grows by `growth` after `grow_after` consecutive batches whose rows all came back,
+    and is halved on a row mismatch, parse failure or timeout. Safe to share between worker threads.
+    """
+
+    def __init__(self, initial: int = 10, minimum: int = 1, maximum: int = 60, grow_after: int = 3,
+                 growth: float = 1.25):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.size = min(max(int(initial), self.minimum), self.maximum)
+        self.grow_after = max(1, int(grow_after))
+        self.growth = growth
+        self.streak = 0
+        self._lock = threading.Lock()
+
+    def next_size(self) -> int:
+        with self._lock:
+            return self.size
+
+    def record_success(self):
+        with self._lock:
+            self.streak += 1
+            if self.streak >= self.grow_after and self.size < self.maximum:
+                self.size = min(self.maximum, max(self.size + 1, int(self.size * self.growth)))
+                self.streak = 0
+                logger.info(f"LLM batch size increased to {self.size}")
+
+    def record_failure(self):
+        with self._lock:
+            self.streak = 0
+            if self.size > self.minimum:
+                self.size = max(self.minimum, self.size // 2)
+                logger.info(f"LLM batch size reduced to {self.size}")
+
+
+def split_failed(positions: np.ndarray) -> List[np.ndarray]:
+    """Halves of the rows that failed in one batch; a single row is retried on its own."""
+    if len(positions) <= 1:
+        return [positions]
+    middle = len(positions) // 2
+    return [positions[:middle], positions[middle:]]
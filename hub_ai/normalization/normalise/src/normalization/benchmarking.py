@@ -4,12 +4,11 @@ import logging
 import pandas as pd
 import time
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from normalise.src.common.s3_utils import check_and_download_file_from_uri
 from normalise.src.common.snowflake_utils import read_df_from_snowflake, upload_df_to_snowflake
 from normalise.src.common.data_io import load_dataframe
 from normalise.src.common.utils import clean_text_for_matching
+from normalise.src.normalization.tfidf_scorer import pairwise_tfidf_cosine
 from normalise.src.normalization.clustering import Clustering
 from normalise.src.prompts.normalization_prompts import benchmarking_match_prompt
 from openai import OpenAI
@@ -28,72 +27,6 @@ class Benchmarker:
         
         openai_base_url = os.getenv("OPENAI_BASE_URL")
         self.client = OpenAI(api_key=openai_api_key, base_url=openai_base_url, timeout=180.0)
-        
-        # Initialize TF-IDF vectorizer for cosine similarity
-        self.vectorizer = TfidfVectorizer(
-            lowercase=True,
-            stop_words='english',
-            ngram_range=(1, 2),
-            max_features=1000,
-            min_df=1,
-            max_df=0.95
-        )
-
-    def _calculate_cosine_similarity(self, text1: str, text2: str) -> float:
-        """Calculate cosine similarity between two text strings"""
-        try:
-            if not text1 or not text2:
-                return 0.0
-            
-            # Clean and normalize texts
-            text1_clean = str(text1).lower().strip()
-            text2_clean = str(text2).lower().strip()
-            
-            if not text1_clean or not text2_clean:
-                return 0.0
-            
-            # Log the texts being compared for debugging
-            self.logger.debug(f"Comparing texts for cosine similarity:")
-            self.logger.debug(f"  Text1: '{text1_clean}'")
-            self.logger.debug(f"  Text2: '{text2_clean}'")
-            
-            # Create a temporary vectorizer for this comparison
-            # Use simpler parameters that work better with multilingual text
-            temp_vectorizer = TfidfVectorizer(
-                lowercase=True,
-                stop_words=None,  # Don't use English stop words for multilingual text
-                ngram_range=(1, 1),  # Use only unigrams
-                max_features=500,
-                min_df=1,
-                max_df=1.0,  # Allow all terms
-                token_pattern=r'(?u)\b\w+\b'  # Unicode-aware word boundaries
-            )
-            
-            # Vectorize the texts
-            texts = [text1_clean, text2_clean]
-            tfidf_matrix = temp_vectorizer.fit_transform(texts)
-            
-            # Check if we have any features
-            if tfidf_matrix.shape[1] == 0:
-                self.logger.debug("No features found in TF-IDF matrix")
-                return 0.0
-            
-            # Get feature names for debugging
-            feature_names = temp_vectorizer.get_feature_names_out()
-            self.logger.debug(f"TF-IDF features: {feature_names}")
-            
-            # Calculate cosine similarity
-            similarity_matrix = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
-            similarity_score = float(similarity_matrix[0][0])
-            
-            # Log for debugging
-            self.logger.debug(f"Cosine similarity score: {similarity_score:.3f}")
-            
-            return similarity_score
-            
-        except Exception as e:
-            self.logger.warning(f"Error calculating cosine similarity between '{text1[:50]}...' and '{text2[:50]}...': {e}")
-            return 0.0
 
     def _calculate_hybrid_score(self, llm_score: float, cosine_score: float, 
                               llm_weight: float = 0.7, cosine_weight: float = 0.3) -> float:
@@ -226,8 +159,8 @@ class Benchmarker:
         # Get matches from LLM
         matches = self._get_bulk_matches_from_llm(client_queries, chunk_dict, cluster_id)
         
-        # Process results and calculate hybrid scores
-        overall_best_matches = {}
+        # Resolve valid matches and the text pairs used for the cosine component
+        candidates = []
         for match in matches:
             if not all(k in match for k in ['client_query_id', 'score', 'matched_product_index']):
                 continue
@@ -247,20 +180,20 @@ class Benchmarker:
                 self.logger.warning(f"Cluster {cluster_id}: Invalid LLM index {llm_index}")
                 continue
             
-            # Calculate cosine similarity between client query and TRANSLATED product title
-            client_query_text = client_queries.get(cq_id, "")
-            
             # Use translated title for cosine similarity if available, otherwise fall back to original
             if translated_title and translated_title != 'N/A':
                 product_text_for_cosine = translated_title
-                self.logger.debug(f"Cluster {cluster_id}: Using translated title for cosine: '{translated_title}'")
             else:
                 product_text_for_cosine = scraped_products_list[llm_index]['description']
-                self.logger.debug(f"Cluster {cluster_id}: Using original description for cosine: '{product_text_for_cosine}'")
-            
-            cosine_score = self._calculate_cosine_similarity(client_query_text, product_text_for_cosine)
             
-            # Calculate hybrid score
+            candidates.append((cq_id, llm_score, original_index, translated_title, client_queries.get(cq_id, ""), product_text_for_cosine))
+
+        # Cosine similarity between client queries and (translated) product titles, scored in one pass
+        cosine_scores = pairwise_tfidf_cosine([c[4] for c in candidates], [c[5] for c in candidates])
+
+        # Calculate hybrid scores
+        overall_best_matches = {}
+        for (cq_id, llm_score, original_index, translated_title, client_query_text, product_text_for_cosine), cosine_score in zip(candidates, cosine_scores.tolist()):
             hybrid_score = self._calculate_hybrid_score(llm_score, cosine_score, llm_weight=0.7, cosine_weight=0.3)
             
             self.logger.debug(f"Cluster {cluster_id}, Query {cq_id}: LLM={llm_score:.3f}, Cosine={cosine_score:.3f}, Hybrid={hybrid_score:.3f}")
@@ -0,0 +1,140 @@
+import os
+import re
+import glob
+import json
+import shutil
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+META_FILE = "meta.json"
+
+
+def file_fingerprint(path: str, *extra) -> str:
+    """SHA-256 of the file contents plus any settings that change how the file is split or prompted."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    for value in (CHECKPOINT_VERSION,) + extra:
+        digest.update(f"\x00{value}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def checkpoint_dir_for(base_dir: str, *parts: str) -> str:
+    """A filesystem-safe checkpoint directory for a job, e.g. (workspace_id, folder_id, custom_name)."""
+    name = "_".join(re.sub(r"[^A-Za-z0-9._-]+", "-", str(p)) for p in parts if p)
+    return os.path.join(base_dir, name or "default")
+
+
+class NormalizationCheckpoint:
+    """
+    Local Parquet checkpoint of LLM normalization results for one input file.
+
+    Results are keyed by `_original_index` and written per input chunk as numbered part files
+    (chunk-000003-0002.parquet), each written to a temporary name and renamed into place, so a
+    crash never leaves a half-written part. `meta.json` records the input fingerprint and which
+    chunks were already uploaded; a checkpoint built from different input is discarded.
+    """
+
+    def __init__(self, directory: str, fingerprint: str, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self._buffer: List[pd.DataFrame] = []
+        self._buffered_chunk = None
+
+        meta = self._read_meta()
+        if meta is not None and meta.get("fingerprint") != fingerprint:
+            self.logger.info(f"Checkpoint at {directory} belongs to different input. Starting over.")
+            shutil.rmtree(directory, ignore_errors=True)
+            meta = None
+        os.makedirs(directory, exist_ok=True)
+        self.meta = meta or {"fingerprint": fingerprint, "uploaded_chunks": []}
+        if meta is None:
+            self._write_meta()
+        else:
+            self.logger.info(f"Resuming from checkpoint at {directory}")
+
+    def _read_meta(self) -> Optional[dict]:
+        path = os.path.join(self.directory, META_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Unreadable checkpoint metadata at {path}: {e}")
+            return {}
+
+    def _write_meta(self):
+        path = os.path.join(self.directory, META_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.meta, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _parts(self, chunk_no: int) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, f"chunk-{chunk_no:06d}-*.parquet")))
+
+    def append(self, chunk_no: int, df: pd.DataFrame, flush_rows: int = 2000):
+        """Buffers results for `chunk_no` and writes a part file once `flush_rows` are buffered."""
+        if self._buffered_chunk is not None and self._buffered_chunk != chunk_no:
+            self.flush()
+        self._buffered_chunk = chunk_no
+        self._buffer.append(df)
+        if sum(len(b) for b in self._buffer) >= flush_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        df = pd.concat(self._buffer, ignore_index=True)
+        chunk_no = self._buffered_chunk
+        self._buffer = []
+        # Output columns are free text; store them as strings so every part has the same schema
+        df = df.astype({c: "string" for c in df.columns if c != "_original_index"})
+        df["_original_index"] = df["_original_index"].astype("int64")
+        path = os.path.join(self.directory, f"chunk-{chunk_no:06d}-{len(self._parts(chunk_no)):04d}.parquet")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        self.logger.debug(f"Checkpointed {len(df)} rows to {path}")
+
+    def read_chunk(self, chunk_no: int) -> pd.DataFrame:
+        """All checkpointed results of a chunk; the last write of an index wins."""
+        parts = self._parts(chunk_no)
+        if not parts:
+            return pd.DataFrame(columns=["_original_index"])
+        df = pd.concat([pq.read_table(p).to_pandas() for p in parts], ignore_index=True)
+        df = df.drop_duplicates("_original_index", keep="last")
+        # Missing outputs come back as None; use NaN like the in-memory path
+        text_cols = [c for c in df.columns if c != "_original_index"]
+        df[text_cols] = df[text_cols].astype(object).where(df[text_cols].notna(), np.nan)
+        return df
+
+    def completed_indices(self, chunk_no: int, output_columns: List[str]) -> np.ndarray:
+        """Indices of a chunk that already have LLM output; rows that came back empty are retried."""
+        df = self.read_chunk(chunk_no)
+        columns = [c for c in output_columns if c in df.columns]
+        if df.empty or not columns:
+            return np.zeros(0, dtype=np.int64)
+        return df.loc[df[columns].notna().any(axis=1), "_original_index"].to_numpy(dtype=np.int64)
+
+    def is_uploaded(self, chunk_no: int) -> bool:
+        return chunk_no in self.meta.get("uploaded_chunks", [])
+
+    def mark_uploaded(self, chunk_no: int):
+        self.meta.setdefault("uploaded_chunks", []).append(chunk_no)
+        self._write_meta()
+
+    def clear(self):
+        """Removes the checkpoint after the job has fully completed."""
+        self._buffer = []
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.logger.info(f"Removed checkpoint at {self.directory}")
@@ -6,9 +6,18 @@ import re
 from collections import Counter
 import logging
 
+from normalise.src.normalization.semantic_clustering import choose_representatives, cluster_queries, nearest_known
+import normalise.env as env
+
+# Representative query of each cluster, written next to Cluster_ID in semantic mode
+CLUSTER_QUERY_COLUMN = "Cluster_Query"
+
+
 class Clustering:
-    def __init__(self, logger: logging.Logger = None):
+    def __init__(self, logger: logging.Logger = None, mode: str = None):
         self.logger = logger or logging.getLogger(__name__)
+        # "exact": one cluster per distinct B2B Query; "semantic": TF-IDF similarity clusters
+        self.mode = mode or getattr(env, 'NORM_CLUSTER_MODE', 'exact')
 
     def run(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -22,6 +31,83 @@ class Clustering:
             df["Cluster_ID"] = 0
             return df
 
+        df = self._clean(df, cluster_col)
+        if self.mode == "semantic":
+            return self._assign_semantic(df, cluster_col, {}, {})
+
+        # Assign Cluster_ID by exact match
+        df["Cluster_ID"] = df.groupby(cluster_col, sort=False).ngroup()
+        # df["General_Cluster_Query"] = df[cluster_col].str.strip().str.lower()
+
+        return df
+
+    def run_chunk(self, df: pd.DataFrame, cluster_ids: dict, representatives: dict = None) -> pd.DataFrame:
+        """
+        `run` for one chunk of a streamed file, or for new rows of an incremental run. `cluster_ids`
+        maps each query seen so far to its ID and is updated in place, so feeding the chunks in order
+        gives the same IDs as `run` on the whole file. Unseen queries get IDs above the highest one.
+        In semantic mode `representatives` maps cluster IDs to their representative query.
+        """
+        df = df.copy()
+        cluster_col = "B2B Query"
+        if cluster_col not in df.columns:
+            df["Cluster_ID"] = 0
+            return df
+
+        df = self._clean(df, cluster_col)
+        if self.mode == "semantic":
+            return self._assign_semantic(df, cluster_col, cluster_ids, {} if representatives is None else representatives)
+        next_id = max(cluster_ids.values(), default=-1) + 1
+        for query in pd.unique(df[cluster_col]):
+            if query not in cluster_ids:
+                cluster_ids[query] = next_id
+                next_id += 1
+        df["Cluster_ID"] = df[cluster_col].map(cluster_ids)
+        return df
+
+    def _assign_semantic(self, df: pd.DataFrame, cluster_col: str, cluster_ids: dict, representatives: dict) -> pd.DataFrame:
+        """
+        Assigns Cluster_ID and Cluster_Query by TF-IDF similarity of the queries. Known queries keep
+        their cluster, a new query joins the cluster of its most similar known query within the
+        threshold, and the remaining new queries are clustered among themselves under new IDs.
+        Both mappings are updated in place.
+        """
+        threshold = getattr(env, 'NORM_CLUSTER_DISTANCE_THRESHOLD', 0.2)
+        analyzer = getattr(env, 'NORM_CLUSTER_ANALYZER', 'word')
+        queries = pd.unique(df[cluster_col])
+        weights = df[cluster_col].value_counts().reindex(queries).to_numpy()
+        new = np.fromiter((q not in cluster_ids for q in queries), dtype=bool, count=len(queries))
+
+        known_queries = list(cluster_ids)
+        attach = nearest_known(queries[new], known_queries, threshold, analyzer=analyzer)
+        for query, position in zip(queries[new][attach >= 0], attach[attach >= 0]):
+            cluster_ids[query] = cluster_ids[known_queries[position]]
+
+        rest, rest_weights = queries[new][attach < 0], weights[new][attach < 0]
+        if len(rest):
+            labels = cluster_queries(
+                rest,
+                distance_threshold=threshold,
+                linkage_method=getattr(env, 'NORM_CLUSTER_LINKAGE', 'complete'),
+                analyzer=analyzer,
+                max_linkage_size=getattr(env, 'NORM_CLUSTER_MAX_LINKAGE_SIZE', 2000)
+            )
+            chosen = choose_representatives(rest, labels, rest_weights,
+                                            method=getattr(env, 'NORM_CLUSTER_REPRESENTATIVE', 'most_frequent'),
+                                            analyzer=analyzer)
+            next_id = max(cluster_ids.values(), default=-1) + 1
+            cluster_ids.update(zip(rest, (next_id + labels).tolist()))
+            representatives.update(zip(range(next_id, next_id + len(chosen)), rest[chosen]))
+        for query in queries:
+            representatives.setdefault(cluster_ids[query], query)
+
+        self.logger.info(f"Semantic clustering assigned {len(queries)} queries to "
+                         f"{len({cluster_ids[q] for q in queries})} clusters ({int(new.sum())} new queries)")
+        df["Cluster_ID"] = df[cluster_col].map(cluster_ids)
+        df[CLUSTER_QUERY_COLUMN] = df["Cluster_ID"].map(representatives)
+        return df
+
+    def _clean(self, df: pd.DataFrame, cluster_col: str) -> pd.DataFrame:
         # Clean 'B2B Query'
         df[cluster_col] = df[cluster_col].astype(str).str.replace(r'\bnan\b', '', regex=True).str.strip()
         df[cluster_col] = df[cluster_col].astype(str).str.replace(r'\bnone\b', '', regex=True).str.strip()
@@ -29,9 +115,4 @@ class Clustering:
         # Remove rows where 'B2B Query' starts with "ZZ" or contains "Product"
         df = df[~df[cluster_col].str.strip().str.startswith("ZZ")].reset_index(drop=True)
         df = df[~df[cluster_col].str.contains(r'\bProduct\b', case=False, na=False)].reset_index(drop=True)
-
-        # Assign Cluster_ID by exact match
-        df["Cluster_ID"] = df.groupby(cluster_col, sort=False).ngroup()
-        # df["General_Cluster_Query"] = df[cluster_col].str.strip().str.lower()
-
         return df
@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import time
+import logging
+import numpy as np
+import pandas as pd
+from typing import Iterable, Optional
+
+from normalise.src.common.utils import clean_text_for_llm_series
+from normalise.src.common.snowflake_utils import read_df_from_snowflake, snowflake_table_exists
+from normalise.src.normalization.preprocessors import apply_operations
+from normalise.src.normalization.clustering import CLUSTER_QUERY_COLUMN
+import normalise.env as env
+
+logger = logging.getLogger(__name__)
+
+NORMALISED_TABLE = "NORMALISED_DATA"
+# Pipeline column -> name in the NORMALISED_DATA upload and its RESPONSE JSON
+UPLOAD_COLUMN_RENAMES = {'B2B Query': 'B2B_QUERY', 'Cluster_ID': 'CLUSTER_ID', 'description': 'Item Description'}
+
+
+def description_keys(texts: pd.Series, preprocessed: bool = True) -> np.ndarray:
+    """
+    64-bit dedup keys of descriptions: the hash of their cleaned LLM text. Raw source descriptions
+    (preprocessed=False) are run through NORM_PRE_LLM_OPERATIONS first, as the normalizer does.
+    """
+    if not preprocessed and getattr(env, 'NORM_PRE_LLM_OPERATIONS', None):
+        frame = pd.DataFrame({env.NORM_INPUT_TEXT_COLUMN_FOR_LLM: texts.to_numpy()})
+        texts = apply_operations(frame, env.NORM_PRE_LLM_OPERATIONS, inplace=True)[env.NORM_INPUT_TEXT_COLUMN_FOR_LLM]
+    cleaned = clean_text_for_llm_series(texts.astype(str))
+    return pd.util.hash_pandas_object(cleaned, index=False).to_numpy()
+
+
+def row_keys(records: Iterable[dict]) -> np.ndarray:
+    """
+    64-bit keys of rows as serialized into RESPONSE, over their input fields only (the LLM outputs,
+    audit and cluster columns are left out), so the same input row gets the same key in every upload.
+    """
+    skip = {UPLOAD_COLUMN_RENAMES.get(c, c) for c in env.NORM_LLM_OUTPUT_COLUMNS}
+    skip.update([getattr(env, 'NORM_NEAR_DUP_AUDIT_COLUMN', 'Normalization_Source'), CLUSTER_QUERY_COLUMN])
+    canonical = [json.dumps({k: v for k, v in r.items() if k not in skip}, ensure_ascii=False, sort_keys=True, default=str)
+                 for r in records]
+    return pd.util.hash_pandas_object(pd.Series(canonical, dtype=object), index=False).to_numpy()
+
+
+def _parse_response(response) -> dict:
+    try:
+        return json.loads(response) if isinstance(response, str) else {}
+    except ValueError:
+        return {}
+
+
+def mirror_path_for(workspace_id: str) -> Optional[str]:
+    mirror_dir = getattr(env, 'NORM_INCREMENTAL_MIRROR_DIR', None)
+    if not mirror_dir:
+        return None
+    return os.path.join(mirror_dir, f"{re.sub(r'[^A-Za-z0-9._-]+', '-', str(workspace_id))}.parquet")
+
+
+def update_mirror(workspace_id: str, uploaded_df: pd.DataFrame, logger: Optional[logging.Logger] = None):
+    """Appends rows just uploaded to NORMALISED_DATA to the workspace's local mirror, if it has one."""
+    logger = logger or logging.getLogger(__name__)
+    path = mirror_path_for(workspace_id)
+    if not path or not os.path.exists(path):
+        return
+    mirror_df = pd.concat([pd.read_parquet(path), uploaded_df], ignore_index=True)
+    mirror_df.to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+    logger.info(f"Appended {len(uploaded_df)} rows to the NORMALISED_DATA mirror at {path}")
+
+
+def drop_mirror(workspace_id: str, logger: Optional[logging.Logger] = None):
+    """Discards the local mirror after a write it does not track, e.g. a full (non-incremental) upload."""
+    path = mirror_path_for(workspace_id)
+    if path and os.path.exists(path):
+        os.remove(path)
+        (logger or logging.getLogger(__name__)).info(f"Removed stale NORMALISED_DATA mirror at {path}")
+
+
+class ExistingNormalizations:
+    """
+    What a workspace's NORMALISED_DATA already holds, for incremental runs: the keys of the rows
+    already written, the normalized outputs per description, and the B2B_QUERY -> CLUSTER_ID and
+    CLUSTER_ID -> representative query mappings that new rows reuse.
+    """
+
+    def __init__(self, table_df: pd.DataFrame, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        responses = table_df['RESPONSE'] if 'RESPONSE' in table_df.columns else [None] * len(table_df)
+        records = [_parse_response(r) for r in responses]
+        self.row_keys = np.unique(row_keys(records))
+        self.cluster_ids, self.cluster_queries = {}, {}
+        if {'B2B_QUERY', 'CLUSTER_ID'} <= set(table_df.columns):
+            clusters = table_df[['B2B_QUERY', 'CLUSTER_ID']].assign(
+                **{CLUSTER_QUERY_COLUMN: [r.get(CLUSTER_QUERY_COLUMN) for r in records]}
+            ).dropna(subset=['B2B_QUERY', 'CLUSTER_ID'])
+            clusters['CLUSTER_ID'] = clusters['CLUSTER_ID'].astype(int)
+            # Older uploads numbered clusters per job; the lowest ID seen for a query wins
+            self.cluster_ids = clusters.groupby('B2B_QUERY')['CLUSTER_ID'].min().to_dict()
+            # Stored representatives first, else the query the benchmarking extractor would pick
+            self.cluster_queries = clusters.groupby('CLUSTER_ID')['B2B_QUERY'].min().to_dict()
+            self.cluster_queries.update(clusters.dropna(subset=[CLUSTER_QUERY_COLUMN])
+                                        .groupby('CLUSTER_ID')[CLUSTER_QUERY_COLUMN].first().to_dict())
+
+        description_field = UPLOAD_COLUMN_RENAMES.get(env.NORM_INPUT_TEXT_COLUMN_FOR_LLM, env.NORM_INPUT_TEXT_COLUMN_FOR_LLM)
+        records = [r for r in records if r.get(description_field) is not None]
+        outputs = pd.DataFrame({col: [r.get(UPLOAD_COLUMN_RENAMES.get(col, col)) for r in records]
+                                for col in env.NORM_LLM_OUTPUT_COLUMNS})
+        outputs.insert(0, '_description_key',
+                       description_keys(pd.Series([r[description_field] for r in records], dtype=object), preprocessed=False))
+        self.outputs = outputs.drop_duplicates('_description_key').reset_index(drop=True)
+        self.logger.info(f"Existing normalizations: {len(self.row_keys)} rows, {len(self.outputs)} descriptions, "
+                         f"{len(self.cluster_ids)} clusters")
+
+    def contains_rows(self, keys: np.ndarray) -> np.ndarray:
+        return np.isin(keys, self.row_keys)
+
+    def contains_descriptions(self, keys: np.ndarray) -> np.ndarray:
+        return np.isin(keys, self.outputs['_description_key'].to_numpy())
+
+    @classmethod
+    def load(cls, workspace_id: str, logger: logging.Logger, region_name: str) -> "ExistingNormalizations":
+        """
+        Reads the workspace's NORMALISED_DATA from the local mirror when it is fresh enough
+        (NORM_INCREMENTAL_MIRROR_MAX_AGE_HOURS), otherwise from Snowflake, refreshing the mirror.
+        """
+        path = mirror_path_for(workspace_id)
+        max_age = getattr(env, 'NORM_INCREMENTAL_MIRROR_MAX_AGE_HOURS', 24) * 3600
+        if path and os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age:
+            logger.info(f"Reading existing normalizations from mirror {path}")
+            return cls(pd.read_parquet(path), logger)
+
+        if not snowflake_table_exists(NORMALISED_TABLE, workspace_id, logger, region_name):
+            logger.info(f"No {NORMALISED_TABLE} table in workspace '{workspace_id}' yet; every row is new")
+            return cls(pd.DataFrame(), logger)
+        table_df = read_df_from_snowflake(NORMALISED_TABLE, workspace_id, logger, region_name)
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            table_df.to_parquet(f"{path}.tmp", index=False)
+            os.replace(f"{path}.tmp", path)
+        return cls(table_df, logger)
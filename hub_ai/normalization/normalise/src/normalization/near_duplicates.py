@@ -0,0 +1,132 @@
+import re
+import logging
+import numpy as np
+from typing import Sequence, Tuple
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+# Shingles hash to 32 bits; MinHash permutations use multiply-shift hashing ((a * h + b) >> 32)
+SHINGLE_MASK = np.uint64(0xFFFFFFFF)
+SHINGLE_BASE = np.uint64(0x100000001B3)
+# Permutation x shingle cells hashed per chunk (~16 MB of uint64, stays cache friendly)
+CHUNK_CELLS = 2_000_000
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def canonicalize(text: str) -> str:
+    """Lowercases and sorts the word tokens, so casing, spacing and token order do not matter."""
+    return " ".join(sorted(TOKEN_RE.findall(str(text).lower())))
+
+
+def shingle_hashes(texts: Sequence[str], shingle_size: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    32-bit hashes of the character shingles of each canonical text, concatenated. Text i owns
+    shingles[offsets[i]:offsets[i + 1]]; texts shorter than a shingle are padded to one.
+    """
+    n = len(texts)
+    if n == 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(1, dtype=np.int64)
+    encoded = [canonicalize(t).ljust(shingle_size).encode("utf-8") for t in texts]
+    lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=n)
+    buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+
+    # Polynomial hash of every shingle that does not cross a text boundary
+    window_counts = lengths - shingle_size + 1
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(window_counts)
+    text_starts = np.zeros(n, dtype=np.int64)
+    text_starts[1:] = np.cumsum(lengths)[:-1]
+    starts = np.repeat(text_starts - offsets[:-1], window_counts) + np.arange(offsets[-1])
+    powers = SHINGLE_BASE ** np.arange(shingle_size - 1, -1, -1, dtype=np.uint64)
+    shingles = (sliding_window_view(buffer, shingle_size)[starts] * powers).sum(axis=1)
+    return (shingles ^ (shingles >> np.uint64(32))) & SHINGLE_MASK, offsets
+
+
+def minhash_signatures(shingles: np.ndarray, offsets: np.ndarray, num_perm: int = 64, seed: int = 1) -> np.ndarray:
+    """(texts, num_perm) MinHash signatures from the output of `shingle_hashes`."""
+    n = len(offsets) - 1
+    if n <= 0:
+        return np.zeros((0, num_perm), dtype=np.uint32)
+    rng = np.random.default_rng(seed)
+    a = (rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1))[:, None]
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)[:, None]
+
+    signatures = np.empty((n, num_perm), dtype=np.uint32)
+    chunk = max(1, CHUNK_CELLS // num_perm)
+    first = 0
+    while first < n:
+        last = int(np.searchsorted(offsets, offsets[first] + chunk, side="right")) - 1
+        last = min(n, max(last, first + 1))
+        lo, hi = offsets[first], offsets[last]
+        # (num_perm, shingles) so the per-text minimum reduces along contiguous memory
+        hashed = np.multiply(a, shingles[None, lo:hi])
+        hashed += b
+        hashed >>= np.uint64(32)
+        signatures[first:last] = np.minimum.reduceat(hashed, offsets[first:last] - lo, axis=1).T
+        first = last
+    return signatures
+
+
+def _jaccard(shingles: np.ndarray, offsets: np.ndarray, i: int, j: int) -> float:
+    a = set(shingles[offsets[i]:offsets[i + 1]].tolist())
+    b = set(shingles[offsets[j]:offsets[j + 1]].tolist())
+    return len(a & b) / len(a | b)
+
+
+def group_near_duplicates(texts: Sequence[str], threshold: float = 0.9, num_perm: int = 64, bands: int = 8,
+                          shingle_size: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Groups near-duplicate texts with MinHash LSH banding.
+
+    Returns (leaders, similarity): leaders[i] is the position of the text chosen to represent i
+    (i itself for representatives) and similarity[i] the Jaccard similarity of their shingle
+    sets. MinHash only proposes pairs; every accepted pair is confirmed exactly. Groups are tight: every member is within `threshold` of its leader directly,
+    never through a chain of other members, and a text that already leads a group is never
+    reassigned.
+    """
+    n = len(texts)
+    leaders = np.arange(n)
+    similarity = np.ones(n, dtype=np.float64)
+    if n < 2:
+        return leaders, similarity
+    if num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+    rows = num_perm // bands
+    shingles, offsets = shingle_hashes(texts, shingle_size=shingle_size)
+    signatures = minhash_signatures(shingles, offsets, num_perm=num_perm)
+    group_size = np.ones(n, dtype=np.int64)
+    positions = np.arange(n)
+    mixers = np.random.default_rng(2).integers(1, 1 << 63, size=rows, dtype=np.uint64) | np.uint64(1)
+
+    for band in range(bands):
+        # uint64 arithmetic wraps, which is fine for a bucket key; candidates are verified below
+        keys = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * mixers).sum(axis=1)
+        order = np.lexsort((positions, keys))
+        sorted_keys = keys[order]
+        bucket_start = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        first_in_bucket = order[np.maximum.accumulate(np.where(bucket_start, positions, 0))]
+
+        members = order
+        candidate_leaders = leaders[first_in_bucket]
+        open_member = (leaders[members] == members) & (group_size[members] == 1)
+        keep = (candidate_leaders != members) & open_member & (leaders[candidate_leaders] == candidate_leaders)
+        members, candidate_leaders = members[keep], candidate_leaders[keep]
+        if len(members) == 0:
+            continue
+        estimated = (signatures[members] == signatures[candidate_leaders]).mean(axis=1)
+        # Confirm the MinHash estimate exactly, only for pairs that pass it
+        exact = np.zeros(len(members), dtype=np.float64)
+        for k in np.flatnonzero(estimated >= threshold):
+            exact[k] = _jaccard(shingles, offsets, members[k], candidate_leaders[k])
+        accepted = exact >= threshold
+        # A text joining a group in this band cannot also become a leader in it
+        accepted &= ~np.isin(candidate_leaders, members[accepted])
+        members, candidate_leaders = members[accepted], candidate_leaders[accepted]
+        leaders[members] = candidate_leaders
+        similarity[members] = exact[accepted]
+        np.add.at(group_size, candidate_leaders, 1)
+
+    inferred = int((leaders != positions).sum())
+    logger.info(f"Near-duplicate grouping: {n} texts -> {n - inferred} representatives ({inferred} grouped)")
+    return leaders, similarity
@@ -1,29 +1,38 @@
 import pandas as pd
+import numpy as np
 import logging
 from tqdm import tqdm
-from typing import Optional, Tuple, Generator
+from typing import Callable, Iterator, List, Optional, Tuple
+from collections import deque
 import concurrent.futures
+import asyncio
+import json
 import os
 
 from normalise.src.common.llm_service import LLMClient
-from normalise.src.common.data_io import load_dataframe
+from normalise.src.common.data_io import load_dataframe, iter_dataframe_chunks
 from normalise.src.normalization.preprocessors import apply_operations
-from normalise.src.common.utils import clean_text_for_llm
+from normalise.src.common.utils import clean_text_for_llm_series
 from normalise.src.normalization.clustering import Clustering
+from normalise.src.normalization.near_duplicates import group_near_duplicates
+from normalise.src.normalization.adaptive_batcher import AdaptiveBatchSizer, split_failed
+from normalise.src.normalization.checkpoint import NormalizationCheckpoint
+from normalise.src.normalization.incremental import ExistingNormalizations, UPLOAD_COLUMN_RENAMES, description_keys, row_keys
 import normalise.env as env
 
 
 class Normalizer:
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, logger: logging.Logger, use_llm_cache: bool = True):
         self.logger = logger
         self.client_name = env.CLIENT_NAME
-        self.llm_client = LLMClient(logger)
+        self.llm_client = LLMClient(logger, use_cache=use_llm_cache)
         self.norm_config = env
         self.logger.info(f"Normalizer initialized for client: {self.client_name}")
 
     def _prepare_batch_items_string(self, batch_series: pd.Series) -> str:
-        cleaned_items = batch_series.dropna().astype(str).apply(clean_text_for_llm).tolist()
-        return "\n".join(cleaned_items)
+        """One line per item, tagged with its 1-based ordinal ID so the response can be realigned."""
+        cleaned_items = clean_text_for_llm_series(batch_series.astype(str)).tolist()
+        return "\n".join(f"[{row_id}] {item}" for row_id, item in enumerate(cleaned_items, start=1))
 
     def _log_df_sample(self, df: pd.DataFrame, df_name: str, num_rows: int = 2):
         if df.empty:
@@ -35,77 +44,234 @@ class Normalizer:
         except Exception as e:
             self.logger.warning(f"Could not log DataFrame sample for '{df_name}': {e}")
 
-    def _process_single_batch_llm(self, batch_info: Tuple[int, pd.DataFrame]) -> pd.DataFrame:
-        batch_idx, current_batch_df = batch_info
-        input_text_col = env.NORM_INPUT_TEXT_COLUMN_FOR_LLM
-        llm_output_cols = env.NORM_LLM_OUTPUT_COLUMNS
+    def _batch_prompt_args(self, current_batch_df: pd.DataFrame) -> dict:
+        return {
+            "batch_items_string": self._prepare_batch_items_string(current_batch_df[env.NORM_INPUT_TEXT_COLUMN_FOR_LLM]),
+            "item_count": len(current_batch_df)
+        }
 
-        self.logger.info(f"Thread processing LLM Batch {batch_idx + 1}")
-        self._log_df_sample(current_batch_df, f"Batch {batch_idx + 1} for LLM")
+    def _row_cache_keys(self, batch_df: pd.DataFrame) -> Optional[List[str]]:
+        """
+        Output cache key per row, from its cleaned text rather than the batch prompt, so a rerun
+        finds its rows however the adaptive sizer grouped them. None when the cache is off.
+        """
+        items = clean_text_for_llm_series(batch_df[env.NORM_INPUT_TEXT_COLUMN_FOR_LLM].astype(str)).tolist()
+        return self.llm_client.item_cache_keys(env.NORM_LLM_PROMPT_KEY, {"batch_items_string": "", "item_count": 0},
+                                               items, output_columns=list(env.NORM_LLM_OUTPUT_COLUMNS))
+
+    def _split_cached_rows(self, llm_input_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Returns (rows with cached outputs, shaped like a parsed batch; rows that still need the LLM)."""
+        keys = self._row_cache_keys(llm_input_df) if len(llm_input_df) else None
+        if keys is None:
+            return pd.DataFrame(columns=['_original_index'] + list(env.NORM_LLM_OUTPUT_COLUMNS)), llm_input_df
+        cached = [self.llm_client.cache.get(key) for key in keys]
+        hit = np.array([value is not None for value in cached], dtype=bool)
+        cached_df = pd.DataFrame([json.loads(value) for value in cached if value is not None],
+                                 columns=list(env.NORM_LLM_OUTPUT_COLUMNS))
+        cached_df.insert(0, '_original_index', llm_input_df['_original_index'].to_numpy()[hit])
+        self.logger.info(f"LLM cache holds outputs for {int(hit.sum())} of {len(hit)} descriptions")
+        return cached_df, llm_input_df[~hit]
 
-        batch_items_series = current_batch_df[input_text_col]
-        batch_items_str = self._prepare_batch_items_string(batch_items_series)
+    def _cache_parsed_rows(self, current_batch_df: pd.DataFrame, parsed_df: pd.DataFrame, missing: np.ndarray):
+        """Stores the outputs of the rows the LLM returned; only parsed rows are cached, never the raw reply."""
+        keys = self._row_cache_keys(current_batch_df)
+        if keys is None:
+            return
+        outputs = parsed_df[env.NORM_LLM_OUTPUT_COLUMNS].to_numpy(dtype=object)
+        for key, row, row_missing in zip(keys, outputs, missing):
+            if not row_missing:
+                self.llm_client.cache.put(key, json.dumps([None if pd.isna(v) else str(v) for v in row]))
 
+    def _parse_batch_response(self, batch_idx: int, current_batch_df: pd.DataFrame,
+                              llm_response: Optional[str]) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        Aligns an LLM response to its batch. Returns the parsed rows (one per batch row, with
+        `_original_index`) and a mask of the rows the LLM did not return, so the caller can retry
+        them. A None response marks every row as missing.
+        """
+        llm_output_cols = env.NORM_LLM_OUTPUT_COLUMNS
         expected_rows = len(current_batch_df)
         parsed_df = pd.DataFrame(index=current_batch_df['_original_index'], columns=llm_output_cols)
         parsed_df.reset_index(inplace=True)
         parsed_df.rename(columns={'index': '_original_index'}, inplace=True)
 
-        if not batch_items_str.strip():
-            self.logger.warning(f"Batch {batch_idx + 1} is empty after cleaning. Skipping LLM call.")
-            return parsed_df
-
-        prompt_args = {
-            "batch_items_string": batch_items_str,
-            "item_count": expected_rows
-        }
+        missing = np.ones(expected_rows, dtype=bool)
+        if llm_response is not None:
+            try:
+                aligned_df = self.llm_client.parse_csv_from_llm_output(
+                    csv_text=llm_response,
+                    expected_columns=llm_output_cols,
+                    expected_rows=expected_rows,
+                    expected_ids=list(range(1, expected_rows + 1))
+                )
+                for col in llm_output_cols:
+                    parsed_df[col] = aligned_df[col].to_numpy()
+                missing = aligned_df[llm_output_cols].isna().all(axis=1).to_numpy()
+                self._cache_parsed_rows(current_batch_df, parsed_df, missing)
+            except Exception as e:
+                self.logger.error(f"Error parsing batch {batch_idx + 1}: {e}", exc_info=True)
+        if missing.any():
+            self.logger.warning(f"Batch {batch_idx + 1}: {int(missing.sum())} of {expected_rows} rows missing from LLM output")
+        return parsed_df, missing
 
+    def _process_single_batch_llm(self, batch_info: Tuple[int, pd.DataFrame]) -> Tuple[pd.DataFrame, np.ndarray]:
+        batch_idx, current_batch_df = batch_info
+        self.logger.info(f"Thread processing LLM Batch {batch_idx + 1} ({len(current_batch_df)} rows)")
+        self._log_df_sample(current_batch_df, f"Batch {batch_idx + 1} for LLM")
         try:
             llm_response = self.llm_client.generate_text_completion(
                 prompt_key=env.NORM_LLM_PROMPT_KEY,
-                prompt_args=prompt_args
+                prompt_args=self._batch_prompt_args(current_batch_df),
+                use_cache=False
             )
-            temp_parsed_df = self.llm_client.parse_csv_from_llm_output(
-                csv_text=llm_response,
-                expected_columns=llm_output_cols,
-                expected_rows=expected_rows
+        except Exception as e:
+            self.logger.error(f"Error processing batch {batch_idx + 1}: {e}", exc_info=True)
+            llm_response = None
+        return self._parse_batch_response(batch_idx, current_batch_df, llm_response)
+
+    async def _aprocess_single_batch_llm(self, batch_info: Tuple[int, pd.DataFrame]) -> Tuple[pd.DataFrame, np.ndarray]:
+        batch_idx, current_batch_df = batch_info
+        self.logger.info(f"Processing LLM Batch {batch_idx + 1} ({len(current_batch_df)} rows)")
+        try:
+            llm_response = await self.llm_client.agenerate_text_completion(
+                prompt_key=env.NORM_LLM_PROMPT_KEY,
+                prompt_args=self._batch_prompt_args(current_batch_df),
+                estimated_output_tokens=len(current_batch_df) * getattr(env, 'NORM_LLM_OUTPUT_TOKENS_PER_ITEM', 80),
+                use_cache=False
             )
-            if len(temp_parsed_df) == expected_rows:
-                for col in llm_output_cols:
-                    parsed_df[col] = temp_parsed_df.get(col)
-            else:
-                common_rows = min(len(temp_parsed_df), expected_rows)
-                for col in llm_output_cols:
-                    if col in temp_parsed_df.columns:
-                        parsed_df.loc[:common_rows - 1, col] = temp_parsed_df[col][:common_rows].values
         except Exception as e:
             self.logger.error(f"Error processing batch {batch_idx + 1}: {e}", exc_info=True)
-        return parsed_df
+            llm_response = None
+        return self._parse_batch_response(batch_idx, current_batch_df, llm_response)
 
-    def _generate_batches(self, df: pd.DataFrame, batch_size: int) -> Generator[Tuple[int, pd.DataFrame], None, None]:
-        for i in range(0, len(df), batch_size):
-            batch = df.iloc[i:i + batch_size]
-            if not batch.empty:
-                yield i // batch_size, batch
+    def _make_batch_sizer(self) -> AdaptiveBatchSizer:
+        return AdaptiveBatchSizer(
+            initial=env.LLM_BATCH_SIZE,
+            minimum=getattr(env, 'LLM_BATCH_SIZE_MIN', 1),
+            maximum=getattr(env, 'LLM_BATCH_SIZE_MAX', env.LLM_BATCH_SIZE),
+            grow_after=getattr(env, 'LLM_BATCH_GROW_AFTER', 3)
+        )
 
-    def run(
-        self,
-        input_df_path: Optional[str] = None,
-        ref_df_path: Optional[str] = None,
-        material_description: Optional[str] = None
-    ) -> pd.DataFrame:
+    def _collect_batch_result(self, positions: np.ndarray, parsed_df: pd.DataFrame, missing: np.ndarray,
+                              sizer: AdaptiveBatchSizer, retry_queue: deque) -> Tuple[pd.DataFrame, int]:
+        """
+        Feeds a batch outcome to the sizer and queues the halves of its missing rows for retry.
+        Returns the rows that are final and the number of rows requeued; a row that fails on its
+        own is final with empty output columns.
+        """
+        if missing.any():
+            sizer.record_failure()
+        else:
+            sizer.record_success()
+        if missing.any() and len(positions) > 1:
+            retry_queue.extend(split_failed(positions[missing]))
+            return parsed_df[~missing], int(missing.sum())
+        return parsed_df, 0
+
+    def _next_batch_positions(self, sizer: AdaptiveBatchSizer, retry_queue: deque, next_row: int,
+                              total_rows: int) -> Tuple[np.ndarray, int]:
+        if retry_queue:
+            return retry_queue.popleft(), next_row
+        positions = np.arange(next_row, min(total_rows, next_row + sizer.next_size()))
+        return positions, next_row + len(positions)
+
+    def _run_llm_batches(self, llm_input_df: pd.DataFrame,
+                         on_result: Optional[Callable[[pd.DataFrame], None]] = None) -> List[pd.DataFrame]:
+        """
+        Runs LLM normalization over `llm_input_df` on a thread pool with adaptive batch sizes.
+        Rows missing from a batch's response (or a whole failed batch) are split in half and retried.
+        Final rows are returned, or handed to `on_result` as each batch completes.
+        """
+        sizer = self._make_batch_sizer()
+        max_workers = env.LLM_MAX_WORKERS_NORMALIZATION
+        total_rows = len(llm_input_df)
+        retry_queue = deque()
+        next_row = 0
+        batch_idx = 0
+        retried_rows = 0
+        llm_results_list = []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                tqdm(total=total_rows, desc="LLM Normalization") as progress:
+            in_flight = {}
+            while in_flight or retry_queue or next_row < total_rows:
+                while len(in_flight) < max_workers and (retry_queue or next_row < total_rows):
+                    positions, next_row = self._next_batch_positions(sizer, retry_queue, next_row, total_rows)
+                    future = executor.submit(self._process_single_batch_llm, (batch_idx, llm_input_df.iloc[positions]))
+                    in_flight[future] = positions
+                    batch_idx += 1
+
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    final_df, requeued = self._collect_batch_result(in_flight.pop(future), *future.result(), sizer, retry_queue)
+                    retried_rows += requeued
+                    if on_result is not None:
+                        on_result(final_df)
+                    else:
+                        llm_results_list.append(final_df)
+                    progress.update(len(final_df))
+
+        self.logger.info(f"LLM normalization ran {batch_idx} batches for {total_rows} rows "
+                         f"({retried_rows} rows retried, final batch size {sizer.next_size()})")
+        return llm_results_list
+
+    async def _arun_llm_batches(self, llm_input_df: pd.DataFrame,
+                                on_result: Optional[Callable[[pd.DataFrame], None]] = None) -> List[pd.DataFrame]:
+        """
+        Async engine for `_run_llm_batches`: up to NORM_ASYNC_MAX_CONCURRENCY batches in flight on
+        one event loop, paced by the LLM client's global rate limiter, with the same adaptive
+        batching, retries and progress bar.
+        """
+        sizer = self._make_batch_sizer()
+        max_in_flight = getattr(env, 'NORM_ASYNC_MAX_CONCURRENCY', 200)
+        total_rows = len(llm_input_df)
+        retry_queue = deque()
+        next_row = 0
+        batch_idx = 0
+        retried_rows = 0
+        llm_results_list = []
+
+        try:
+            with tqdm(total=total_rows, desc="LLM Normalization") as progress:
+                in_flight = {}
+                while in_flight or retry_queue or next_row < total_rows:
+                    while len(in_flight) < max_in_flight and (retry_queue or next_row < total_rows):
+                        positions, next_row = self._next_batch_positions(sizer, retry_queue, next_row, total_rows)
+                        task = asyncio.create_task(self._aprocess_single_batch_llm((batch_idx, llm_input_df.iloc[positions])))
+                        in_flight[task] = positions
+                        batch_idx += 1
+
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        final_df, requeued = self._collect_batch_result(in_flight.pop(task), *task.result(), sizer, retry_queue)
+                        retried_rows += requeued
+                        if on_result is not None:
+                            on_result(final_df)
+                        else:
+                            llm_results_list.append(final_df)
+                        progress.update(len(final_df))
+        finally:
+            await self.llm_client.aclose()
+
+        self.logger.info(f"LLM normalization ran {batch_idx} batches for {total_rows} rows "
+                         f"({retried_rows} rows retried, final batch size {sizer.next_size()})")
+        return llm_results_list
+
+    def load_input(self, input_df_path: Optional[str] = None, material_description: Optional[str] = None) -> pd.DataFrame:
+        """Loads the raw input frame from a file or a single material description."""
         if material_description:
             self.logger.info(f"Running normalization for material description.")
             col = env.INPUT_SOURCE_TEXT_COLUMN
             source_col = col if isinstance(col, str) else col[0]
-            input_df = pd.DataFrame([{source_col: material_description}])
+            return pd.DataFrame([{source_col: material_description}])
         elif input_df_path:
             self.logger.info(f"Loading data from: {input_df_path}")
-            input_df = load_dataframe(input_df_path, file_type=input_df_path.split('.')[-1])
+            return load_dataframe(input_df_path, file_type=input_df_path.split('.')[-1])
         else:
             raise ValueError("Provide either input_df_path or material_description.")
 
-        df_original = input_df  
+    def _rename_source_column(self, df_original: pd.DataFrame):
+        """Renames the configured source text column of `df_original` (in place) to the LLM input column."""
         source_col_config = env.INPUT_SOURCE_TEXT_COLUMN
         df_col_lookup = {c.lower().strip(): c for c in df_original.columns}
 
@@ -119,10 +285,13 @@ class Normalizer:
             if not matched_col:
                 raise ValueError(f"Source text column '{source_col_config}' not found.")
 
-        client_df = df_original
         if matched_col != env.NORM_INPUT_TEXT_COLUMN_FOR_LLM:
-            client_df.rename(columns={matched_col: env.NORM_INPUT_TEXT_COLUMN_FOR_LLM}, inplace=True)
+            df_original.rename(columns={matched_col: env.NORM_INPUT_TEXT_COLUMN_FOR_LLM}, inplace=True)
 
+    def _prepare_llm_input(self, df_original: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Renames the source text column, applies pre-LLM operations and returns (client_df, valid_df)."""
+        self._rename_source_column(df_original)
+        client_df = df_original
         client_df.reset_index(inplace=True)
         client_df.rename(columns={'index': '_original_index'}, inplace=True)
 
@@ -133,32 +302,233 @@ class Normalizer:
             client_df[env.NORM_INPUT_TEXT_COLUMN_FOR_LLM].notna() &
             client_df[env.NORM_INPUT_TEXT_COLUMN_FOR_LLM].astype(str).str.strip().ne("")
         ]
+        return client_df, valid_df
 
-        batch_size = env.LLM_BATCH_SIZE
-        max_workers = env.LLM_MAX_WORKERS_NORMALIZATION
-        batch_gen = self._generate_batches(valid_df, batch_size)
-        llm_results_list = []
+    def _dedup_llm_input(self, valid_df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+        """
+        Collapses rows whose cleaned LLM text is identical. Returns the first row of each distinct
+        text, the per-row dedup keys and the mask of representative rows.
+        """
+        dedup_keys = description_keys(valid_df[env.NORM_INPUT_TEXT_COLUMN_FOR_LLM])
+        unique_mask = ~pd.Series(dedup_keys).duplicated().to_numpy()
+        unique_df = valid_df[unique_mask]
+        if len(valid_df):
+            self.logger.info(f"Deduplicated {len(valid_df)} rows to {len(unique_df)} unique descriptions "
+                             f"(dedup ratio {1 - len(unique_df) / len(valid_df):.1%})")
+        return unique_df, dedup_keys, unique_mask
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_results = list(
-                tqdm(
-                    executor.map(self._process_single_batch_llm, batch_gen),
-                    total=(len(valid_df) + batch_size - 1) // batch_size,
-                    desc="LLM Normalization"
-                )
-            )
-            llm_results_list.extend(future_results)
+    def _fan_out_llm_results(self, llm_df: pd.DataFrame, valid_df: pd.DataFrame,
+                             dedup_keys: np.ndarray, unique_mask: np.ndarray) -> pd.DataFrame:
+        """Copies each representative row's LLM columns to every row with the same dedup key."""
+        original_index = valid_df['_original_index'].to_numpy()
+        representatives = pd.DataFrame({'_dedup_key': dedup_keys[unique_mask], '_original_index': original_index[unique_mask]})
+        llm_by_key = representatives.merge(llm_df, on='_original_index', how='inner').drop(columns='_original_index')
+        rows = pd.DataFrame({'_original_index': original_index, '_dedup_key': dedup_keys})
+        return rows.merge(llm_by_key, on='_dedup_key', how='left').drop(columns='_dedup_key')
 
-        if llm_results_list:
-            llm_df = pd.concat(llm_results_list)
-            final_df = pd.merge(df_original, llm_df, left_index=True, right_on='_original_index', how='left')
-            final_df.drop(columns=['_original_index'], inplace=True, errors='ignore')
-        else:
+    def _group_near_duplicates(self, unique_df: pd.DataFrame) -> np.ndarray:
+        """Leader position (within unique_df) of each row; rows are their own leader when the stage is off."""
+        if not getattr(env, 'NORM_NEAR_DUP_ENABLED', False):
+            return np.arange(len(unique_df))
+        texts = unique_df[env.NORM_INPUT_TEXT_COLUMN_FOR_LLM].astype(str).tolist()
+        leaders, _ = group_near_duplicates(
+            texts,
+            threshold=getattr(env, 'NORM_NEAR_DUP_THRESHOLD', 0.9),
+            num_perm=getattr(env, 'NORM_NEAR_DUP_NUM_PERM', 64),
+            bands=getattr(env, 'NORM_NEAR_DUP_BANDS', 8),
+            shingle_size=getattr(env, 'NORM_NEAR_DUP_SHINGLE_SIZE', 4)
+        )
+        inferred = int((leaders != np.arange(len(leaders))).sum())
+        if len(leaders):
+            self.logger.info(f"Near-duplicate grouping infers {inferred} of {len(leaders)} unique descriptions "
+                             f"({inferred / len(leaders):.1%}) from a representative instead of the LLM")
+        return leaders
+
+    def _propagate_near_duplicates(self, llm_df: pd.DataFrame, unique_df: pd.DataFrame, leaders: np.ndarray) -> pd.DataFrame:
+        """Adds rows for the inferred group members, copying the propagated columns from their leader."""
+        audit_col = getattr(env, 'NORM_NEAR_DUP_AUDIT_COLUMN', 'Normalization_Source')
+        original_index = unique_df['_original_index'].to_numpy()
+        inferred = np.flatnonzero(leaders != np.arange(len(leaders)))
+        llm_df = llm_df.assign(**{audit_col: llm_df[audit_col].fillna('llm') if audit_col in llm_df.columns else 'llm'})
+        members = pd.DataFrame({'_original_index': original_index[inferred],
+                                '_leader_index': original_index[leaders[inferred]]})
+        propagate_cols = [c for c in getattr(env, 'NORM_NEAR_DUP_PROPAGATE_COLUMNS', []) if c in llm_df.columns]
+        leader_values = llm_df[['_original_index'] + propagate_cols].rename(columns={'_original_index': '_leader_index'})
+        members = members.merge(leader_values, on='_leader_index', how='left')
+        members[audit_col] = 'inferred:' + members['_leader_index'].astype(str)
+        return pd.concat([llm_df, members.drop(columns='_leader_index')], ignore_index=True)
+
+    def count_llm_inputs(self, input_df: pd.DataFrame, existing: Optional[ExistingNormalizations] = None) -> int:
+        """Number of descriptions that will be sent to the LLM, for ETA estimates."""
+        # Preparation only renames, reindexes and replaces columns: a shallow copy leaves input_df as it is
+        _, valid_df = self._prepare_llm_input(input_df.copy(deep=False))
+        unique_df, dedup_keys, unique_mask = self._dedup_llm_input(valid_df)
+        leaders = self._group_near_duplicates(unique_df)
+        known = np.zeros(len(leaders), dtype=bool)
+        if existing is not None:
+            known = existing.contains_descriptions(dedup_keys[unique_mask])
+        return int(((leaders == np.arange(len(leaders))) & ~known).sum())
+
+    def _plan_llm_input(self, df_original: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Prepares `df_original` (in place) and decides which rows go to the LLM. Returns
+        (valid_df, unique_df, dedup_keys, unique_mask, leaders); the LLM input is the rows of
+        unique_df that lead their near-duplicate group. Deterministic for the same input.
+        """
+        _, valid_df = self._prepare_llm_input(df_original)
+        unique_df, dedup_keys, unique_mask = self._dedup_llm_input(valid_df)
+        leaders = self._group_near_duplicates(unique_df)
+        return valid_df, unique_df, dedup_keys, unique_mask, leaders
+
+    def _run_llm(self, llm_input_df: pd.DataFrame,
+                 on_result: Optional[Callable[[pd.DataFrame], None]] = None) -> List[pd.DataFrame]:
+        """
+        Normalizes `llm_input_df`: rows with cached outputs are final straight away and only the
+        others are batched for the LLM, so the batches (and the sizer) only ever see cache misses.
+        """
+        cached_df, llm_input_df = self._split_cached_rows(llm_input_df)
+        llm_results_list = []
+        if len(cached_df):
+            if on_result is not None:
+                on_result(cached_df)
+            else:
+                llm_results_list.append(cached_df)
+        if not len(llm_input_df):
+            return llm_results_list
+        if getattr(env, 'NORM_LLM_ENGINE', 'threads') == 'async':
+            return llm_results_list + asyncio.run(self._arun_llm_batches(llm_input_df, on_result=on_result))
+        return llm_results_list + self._run_llm_batches(llm_input_df, on_result=on_result)
+
+    def _assemble_results(self, df_original: pd.DataFrame, llm_results_list: List[pd.DataFrame],
+                          plan: Tuple[pd.DataFrame, pd.DataFrame, np.ndarray, np.ndarray, np.ndarray]) -> pd.DataFrame:
+        """Propagates and fans the LLM results out to every input row of `df_original`."""
+        valid_df, unique_df, dedup_keys, unique_mask, leaders = plan
+        if not llm_results_list:
             final_df = df_original
             for col in env.NORM_LLM_OUTPUT_COLUMNS:
                 final_df[col] = pd.NA
+            return final_df
+
+        llm_df = pd.concat(llm_results_list)
+        audit_col = getattr(env, 'NORM_NEAR_DUP_AUDIT_COLUMN', 'Normalization_Source')
+        keep_cols = ['_original_index'] + list(env.NORM_LLM_OUTPUT_COLUMNS) + ([audit_col] if audit_col in llm_df.columns else [])
+        llm_df = llm_df.reindex(columns=keep_cols)
+        if getattr(env, 'NORM_NEAR_DUP_ENABLED', False):
+            llm_df = self._propagate_near_duplicates(llm_df, unique_df, leaders)
+        llm_df = self._fan_out_llm_results(llm_df, valid_df, dedup_keys, unique_mask)
+        final_df = pd.merge(df_original, llm_df, on='_original_index', how='left')
+        final_df.drop(columns=['_original_index'], inplace=True, errors='ignore')
+        return final_df
+
+    def run(
+        self,
+        input_df_path: Optional[str] = None,
+        ref_df_path: Optional[str] = None,
+        material_description: Optional[str] = None,
+        input_df: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
+        if input_df is None:
+            input_df = self.load_input(input_df_path, material_description)
+
+        df_original = input_df
+        plan = self._plan_llm_input(df_original)
+        unique_df, leaders = plan[1], plan[4]
+        llm_results_list = self._run_llm(unique_df[leaders == np.arange(len(leaders))])
+
+        if self.llm_client.cache is not None:
+            self.logger.info(f"LLM cache stats: {self.llm_client.cache.stats()}")
+
+        final_df = self._assemble_results(df_original, llm_results_list, plan)
 
         self.logger.info(f"Running clustering on normalized data.")
         clustering = Clustering(self.logger)
         clustered_df = clustering.run(final_df)
         return clustered_df
+
+    def select_new_rows(self, input_df: pd.DataFrame, existing: ExistingNormalizations) -> pd.DataFrame:
+        """Rows of `input_df` that the workspace's NORMALISED_DATA does not hold yet (new or changed rows)."""
+        renamed = input_df.copy(deep=False)
+        self._rename_source_column(renamed)
+        records = renamed.rename(columns=UPLOAD_COLUMN_RENAMES).to_dict('records')
+        new_mask = ~existing.contains_rows(row_keys(records))
+        self.logger.info(f"Incremental run: {int(new_mask.sum())} of {len(input_df)} rows are new or changed")
+        return input_df[new_mask]
+
+    def _reuse_existing(self, unique_df: pd.DataFrame, unique_keys: np.ndarray,
+                        existing: ExistingNormalizations) -> Tuple[np.ndarray, pd.DataFrame]:
+        """
+        Marks the unique descriptions the workspace already normalized and returns (known mask,
+        their stored outputs keyed by `_original_index`), shaped like an LLM result.
+        """
+        known = existing.contains_descriptions(unique_keys)
+        known_df = pd.DataFrame({'_original_index': unique_df['_original_index'].to_numpy()[known],
+                                 '_description_key': unique_keys[known]})
+        known_df = known_df.merge(existing.outputs, on='_description_key', how='left').drop(columns='_description_key')
+        if getattr(env, 'NORM_NEAR_DUP_ENABLED', False):
+            known_df[getattr(env, 'NORM_NEAR_DUP_AUDIT_COLUMN', 'Normalization_Source')] = 'existing'
+        self.logger.info(f"Reusing stored outputs for {int(known.sum())} of {len(known)} unique descriptions")
+        return known, known_df
+
+    def run_incremental(self, input_df: pd.DataFrame, existing: ExistingNormalizations) -> pd.DataFrame:
+        """
+        `run` for the rows `select_new_rows` picked. Descriptions the workspace already normalized
+        reuse their stored outputs and only unseen ones go to the LLM. Cluster_IDs come from the
+        workspace's B2B_QUERY mapping; only queries it has not seen get new IDs.
+        """
+        df_original = input_df
+        valid_df, unique_df, dedup_keys, unique_mask, leaders = self._plan_llm_input(df_original)
+        known, known_df = self._reuse_existing(unique_df, dedup_keys[unique_mask], existing)
+        # Known descriptions keep their stored outputs rather than follow a near-duplicate leader
+        positions = np.arange(len(leaders))
+        leaders = np.where(known, positions, leaders)
+
+        llm_input_df = unique_df[(leaders == positions) & ~known]
+        llm_results_list = self._run_llm(llm_input_df) if len(llm_input_df) else []
+        if known.any():
+            llm_results_list.append(known_df)
+
+        if self.llm_client.cache is not None:
+            self.logger.info(f"LLM cache stats: {self.llm_client.cache.stats()}")
+
+        final_df = self._assemble_results(df_original, llm_results_list, (valid_df, unique_df, dedup_keys, unique_mask, leaders))
+
+        self.logger.info(f"Running clustering with the workspace's existing cluster IDs.")
+        clustering = Clustering(self.logger)
+        return clustering.run_chunk(final_df, dict(existing.cluster_ids), dict(existing.cluster_queries))
+
+    def run_streaming(self, input_df_path: str, checkpoint: NormalizationCheckpoint,
+                      chunk_rows: int = 50000) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """
+        Streaming `run` for large files. The input is read `chunk_rows` at a time and each LLM batch
+        is appended to `checkpoint` as it completes, so a restarted job only normalizes the rows
+        that are not checkpointed yet. Afterwards the input is streamed again and joined with the
+        checkpoint, yielding (chunk_no, clustered chunk). Exact clustering gives the same Cluster_IDs
+        as `run`; semantic clustering matches each chunk's new queries to earlier chunks' clusters.
+        Duplicates are collapsed within a chunk, not across chunks.
+        """
+        output_cols = list(env.NORM_LLM_OUTPUT_COLUMNS)
+        for chunk_no, chunk in enumerate(iter_dataframe_chunks(input_df_path, chunk_rows)):
+            if checkpoint.is_uploaded(chunk_no):
+                continue
+            valid_df, unique_df, dedup_keys, unique_mask, leaders = self._plan_llm_input(chunk)
+            llm_input_df = unique_df[leaders == np.arange(len(leaders))]
+            done = checkpoint.completed_indices(chunk_no, output_cols)
+            todo_df = llm_input_df[~llm_input_df['_original_index'].isin(done)]
+            self.logger.info(f"Chunk {chunk_no + 1}: {len(todo_df)} of {len(llm_input_df)} descriptions left to normalize")
+            if len(todo_df):
+                try:
+                    self._run_llm(todo_df, on_result=lambda df, chunk_no=chunk_no: checkpoint.append(chunk_no, df))
+                finally:
+                    # Keep whatever completed before a failure, so a restart can skip it
+                    checkpoint.flush()
+
+        if self.llm_client.cache is not None:
+            self.logger.info(f"LLM cache stats: {self.llm_client.cache.stats()}")
+
+        self.logger.info(f"Running clustering on normalized data from checkpoint.")
+        clustering = Clustering(self.logger)
+        cluster_ids, representatives = {}, {}
+        for chunk_no, chunk in enumerate(iter_dataframe_chunks(input_df_path, chunk_rows)):
+            plan = self._plan_llm_input(chunk)
+            final_df = self._assemble_results(chunk, [checkpoint.read_chunk(chunk_no)], plan)
+            yield chunk_no, clustering.run_chunk(final_df, cluster_ids, representatives)
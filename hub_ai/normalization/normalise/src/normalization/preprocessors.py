@@ -1,12 +1,28 @@
-import pandas as pd
+import os
+import time
 import logging
-from typing import List, Dict, Any
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any, Callable, Optional, Tuple
 import normalise.env as env
+from normalise.src.normalization.sharding import process_pool, run_sharded
 
-from normalise.src.common.utils import expand_abbreviations, normalize_inch_quotes, clean_text_for_llm
+from normalise.src.common.utils import (map_unique_strings, expand_abbreviations_series, normalize_inch_quotes_series,
+                                        clean_text_for_llm_series, clean_llm_strings, expand_abbreviation_strings)
 
 logger = logging.getLogger(__name__)
 
+# Operators that rewrite one string column value by value; consecutive ones on the same column are fused
+# into a single pass over its distinct values (see plan_operations)
+FUSIBLE_STRING_OPS = ("strip_column", "clean_text_basic", "normalize_inches", "pad_string", "apply_abbreviations")
+# Operators that only look at their own row: they can run on row shards in worker processes.
+# merge_with_reference (needs ref_df, may add or drop rows), rename_column (metadata only) and
+# unknown types run serially on the whole frame
+SHARD_SAFE_OPS = FUSIBLE_STRING_OPS + ("extract_regex", "dropna")
+SHARD_ROW_COLUMN = "__shard_row__"
+# Whether strip_column's astype(str) turns missing values into strings ("nan", "None"); pandas 3 keeps them missing
+STRIP_STRINGIFIES_MISSING = isinstance(pd.Series([np.nan], dtype=object).astype(str).iloc[0], str)
+
 # --- Preprocessor Registry ---
 PREPROCESSOR_REGISTRY = {}
 
@@ -16,8 +32,21 @@ def register_preprocessor(name):
         return func
     return decorator
 
+def as_str(series: pd.Series) -> pd.Series:
+    """`series.astype(str)`, skipping the cast (and its copy) when every value is already a string."""
+    if not series.hasnans and pd.api.types.infer_dtype(series, skipna=False) == "string":
+        return series
+    return series.astype(str)
+
+def _with_str_column(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    """`df` with `column` cast to str, as a new frame when a cast is needed; `df` itself is never modified."""
+    as_text = as_str(df[column])
+    return df if as_text is df[column] else df.assign(**{column: as_text})
+
 # --- Preprocessing Functions ---
 # (Signatures updated to accept df as first arg, then specific args from config)
+# Operators replace whole columns (df[col] = ...) or rebuild the frame, never write into existing
+# column arrays, so apply_operations can run them on a shallow copy of the caller's frame.
 
 @register_preprocessor("extract_regex")
 def extract_with_regex(df: pd.DataFrame, source_column: str, target_column: str, pattern: str, 
@@ -29,7 +58,7 @@ def extract_with_regex(df: pd.DataFrame, source_column: str, target_column: str,
         if fail_on_error: raise KeyError(msg)
         return df
     try:
-        df[target_column] = df[source_column].astype(str).str.extract(pattern, expand=False)
+        df[target_column] = as_str(df[source_column]).str.extract(pattern, expand=False)
     except Exception as e:
         msg = f"Error during regex extraction on column '{source_column}': {e}"
         logger.error(msg)
@@ -46,12 +75,10 @@ def pad_string_column(df: pd.DataFrame, column: str, length: int, char: str,
         if fail_on_error: raise KeyError(msg)
         return df
     try:
-        if side == 'right':
-            df[column] = df[column].apply(lambda x: str(x).ljust(length, char) if pd.notnull(x) else x)
-        elif side == 'left':
-            df[column] = df[column].apply(lambda x: str(x).rjust(length, char) if pd.notnull(x) else x)
-        else:
+        if side not in ('left', 'right'):
             raise ValueError(f"Invalid padding side: {side}. Choose 'left' or 'right'.")
+        # str.pad's side names the side the fill goes on: ljust pads on the right
+        df[column] = map_unique_strings(df[column], lambda s: s.str.pad(length, side=side, fillchar=char))
     except Exception as e:
         msg = f"Error padding column '{column}': {e}"
         logger.error(msg)
@@ -95,9 +122,10 @@ def merge_df_with_reference(df: pd.DataFrame, ref_df: pd.DataFrame,
         logger.error(msg)
         if fail_on_error: raise KeyError(msg)
         return df
-        
-    df[left_on] = df[left_on].astype(str)
-    ref_df[right_on] = ref_df[right_on].astype(str)
+
+    df[left_on] = as_str(df[left_on])
+    # ref_df is shared across calls and chunks: cast a copy of it, not the caller's frame
+    ref_df = _with_str_column(ref_df, right_on)
 
     try:
         merged_df = pd.merge(df, ref_df, left_on=left_on, right_on=right_on, how=how, suffixes=suffixes or ('_x', '_y'))
@@ -137,7 +165,7 @@ def strip_column_whitespace(df: pd.DataFrame, column: str, fail_on_error: bool =
         if fail_on_error: raise KeyError(msg)
         return df
     try:
-        df[column] = df[column].astype(str).str.strip()
+        df[column] = as_str(df[column]).str.strip()
     except Exception as e:
         msg = f"Error stripping column '{column}': {e}"
         logger.error(msg)
@@ -153,7 +181,7 @@ def apply_clean_text_for_llm(df: pd.DataFrame, column: str, fail_on_error: bool
         if fail_on_error: raise KeyError(msg)
         return df
     try:
-        df[column] = df[column].apply(clean_text_for_llm)
+        df[column] = clean_text_for_llm_series(df[column])
     except Exception as e:
         msg = f"Error applying basic text cleaning to column '{column}': {e}"
         logger.error(msg)
@@ -169,7 +197,7 @@ def apply_normalize_inch_quotes(df: pd.DataFrame, column: str, fail_on_error: bo
         if fail_on_error: raise KeyError(msg)
         return df
     try:
-        df[column] = df[column].apply(normalize_inch_quotes)
+        df[column] = normalize_inch_quotes_series(df[column])
     except Exception as e:
         msg = f"Error normalizing inch quotes in column '{column}': {e}"
         logger.error(msg)
@@ -196,7 +224,7 @@ def apply_expand_abbreviations(df: pd.DataFrame, column: str, abbr_map: Dict = N
         logger.warning(msg) # Warn instead of error if map is missing, effectively skipping this step
         return df # Return df unchanged if no valid map
     try:
-        df[column] = df[column].apply(lambda x: expand_abbreviations(x, abbr_map))
+        df[column] = expand_abbreviations_series(df[column], abbr_map)
     except Exception as e:
         msg = f"Error expanding abbreviations in column '{column}': {e}"
         logger.error(msg)
@@ -204,52 +232,250 @@ def apply_expand_abbreviations(df: pd.DataFrame, column: str, abbr_map: Dict = N
     return df
 
 
-def apply_operations(df: pd.DataFrame, operations: List[Dict[str, Any]], ref_df: pd.DataFrame = None) -> pd.DataFrame:
+def _rss_mb() -> float:
+    """Resident set size of this process in MB (Linux), NaN where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return float("nan")
+
+
+def plan_operations(operations: List[Dict[str, Any]]) -> List[List[Tuple[str, Dict[str, Any]]]]:
     """
-    Applies a list of preprocessing operations to the DataFrame.
-    Each operation is an OmegaConf node from the list in the config.
+    Groups the configured operations into execution steps of (type, params) pairs. Consecutive
+    FUSIBLE_STRING_OPS on the same column form one step, run as a single pass over the column's
+    distinct values; strip_column only ever starts such a step, as it may turn missing values into
+    strings that the operators before it would have left alone. Every other operation is a step of
+    its own. Entries without a type are dropped.
     """
-    if not operations:
-        return df
-    
-    current_df = df.copy()
-    for op_config_node in operations: # op_config_node is an OmegaConf node
+    steps = []
+    for op_config_node in operations or []:
         op_type = op_config_node.get("type")
         if not op_type:
             logger.warning(f"Operation config missing 'type': {op_config_node}. Skipping.")
             continue
-        
-        preprocessor_func = PREPROCESSOR_REGISTRY.get(op_type)
-        if not preprocessor_func:
-            logger.warning(f"Unknown preprocessor type: '{op_type}'. Skipping operation: {op_config_node}")
+        params = {k: v for k, v in op_config_node.items() if k != "type"}
+        previous = steps[-1] if steps else None
+        if (op_type in FUSIBLE_STRING_OPS and op_type != "strip_column" and previous and previous[-1][0] in FUSIBLE_STRING_OPS
+                and previous[-1][1].get("column") == params.get("column")):
+            previous.append((op_type, params))
+        else:
+            steps.append([(op_type, params)])
+    return steps
+
+
+def _call_args(op_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Operator keyword arguments: the YAML params plus runtime data some operators need."""
+    call_args = params.copy()
+    # Pass the main config's abbreviation maps if needed by the preprocessor
+    if (op_type == "apply_abbreviations" and "abbr_map" not in call_args and call_args.get("abbreviations_map_key")
+            and env.config and hasattr(env.config, "abbreviations_maps")):
+        call_args["config_maps"] = env.config.abbreviations_maps
+    return call_args
+
+
+def _string_transform(op_type: str, params: Dict[str, Any]) -> Optional[Callable[[pd.Series], pd.Series]]:
+    """The transform a fusible operator applies to a Series of non-missing strings (None: the op is a no-op)."""
+    if op_type == "strip_column":
+        return lambda s: s.str.strip()
+    if op_type == "clean_text_basic":
+        return clean_llm_strings
+    if op_type == "normalize_inches":
+        return lambda s: s.str.replace('"', ' inch', regex=False)
+    if op_type == "pad_string":
+        side = params.get("side", "right")
+        if side not in ('left', 'right'):
+            raise ValueError(f"Invalid padding side: {side}. Choose 'left' or 'right'.")
+        return lambda s: s.str.pad(params["length"], side=side, fillchar=params["char"])
+    call_args = _call_args(op_type, params)
+    abbr_map = call_args.get("abbr_map")
+    if abbr_map is None and call_args.get("abbreviations_map_key") and "config_maps" in call_args:
+        abbr_map = call_args["config_maps"].get(call_args["abbreviations_map_key"])
+    if not isinstance(abbr_map, dict):
+        logger.warning(f"Abbreviations map is not a dictionary or not found for column '{params.get('column')}'. "
+                       f"Key: {params.get('abbreviations_map_key')}")
+        return None
+    return lambda s: expand_abbreviation_strings(s, abbr_map)
+
+
+def _run_fused_string_ops(df: pd.DataFrame, step: List[Tuple[str, Dict[str, Any]]]) -> pd.DataFrame:
+    """Runs consecutive string operators on one column as a single pass over its distinct values."""
+    column = step[0][1].get("column")
+    texts, transforms, missing = df[column], [], None
+    for op_type, params in step:
+        transform = _string_transform(op_type, params)
+        if transform is None:
             continue
-            
-        # Convert the OmegaConf node for this specific operation's parameters to a Python dict
-        # This avoids issues when trying to modify it or pass to functions expecting dicts.
-        # 'type' is already extracted, so we pass the rest.
-        params_from_yaml = {k: v for k, v in op_config_node.items() if k != "type"}
-
-        logger.info(f"Executing preprocessor: {op_type} with params from YAML: {params_from_yaml}")
-        
-        try:
-            # Prepare arguments for the preprocessor function
-            call_args = params_from_yaml.copy() # Start with YAML params
-
-            # Special handling for operations needing additional runtime data (like ref_df or main config for maps)
-            if op_type == "merge_with_reference":
-                # ref_df is passed as a direct keyword argument to merge_df_with_reference
-                current_df = preprocessor_func(current_df, ref_df=ref_df, **call_args)
-            elif op_type == "apply_abbreviations":
-                # Pass the main config's abbreviation maps if needed by the preprocessor
-                if "abbr_map" not in call_args and call_args.get("abbreviations_map_key") and env.config and hasattr(env.config, "abbreviations_maps"):
-                    call_args["config_maps"] = env.config.abbreviations_maps
-                current_df = preprocessor_func(current_df, **call_args)
+        transforms.append(transform)
+        # Missing values pass through the operators untouched until one turns them into a string
+        if missing is not None:
+            missing = transform(pd.Series([missing], dtype=object)).iloc[0]
+        elif op_type == "clean_text_basic":
+            missing = "N/A"
+        elif op_type == "strip_column" and STRIP_STRINGIFIES_MISSING:
+            # First of the step (see plan_operations): stringify each missing value as astype(str) would
+            is_missing = texts.isna().to_numpy()
+            if is_missing.any():
+                values = texts.to_numpy(dtype=object, copy=True)
+                values[is_missing] = [str(v) for v in values[is_missing]]
+                texts = pd.Series(values, index=texts.index, name=texts.name)
+
+    def chain(texts: pd.Series) -> pd.Series:
+        for transform in transforms:
+            texts = transform(texts)
+        return texts
+
+    df[column] = map_unique_strings(texts, chain, missing=missing)
+    return df
+
+
+def _run_step(df: pd.DataFrame, step: List[Tuple[str, Dict[str, Any]]], ref_df: pd.DataFrame) -> pd.DataFrame:
+    if len(step) > 1:
+        # A missing column or bad parameters fall back to the single operators, which report them
+        if step[0][1].get("column") in df.columns:
+            try:
+                return _run_fused_string_ops(df, step)
+            except Exception as e:
+                logger.warning(f"Fused string operations failed ({e}); running them one by one")
+        for single in step:
+            df = _run_step(df, [single], ref_df)
+        return df
+
+    op_type, params = step[0]
+    preprocessor_func = PREPROCESSOR_REGISTRY.get(op_type)
+    if not preprocessor_func:
+        logger.warning(f"Unknown preprocessor type: '{op_type}'. Skipping operation: {params}")
+        return df
+    logger.info(f"Executing preprocessor: {op_type} with params from YAML: {params}")
+    try:
+        if op_type == "merge_with_reference":
+            # ref_df is passed as a direct keyword argument to merge_df_with_reference
+            return preprocessor_func(df, ref_df=ref_df, **params)
+        return preprocessor_func(df, **_call_args(op_type, params))
+    except Exception as e:
+        logger.error(f"Failed to apply operation {op_type} with params {params}: {e}", exc_info=True)
+        if params.get("fail_on_error", False):
+            raise
+        logger.warning(f"Continuing after error in operation {op_type} as fail_on_error is false or not set.")
+    return df
+
+
+def _step_columns(steps: List[List[Tuple[str, Dict[str, Any]]]]) -> Tuple[List[str], List[str]]:
+    """(columns the steps read, columns they write), each in first-use order."""
+    read, written = [], []
+    for step in steps:
+        for op_type, params in step:
+            if op_type == "dropna":
+                read.extend(params.get("subset_columns") or [])
+            elif op_type == "extract_regex":
+                read.append(params.get("source_column"))
+                written.append(params.get("target_column"))
+            else:
+                read.append(params.get("column"))
+                written.append(params.get("column"))
+    return list(dict.fromkeys(read)), list(dict.fromkeys(written))
+
+
+def _run_shard_steps(shard_df: pd.DataFrame, steps: List[List[Tuple[str, Dict[str, Any]]]],
+                     written: List[str]) -> pd.DataFrame:
+    """Worker side of a parallel segment: the steps on one shard, returning the written columns and row positions."""
+    for column in shard_df.columns[shard_df.dtypes == object]:
+        # Missing strings arrive as None; as read from Excel or CSV (and in the serial path) they are NaN
+        shard_df[column] = shard_df[column].where(shard_df[column].notna(), np.nan)
+    for step in steps:
+        shard_df = _run_step(shard_df, step, None)
+    return shard_df[[c for c in written if c in shard_df.columns] + [SHARD_ROW_COLUMN]]
+
+
+def _arrow_ready(column: pd.Series) -> pd.Series:
+    """
+    Object columns holding more than strings (Excel codes read as int and str) cannot become one
+    Arrow column. Every shard-safe operator reads values as str, so ship them as str, missing kept.
+    """
+    if column.dtype != object or pd.api.types.infer_dtype(column, skipna=True) in ("string", "empty"):
+        return column
+    return column.astype(str).where(column.notna(), None)
+
+
+def _run_parallel_segment(df: pd.DataFrame, steps: List[List[Tuple[str, Dict[str, Any]]]], pool) -> pd.DataFrame:
+    """
+    Runs shard-safe steps over row shards of `df` in worker processes. Only the columns the steps
+    read travel to the workers and only the columns they write (plus the surviving row positions,
+    for dropna) come back; the shards are reassembled in order.
+    """
+    read, written = _step_columns(steps)
+    shipped = pd.DataFrame({c: _arrow_ready(df[c]).to_numpy() for c in read if c in df.columns})
+    shipped[SHARD_ROW_COLUMN] = np.arange(len(df))
+    results = run_sharded(shipped, _run_shard_steps, pool, args=(steps, written),
+                          shard_rows=getattr(env, 'NORM_PREPROCESS_SHARD_ROWS', 250000))
+    result = pd.concat(results, ignore_index=True) if results else shipped.iloc[:0]
+    rows = result[SHARD_ROW_COLUMN].to_numpy()
+    if len(rows) < len(df):
+        df = df.take(rows)
+    for column in result.columns.drop(SHARD_ROW_COLUMN):
+        values = result[column].astype(object)
+        # Arrow brings missing strings back as None; the serial operators leave NaN
+        df[column] = values.where(values.notna(), np.nan).to_numpy()
+    return df
+
+
+def _plan_segments(steps: List[List[Tuple[str, Dict[str, Any]]]], parallel: bool) -> List[Tuple[bool, List]]:
+    """Splits the steps into (runs in parallel, steps) segments: maximal runs of shard-safe steps when parallel."""
+    segments = []
+    for step in steps:
+        sharded = parallel and all(op_type in SHARD_SAFE_OPS for op_type, _ in step)
+        if sharded and segments and segments[-1][0]:
+            segments[-1][1].append(step)
+        else:
+            segments.append((sharded, [step]))
+    return segments
+
+
+def apply_operations(df: pd.DataFrame, operations: List[Dict[str, Any]], ref_df: pd.DataFrame = None,
+                     inplace: bool = False, stats: Optional[List[Dict[str, Any]]] = None,
+                     workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Applies a list of preprocessing operations to the DataFrame.
+    Each operation is an OmegaConf node from the list in the config.
+
+    The operations are planned first (see plan_operations). They run on a shallow copy of `df`, so
+    `df` keeps its columns without the data being copied, or on `df` itself when `inplace` (the
+    caller owns the frame). Time, row count and RSS change of each step are logged and, when `stats`
+    is given, appended to it.
+
+    With more than one worker (default NORM_PREPROCESS_WORKERS) and at least
+    NORM_PREPROCESS_PARALLEL_MIN_ROWS rows, runs of shard-safe steps (SHARD_SAFE_OPS) execute on
+    row shards in a process pool; the other steps run serially between them.
+    """
+    if not operations:
+        return df
+
+    steps = plan_operations(operations)
+    workers = workers if workers is not None else getattr(env, 'NORM_PREPROCESS_WORKERS', 1)
+    parallel = workers > 1 and len(df) >= getattr(env, 'NORM_PREPROCESS_PARALLEL_MIN_ROWS', 500000)
+    current_df = df if inplace else df.copy(deep=False)
+    pool = None
+    try:
+        for sharded, segment in _plan_segments(steps, parallel):
+            label = ", ".join("+".join(op_type for op_type, _ in step) for step in segment)
+            if sharded:
+                label = f"parallel[{label}]"
+                logger.info(f"Executing preprocessors {label} on {workers} worker processes")
+            elif len(segment[0]) > 1:
+                logger.info(f"Executing fused preprocessors {label} on column '{segment[0][0][1].get('column')}'")
+            rss_before, start = _rss_mb(), time.perf_counter()
+            if sharded:
+                # One pool for every parallel segment of the run; workers start once
+                pool = pool or process_pool(workers, getattr(env, 'NORM_PREPROCESS_START_METHOD', 'spawn'))
+                current_df = _run_parallel_segment(current_df, segment, pool)
             else:
-                # For other functions, pass params from YAML directly
-                current_df = preprocessor_func(current_df, **call_args)
-        except Exception as e:
-            logger.error(f"Failed to apply operation {op_type} with params {params_from_yaml}: {e}", exc_info=True)
-            if op_config_node.get("fail_on_error", False): 
-                raise
-            logger.warning(f"Continuing after error in operation {op_type} as fail_on_error is false or not set.")
-    return current_df
\ No newline at end of file
+                current_df = _run_step(current_df, segment[0], ref_df)
+            seconds, rss_delta = time.perf_counter() - start, _rss_mb() - rss_before
+            logger.info(f"Preprocessing step {label}: {seconds:.3f}s, {len(current_df)} rows, RSS {rss_delta:+.1f} MB")
+            if stats is not None:
+                stats.append({"step": label, "seconds": seconds, "rows": len(current_df), "rss_delta_mb": rss_delta})
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return current_df
@@ -0,0 +1,194 @@
+import re
+import logging
+import numpy as np
+import scipy.sparse as sp
+from typing import Optional, Sequence, Tuple
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial.distance import squareform
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+logger = logging.getLogger(__name__)
+
+# Decimal numbers stay one token ("0.5"), everything else splits on word boundaries
+TOKEN_PATTERN = r'(?u)\d+(?:\.\d+)?|\w+'
+DECIMAL_COMMA_RE = re.compile(r'(\d),(\d)')
+# "M8x40" -> "M8 x 40"
+DIMENSION_RE = re.compile(r'(?<=\d)\s*[x×*]\s*(?=\d)')
+# "0.5kW" -> "0.5 kW", so a value reads the same with or without a space before its unit
+NUMBER_UNIT_RE = re.compile(r'(\d)(?=[^\W\d_])')
+# Candidate cells computed per block of rows (bounds memory in the densest case)
+BLOCK_CELLS = 2_000_000
+REPRESENTATIVE_METHODS = ("most_frequent", "shortest", "medoid")
+
+
+def canonical_query(text: str) -> str:
+    text = DECIMAL_COMMA_RE.sub(r'\1.\2', str(text).lower())
+    text = DIMENSION_RE.sub(' x ', text)
+    return NUMBER_UNIT_RE.sub(r'\1 ', text)
+
+
+def tfidf_vectors(texts: Sequence[str], analyzer: str = "word") -> sp.csr_matrix:
+    """L2-normalized TF-IDF rows of the canonical texts; word tokens or char n-grams ("char_wb")."""
+    if analyzer == "char_wb":
+        vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 4), sublinear_tf=True, dtype=np.float64)
+    else:
+        vectorizer = TfidfVectorizer(token_pattern=TOKEN_PATTERN, sublinear_tf=True, dtype=np.float64)
+    try:
+        return vectorizer.fit_transform([canonical_query(t) for t in texts]).tocsr()
+    except ValueError:
+        # Empty vocabulary: nothing is similar to anything
+        return sp.csr_matrix((len(texts), 1), dtype=np.float64)
+
+
+def prefix_features(vectors: sp.csr_matrix, min_similarity: float) -> sp.csr_matrix:
+    """
+    Binary matrix of each row's prefix: its features in order of increasing document frequency,
+    up to where the remaining features' norm drops below `min_similarity`. Two L2-normalized rows
+    can only reach that cosine if their prefixes share a feature (the first feature they share,
+    in this order, lies in both prefixes), so rare tokens generate the candidates and common ones
+    like "pump" do not.
+    """
+    n = vectors.shape[0]
+    row_ids = np.repeat(np.arange(n), np.diff(vectors.indptr))
+    document_frequency = np.bincount(vectors.indices, minlength=vectors.shape[1])
+    order = np.lexsort((vectors.indices, document_frequency[vectors.indices], row_ids))
+    squares = vectors.data[order] ** 2
+    cumulative = np.cumsum(squares)
+    row_end = np.zeros(n + 1)
+    row_end[1:] = cumulative[vectors.indptr[1:] - 1] if len(cumulative) else 0.0
+    # Squared norm of each feature plus everything after it in its row
+    remaining = row_end[row_ids[order] + 1] - cumulative + squares
+    keep = remaining >= (min_similarity ** 2) * (1.0 - 1e-9)
+    return sp.csr_matrix((np.ones(int(keep.sum()), dtype=np.float32),
+                          (row_ids[order][keep], vectors.indices[order][keep])), shape=vectors.shape)
+
+
+def similarity_edges(rows: sp.csr_matrix, columns: sp.csr_matrix, min_similarity: float,
+                     upper_only: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (row, column, cosine) of every pair with cosine >= min_similarity. Candidate pairs come from
+    the rows' prefix features (see `prefix_features`) in blocks of rows, so memory stays bounded,
+    and are then scored exactly. With upper_only (rows is columns) each pair is reported once,
+    row < column.
+    """
+    n_rows, n_cols = rows.shape[0], columns.shape[0]
+    prefixes = prefix_features(sp.vstack([rows, columns]).tocsr(), min_similarity)
+    row_prefixes, column_prefixes_t = prefixes[:n_rows], prefixes[n_rows:].T.tocsc()
+    block = max(1, BLOCK_CELLS // max(1, n_cols))
+    found_rows, found_cols, found_sims = [], [], []
+    for start in range(0, n_rows, block):
+        candidates = (row_prefixes[start:start + block] @ column_prefixes_t).tocoo()
+        r, c = candidates.row + start, candidates.col
+        if upper_only:
+            upper = r < c
+            r, c = r[upper], c[upper]
+        if len(r) == 0:
+            continue
+        sims = np.asarray(rows[r].multiply(columns[c]).sum(axis=1)).ravel()
+        keep = sims >= min_similarity
+        found_rows.append(r[keep])
+        found_cols.append(c[keep])
+        found_sims.append(sims[keep])
+    if not found_rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(found_rows), np.concatenate(found_cols), np.concatenate(found_sims)
+
+
+def _first_seen_labels(labels: np.ndarray) -> np.ndarray:
+    """Renumbers labels 0..k-1 in order of first appearance, like `groupby(sort=False).ngroup()`."""
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind="stable")] = np.arange(len(first))
+    return rank[inverse]
+
+
+def _complete_linkage(vectors: sp.csr_matrix, labels: np.ndarray, distance_threshold: float,
+                      max_component: int) -> np.ndarray:
+    """Splits each connected component so every pair inside a cluster is within the threshold."""
+    refined = labels.copy()
+    next_label = labels.max() + 1 if len(labels) else 0
+    sizes = np.bincount(labels)
+    for component in np.flatnonzero(sizes > 2):
+        members = np.flatnonzero(labels == component)
+        if len(members) > max_component:
+            logger.warning(f"Component of {len(members)} queries exceeds {max_component}; keeping single linkage for it")
+            continue
+        block = vectors[members]
+        distances = np.clip(1.0 - (block @ block.T).toarray(), 0.0, None)
+        np.fill_diagonal(distances, 0.0)
+        sub_labels = fcluster(linkage(squareform(distances, checks=False), method="complete"),
+                              t=distance_threshold, criterion="distance")
+        refined[members] = next_label + sub_labels
+        next_label += sub_labels.max() + 1
+    return refined
+
+
+def cluster_queries(queries: Sequence[str], distance_threshold: float = 0.2, linkage_method: str = "single",
+                    analyzer: str = "word", max_linkage_size: int = 2000) -> np.ndarray:
+    """
+    Cluster label of each query, numbered in order of first appearance.
+
+    Queries are linked when the cosine distance of their TF-IDF vectors is at most
+    `distance_threshold`; "single" linkage takes the connected components of that graph
+    (union-find), "complete" then splits each component with agglomerative complete linkage
+    so no two members of a cluster are further apart than the threshold.
+    """
+    n = len(queries)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    vectors = tfidf_vectors(queries, analyzer=analyzer)
+    r, c, _ = similarity_edges(vectors, vectors, 1.0 - distance_threshold, upper_only=True)
+    graph = sp.coo_matrix((np.ones(len(r), dtype=np.int8), (r, c)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    if linkage_method == "complete":
+        labels = _complete_linkage(vectors, labels, distance_threshold, max_linkage_size)
+    labels = _first_seen_labels(labels)
+    logger.info(f"Semantic clustering: {n} queries -> {labels.max() + 1} clusters ({linkage_method} linkage)")
+    return labels
+
+
+def nearest_known(new_queries: Sequence[str], known_queries: Sequence[str], distance_threshold: float = 0.2,
+                  analyzer: str = "word") -> np.ndarray:
+    """Position in known_queries of each new query's most similar known query within the threshold, else -1."""
+    best = np.full(len(new_queries), -1, dtype=np.int64)
+    if len(new_queries) == 0 or len(known_queries) == 0:
+        return best
+    vectors = tfidf_vectors(list(new_queries) + list(known_queries), analyzer=analyzer)
+    r, c, sims = similarity_edges(vectors[:len(new_queries)], vectors[len(new_queries):], 1.0 - distance_threshold)
+    # Sorted by row, then similarity: the last pair of each row is its best known query
+    order = np.lexsort((sims, r))
+    r, c = r[order], c[order]
+    last = np.r_[r[1:] != r[:-1], True] if len(r) else np.zeros(0, dtype=bool)
+    best[r[last]] = c[last]
+    return best
+
+
+def choose_representatives(queries: Sequence[str], labels: np.ndarray, weights: Optional[np.ndarray] = None,
+                           method: str = "most_frequent", analyzer: str = "word") -> np.ndarray:
+    """
+    Position of the representative query of each cluster label (0..k-1):
+    "most_frequent" picks the query with the most rows, "shortest" the shortest query and
+    "medoid" the query closest to the cluster's TF-IDF centroid. Ties go to the earlier query.
+    """
+    if method not in REPRESENTATIVE_METHODS:
+        raise ValueError(f"Unknown representative method '{method}', expected one of {REPRESENTATIVE_METHODS}")
+    n = len(queries)
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    lengths = np.fromiter((len(str(q)) for q in queries), dtype=np.int64, count=n)
+    if method == "medoid":
+        vectors = tfidf_vectors(queries, analyzer=analyzer)
+        membership = sp.csr_matrix((weights, (labels, np.arange(n))), shape=(labels.max() + 1, n))
+        centroids = membership @ vectors
+        score = np.asarray(vectors.multiply(centroids[labels]).sum(axis=1)).ravel()
+        keys = (np.arange(n), -weights, -score)
+    elif method == "shortest":
+        keys = (np.arange(n), -weights, lengths)
+    else:
+        keys = (np.arange(n), lengths, -weights)
+    # Sort by label, then the method's keys (last key is primary within a label)
+    order = np.lexsort(keys + (labels,))
+    first_of_label = np.r_[True, labels[order][1:] != labels[order][:-1]]
+    representatives = np.empty(labels.max() + 1, dtype=np.int64)
+    representatives[labels[order][first_of_label]] = order[first_of_label]
+    return representatives
@@ -0,0 +1,99 @@
+import logging
+import multiprocessing
+import pandas as pd
+import pyarrow as pa
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def frame_to_shared_memory(df: pd.DataFrame) -> Tuple[str, int]:
+    """
+    Writes `df` (index dropped) as an Arrow IPC stream straight into a new shared memory block and
+    returns (block name, stream size). The block outlives this call; whoever reads it last unlinks it.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sizer = pa.MockOutputStream()
+    with pa.ipc.new_stream(sizer, table.schema) as writer:
+        writer.write_table(table)
+    size = sizer.size()
+    block = SharedMemory(create=True, size=max(size, 1))
+    try:
+        target = pa.py_buffer(block.buf)
+        sink = pa.FixedSizeBufferWriter(target)
+        writer = pa.ipc.new_stream(sink, table.schema)
+        writer.write_table(table)
+        writer.close()
+        sink.close()
+        # Every Arrow view of the block has to be gone before it can be closed
+        del writer, sink, target
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    block.close()
+    return block.name, size
+
+
+def frame_from_shared_memory(name: str, size: int, unlink: bool = False) -> pd.DataFrame:
+    """Reads a frame written by `frame_to_shared_memory`, optionally unlinking the block afterwards."""
+    block = SharedMemory(name=name)
+    try:
+        # One copy of the stream out of the block: to_pandas may hand out zero-copy views of Arrow
+        # buffers, and the block can only be closed once nothing points into it
+        df = pa.ipc.open_stream(pa.py_buffer(bytes(block.buf[:size]))).read_all().to_pandas()
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+    return df
+
+
+def _run_shard(fn: Callable[..., pd.DataFrame], name: str, size: int, args: tuple) -> Tuple[str, int]:
+    """Worker side: shard in from shared memory, `fn(shard, *args)` out to a new block."""
+    return frame_to_shared_memory(fn(frame_from_shared_memory(name, size), *args))
+
+
+def process_pool(workers: int, start_method: str = "spawn") -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+
+
+def run_sharded(df: pd.DataFrame, fn: Callable[..., pd.DataFrame], pool: ProcessPoolExecutor, args: tuple = (),
+                shard_rows: int = 250000) -> List[pd.DataFrame]:
+    """
+    Splits `df` into row shards, runs `fn(shard, *args)` on each in the process pool and returns the
+    results in shard order. Shards travel as Arrow IPC streams in shared memory, not pickled frames;
+    only block names cross the pipe. `fn` must be a module-level function (it is pickled by name),
+    and shard indexes are not kept.
+    """
+    shard_rows = max(1, shard_rows)
+    inputs, futures, results = [], [], []
+    try:
+        # Submitting as shards are written lets the first workers start while the rest are encoded
+        for start in range(0, len(df), shard_rows):
+            inputs.append(frame_to_shared_memory(df.iloc[start:start + shard_rows]))
+            futures.append(pool.submit(_run_shard, fn, *inputs[-1], args))
+        logger.info(f"Running {len(futures)} shards of up to {shard_rows} rows in worker processes")
+        for future in futures:
+            results.append(frame_from_shared_memory(*future.result(), unlink=True))
+    finally:
+        wait(futures)
+        for name, _ in inputs:
+            _unlink_quietly(name)
+        # Output blocks of shards whose results were never read (an earlier shard failed)
+        for future in futures[len(results):]:
+            if not future.cancelled() and future.exception() is None:
+                _unlink_quietly(future.result()[0])
+    return results
+
+
+def _unlink_quietly(name: str):
+    try:
+        block = SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
+
@@ -0,0 +1,63 @@
+import logging
+import numpy as np
+from typing import Sequence
+from sklearn.feature_extraction.text import CountVectorizer
+
+logger = logging.getLogger(__name__)
+
+# Unicode-aware word boundaries, so multilingual titles tokenize
+TOKEN_PATTERN = r'(?u)\b\w+\b'
+# Smoothed idf of a term that occurs in exactly one of two documents: ln((1 + 2) / (1 + 1)) + 1
+UNSHARED_IDF = np.log(1.5) + 1.0
+
+
+def pairwise_tfidf_cosine(left: Sequence[str], right: Sequence[str]) -> np.ndarray:
+    """
+    TF-IDF cosine similarity for each (left[i], right[i]) pair.
+
+    Scores are identical to fitting a fresh two-document TfidfVectorizer (smooth idf, l2 norm,
+    unigrams) per pair, because with two documents a term's idf only depends on whether both
+    documents contain it: shared terms get idf 1, unshared terms UNSHARED_IDF. One vocabulary
+    is fitted over the distinct texts and every pair is then scored with sparse row-wise ops.
+    Empty texts score 0.0.
+    """
+    if len(left) != len(right):
+        raise ValueError(f"Expected pairs, got {len(left)} left and {len(right)} right texts")
+    scores = np.zeros(len(left), dtype=np.float64)
+    left_clean = ["" if not text else str(text).lower().strip() for text in left]
+    right_clean = ["" if not text else str(text).lower().strip() for text in right]
+    valid = np.array([bool(a) and bool(b) for a, b in zip(left_clean, right_clean)], dtype=bool)
+    if not valid.any():
+        return scores
+
+    # Transform each distinct text once
+    distinct = {}
+    for text in np.array(left_clean, dtype=object)[valid].tolist() + np.array(right_clean, dtype=object)[valid].tolist():
+        distinct.setdefault(text, len(distinct))
+    vectorizer = CountVectorizer(lowercase=True, token_pattern=TOKEN_PATTERN, dtype=np.float64)
+    try:
+        counts = vectorizer.fit_transform(list(distinct.keys())).tocsr()
+    except ValueError:
+        # Empty vocabulary: no pair shares or owns any token
+        return scores
+
+    pair_rows = np.flatnonzero(valid)
+    a = counts[[distinct[left_clean[i]] for i in pair_rows]]
+    b = counts[[distinct[right_clean[i]] for i in pair_rows]]
+
+    shared = a.multiply(b)
+    shared_mask = shared.copy()
+    shared_mask.data[:] = 1.0
+    dot = np.asarray(shared.sum(axis=1)).ravel()
+
+    g2 = UNSHARED_IDF ** 2
+    a_sq, b_sq = a.multiply(a), b.multiply(b)
+    a_norm = g2 * np.asarray(a_sq.sum(axis=1)).ravel() - (g2 - 1.0) * np.asarray(a_sq.multiply(shared_mask).sum(axis=1)).ravel()
+    b_norm = g2 * np.asarray(b_sq.sum(axis=1)).ravel() - (g2 - 1.0) * np.asarray(b_sq.multiply(shared_mask).sum(axis=1)).ravel()
+    denom = np.sqrt(a_norm * b_norm)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pair_scores = np.where(denom > 0, dot / denom, 0.0)
+    scores[pair_rows] = pair_scores
+    logger.debug(f"Scored {len(pair_rows)} TF-IDF pairs over a {counts.shape[1]}-term vocabulary")
+    return scores
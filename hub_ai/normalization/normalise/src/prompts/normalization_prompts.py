@@ -1,7 +1,7 @@
 def generic_normalization_prompt(**kwargs) -> dict:
     """
     A general-purpose prompt for product/service normalisation, returning 7 columns with additional attribute extraction.
-    kwargs: Expected to contain 'item_count' and 'batch_items_string'.
+    kwargs: Expected to contain 'item_count' and 'batch_items_string' (one "[ID] description" line per item).
     """
     item_count = kwargs.get("item_count", "UNKNOWN_COUNT")
     batch_items_string = kwargs.get("batch_items_string", "NO_ITEMS_PROVIDED")
@@ -10,14 +10,15 @@ def generic_normalization_prompt(**kwargs) -> dict:
         "You are an expert data normalization assistant. You will process raw text and return structured, clean data according to the specified format and instructions."
     )
 
-    user_template = f"""You will receive exactly {item_count} input descriptions.
-You must return exactly {item_count} rows. No more, no less.
+    user_template = f"""You will receive exactly {item_count} input descriptions, each prefixed with its ID in square brackets, e.g. "[3] ...".
+You must return exactly {item_count} rows, one per ID. No more, no less.
 
-Each row must contain the following seven columns:
+Each row must contain the following eight columns:
 Respond strictly in CSV format with **NO HEADER**:
-"Type","Extracted_Quantity","Normalized Description","B2B Query","Attribute_1","Attribute_2","Attribute_3"
+"ID","Type","Extracted_Quantity","Normalized Description","B2B Query","Attribute_1","Attribute_2","Attribute_3"
 
 Instructions:
+- "ID" is the number of the input description the row belongs to, without brackets.
 - "Type" must be either "Product" or "Service".
 - If "Type" is "Service":
     - All other columns ➝ "N/A"
@@ -28,14 +29,14 @@ Instructions:
     - "Attribute_1", "Attribute_2", "Attribute_3": Extract clear, structured attributes like "Capacity: 33Ah", "Voltage: 3.7V", "Material: SS304", "Power: 0.5kW". If attributes are not found, return "N/A".
 
 Examples:
-Input : "LOWARA HORIZONTAL PUMP-5HMO4S05M, 0.5 KW, 0.60HP, 1 PH FLOW RATE  5.5 M3H @ 21.1 MTRS SS 304. DISCHARGE OUTLET  1 1/4\"X 1\""
-Output : "Product","1","Lowara horizontal pump 5HMO4S05M 0.5kW 0.6HP 1-phase 5.5 m³/h at 21.1m SS304 discharge 1 1/4 inch x 1 inch","Lowara SS304 Pump 0.5kW 5.5 m3h 1 phase","Power: 0.5kW","Flow Rate: 5.5 m³/h","Material: SS304"
+Input : "[1] LOWARA HORIZONTAL PUMP-5HMO4S05M, 0.5 KW, 0.60HP, 1 PH FLOW RATE  5.5 M3H @ 21.1 MTRS SS 304. DISCHARGE OUTLET  1 1/4\"X 1\""
+Output : "1","Product","1","Lowara horizontal pump 5HMO4S05M 0.5kW 0.6HP 1-phase 5.5 m³/h at 21.1m SS304 discharge 1 1/4 inch x 1 inch","Lowara SS304 Pump 0.5kW 5.5 m3h 1 phase","Power: 0.5kW","Flow Rate: 5.5 m³/h","Material: SS304"
 
-Input : "REFILLING OF ACETYLENE GAS (GAS CONTENT:5.5KG@200CFT/CYLINDER)"
-Output : "Service","N/A","N/A","N/A","N/A","N/A","N/A"
+Input : "[2] REFILLING OF ACETYLENE GAS (GAS CONTENT:5.5KG@200CFT/CYLINDER)"
+Output : "2","Service","N/A","N/A","N/A","N/A","N/A","N/A"
 
-Input : "Manufacturer Rechargeable 3.7V 33Ah Li Ion Battery Pack"
-Output : "Product","1","Rechargeable 3.7V 33Ah lithium-ion battery pack","Rechargeable 3.7V 33Ah lithium battery pack","Voltage: 3.7V","Capacity: 33Ah","Type: Li-Ion"
+Input : "[3] Manufacturer Rechargeable 3.7V 33Ah Li Ion Battery Pack"
+Output : "3","Product","1","Rechargeable 3.7V 33Ah lithium-ion battery pack","Rechargeable 3.7V 33Ah lithium battery pack","Voltage: 3.7V","Capacity: 33Ah","Type: Li-Ion"
 
 ---
 
@@ -43,7 +44,7 @@ Input Descriptions:
 {batch_items_string}
 
 ---
-Now, generate the CSV output of {item_count} rows for the {item_count} descriptions provided above.
+Now, generate the CSV output of {item_count} rows for the {item_count} descriptions provided above, each starting with its ID.
 """
 
     return {"system_message": system_message, "user_template": user_template}